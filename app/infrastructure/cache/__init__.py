@@ -1,5 +1,6 @@
 from .hybrid_cache import hybrid_cache
 from .redis_client import redis_client
 from .memory_cache import memory_cache
+from .metrics import cache_metrics
 
-__all__ = ["hybrid_cache", "redis_client", "memory_cache"]
+__all__ = ["hybrid_cache", "redis_client", "memory_cache", "cache_metrics"]
@@ -0,0 +1,109 @@
+import json
+import os
+import zlib
+from typing import Any
+
+from .columnar import json_default
+
+# Cabeçalho dos valores gravados no Redis: MAGIC + versão + serializador + compressão.
+# JSON texto nunca começa com NUL, então valores antigos (sem cabeçalho) continuam legíveis.
+MAGIC = b"\x00"
+VERSION = 1
+
+SERIALIZERS = {"json": 0, "orjson": 1, "msgpack": 2}
+COMPRESSIONS = {"none": 0, "zlib": 1, "zstd": 2}
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+def _available(name: str) -> bool:
+    return {"orjson": orjson, "msgpack": msgpack, "zstd": zstandard}.get(name, True) is not None
+
+class Codec:
+    """Serialização + compressão dos valores do Redis com cabeçalho autodescritivo.
+
+    O serializador (REDIS_CODEC: json, orjson ou msgpack) e a compressão
+    (REDIS_COMPRESSION: none, zlib ou zstd) valem só para novas gravações; a
+    leitura usa o que estiver no cabeçalho de cada valor. Pacotes opcionais
+    ausentes caem para json/zlib.
+    """
+
+    def __init__(self):
+        self.serializer = self._choose("REDIS_CODEC", "json", SERIALIZERS, "json")
+        self.compression = self._choose("REDIS_COMPRESSION", "zlib", COMPRESSIONS, "zlib")
+        # Valores menores que isso não compensam a compressão
+        self.compress_min_bytes = int(os.environ.get("REDIS_COMPRESS_MIN_BYTES", "1024"))
+        self.zlib_level = int(os.environ.get("REDIS_ZLIB_LEVEL", "6"))
+        self.zstd_level = int(os.environ.get("REDIS_ZSTD_LEVEL", "3"))
+        self._zstd_c = zstandard.ZstdCompressor(level=self.zstd_level) if zstandard else None
+        self._zstd_d = zstandard.ZstdDecompressor() if zstandard else None
+
+    @staticmethod
+    def _choose(env: str, default: str, options: dict, fallback: str) -> str:
+        name = os.environ.get(env, default).lower()
+        if name not in options:
+            print(f"⚠️ {env}={name} desconhecido - usando {fallback}")
+            return fallback
+        if not _available(name):
+            print(f"⚠️ {env}={name} mas o pacote não está instalado - usando {fallback}")
+            return fallback
+        return name
+
+    def _dumps(self, value: Any) -> bytes:
+        if self.serializer == "orjson":
+            return orjson.dumps(value, default=json_default)
+        if self.serializer == "msgpack":
+            return msgpack.packb(value, default=json_default, use_bin_type=True)
+        return json.dumps(value, ensure_ascii=False, default=json_default).encode()
+
+    def encode(self, value: Any) -> bytes:
+        payload = self._dumps(value)
+        compression = "none"
+        if self.compression != "none" and len(payload) >= self.compress_min_bytes:
+            compression = self.compression
+            if compression == "zstd":
+                payload = self._zstd_c.compress(payload)
+            else:
+                payload = zlib.compress(payload, self.zlib_level)
+        header = MAGIC + bytes((VERSION, SERIALIZERS[self.serializer], COMPRESSIONS[compression]))
+        return header + payload
+
+    def decode(self, data: bytes) -> Any:
+        if isinstance(data, str):
+            data = data.encode()
+        if not data.startswith(MAGIC):
+            # Valor gravado antes do cabeçalho: JSON texto
+            return json.loads(data)
+        version, serializer, compression = data[1], data[2], data[3]
+        if version != VERSION:
+            raise ValueError(f"Versão de codec desconhecida: {version}")
+        payload = data[4:]
+        if compression == COMPRESSIONS["zlib"]:
+            payload = zlib.decompress(payload)
+        elif compression == COMPRESSIONS["zstd"]:
+            if self._zstd_d is None:
+                raise ValueError("Valor comprimido com zstd, mas o pacote zstandard não está instalado")
+            payload = self._zstd_d.decompress(payload)
+        if serializer == SERIALIZERS["msgpack"]:
+            if msgpack is None:
+                raise ValueError("Valor serializado com msgpack, mas o pacote não está instalado")
+            return msgpack.unpackb(payload, raw=False)
+        if serializer == SERIALIZERS["orjson"] and orjson is not None:
+            return orjson.loads(payload)
+        # orjson e json produzem o mesmo formato
+        return json.loads(payload)
+
+# Instância global do codec do Redis
+redis_codec = Codec()
@@ -0,0 +1,177 @@
+import sys
+from array import array
+from collections.abc import Sequence
+from typing import Any, Optional
+
+# Marca de coluna ausente na linha (DataSets .NET omitem colunas nulas)
+_MISSING = object()
+# Valores de DataSet chegam como texto; outros tipos ficam no formato de dicts
+_SCALARS = (str, type(None))
+
+class _Column:
+    """Coluna tipada: constante, codificada por dicionário (array de códigos) ou tupla de valores"""
+
+    __slots__ = ("kind", "values", "codes")
+
+    def __init__(self, values: list):
+        distinct = {}
+        limit = max(1, len(values) // 2)
+        for v in values:
+            if v not in distinct:
+                distinct[v] = len(distinct)
+                if len(distinct) > limit:
+                    break
+        if len(distinct) == 1:
+            self.kind, self.values, self.codes = "const", values[0], None
+        elif len(distinct) <= limit:
+            self.kind = "dict"
+            self.values = tuple(distinct)
+            self.codes = array("H" if len(distinct) < 65536 else "I", (distinct[v] for v in values))
+        else:
+            self.kind, self.values, self.codes = "plain", tuple(values), None
+
+    def __getitem__(self, i: int):
+        if self.kind == "const":
+            return self.values
+        if self.kind == "dict":
+            return self.values[self.codes[i]]
+        return self.values[i]
+
+class ColumnarRows(Sequence):
+    """Linhas de DataSet em formato colunar.
+
+    Os nomes das colunas ficam guardados uma única vez e cada coluna é tipada
+    (constante, dicionário + códigos ou tupla). As linhas só voltam a ser dicts
+    quando acessadas (linha a linha ou em to_dicts(), na fronteira da resposta).
+    """
+
+    __slots__ = ("columns", "_cols", "_len")
+
+    def __init__(self, columns: tuple, cols: list, length: int):
+        self.columns = columns
+        self._cols = cols
+        self._len = length
+
+    @classmethod
+    def from_rows(cls, rows: list) -> Optional["ColumnarRows"]:
+        """Converte dicts planos; retorna None se as linhas não couberem no formato"""
+        index = {}
+        for row in rows:
+            if not isinstance(row, dict):
+                return None
+            last = -1
+            for k, v in row.items():
+                if not isinstance(v, _SCALARS):
+                    return None
+                pos = index.setdefault(k, len(index))
+                # A ordem das chaves precisa ser reconstruível a partir das colunas
+                if pos < last:
+                    return None
+                last = pos
+        columns = tuple(index)
+        cols = [_Column([row.get(c, _MISSING) for row in rows]) for c in columns]
+        return cls(columns, cols, len(rows))
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._len))]
+        if i < 0:
+            i += self._len
+        if not 0 <= i < self._len:
+            raise IndexError(i)
+        row = {}
+        for name, col in zip(self.columns, self._cols):
+            v = col[i]
+            if v is not _MISSING:
+                row[name] = v
+        return row
+
+    def approx_bytes(self) -> int:
+        """Tamanho aproximado em memória (strings distintas + arrays de códigos)"""
+        total = sys.getsizeof(self.columns)
+        for col in self._cols:
+            if col.kind == "const":
+                total += sys.getsizeof(col.values)
+            elif col.kind == "dict":
+                total += sum(sys.getsizeof(v) for v in col.values) + col.codes.itemsize * len(col.codes)
+            else:
+                total += sys.getsizeof(col.values) + sum(sys.getsizeof(v) for v in col.values)
+        return total
+
+    def to_dicts(self) -> list:
+        return [self[i] for i in range(self._len)]
+
+    def to_json(self) -> dict:
+        """Forma compacta para JSON/Redis: nomes uma vez, linhas como listas"""
+        rows = []
+        missing = []
+        for i in range(self._len):
+            row = [col[i] for col in self._cols]
+            for j, v in enumerate(row):
+                if v is _MISSING:
+                    row[j] = None
+                    missing.append([i, j])
+            rows.append(row)
+        return {"__columnar__": 1, "columns": list(self.columns), "rows": rows, "missing": missing}
+
+    @classmethod
+    def from_json(cls, payload: dict) -> "ColumnarRows":
+        columns = tuple(payload["columns"])
+        rows = payload["rows"]
+        for i, j in payload.get("missing") or ():
+            rows[i][j] = _MISSING
+        cols = [_Column([r[j] for r in rows]) for j in range(len(columns))]
+        return cls(columns, cols, len(rows))
+
+def is_columnar_json(value: Any) -> bool:
+    return isinstance(value, dict) and value.get("__columnar__") == 1
+
+def compact_dataset(value: Any, min_rows: int) -> Any:
+    """Troca value["items"] por ColumnarRows quando o DataSet é grande o bastante"""
+    if not isinstance(value, dict):
+        return value
+    items = value.get("items")
+    if not isinstance(items, list) or len(items) < min_rows:
+        return value
+    columnar = ColumnarRows.from_rows(items)
+    if columnar is None:
+        return value
+    return {**value, "items": columnar}
+
+def json_default(obj):
+    """Hook de json.dumps para ColumnarRows"""
+    if isinstance(obj, ColumnarRows):
+        return obj.to_json()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def revive_dataset(value: Any) -> Any:
+    """Reconstrói ColumnarRows em value["items"] vindo do Redis"""
+    if isinstance(value, dict) and is_columnar_json(value.get("items")):
+        return {**value, "items": ColumnarRows.from_json(value["items"])}
+    return value
+
+def materialize(value: Any, depth: int = 0) -> Any:
+    """Converte ColumnarRows de volta para listas de dicts (fronteira da resposta).
+
+    Desce só pelos níveis de envelope (dicts e listas rasas), sem percorrer as linhas.
+    """
+    if isinstance(value, ColumnarRows):
+        return value.to_dicts()
+    if depth >= 3:
+        return value
+    if isinstance(value, dict):
+        out = None
+        for k, v in value.items():
+            m = materialize(v, depth + 1)
+            if m is not v:
+                if out is None:
+                    out = dict(value)
+                out[k] = m
+        return value if out is None else out
+    if isinstance(value, list) and value and isinstance(value[0], dict) and len(value) <= 64:
+        out = [materialize(v, depth + 1) for v in value]
+        return value if all(a is b for a, b in zip(out, value)) else out
+    return value
@@ -0,0 +1,287 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Optional
+
+from .codec import redis_codec
+from .columnar import revive_dataset
+from .metrics import cache_metrics
+
+_SCHEMA = """
+BEGIN IMMEDIATE;
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_expires ON entries (expires_at);
+CREATE TABLE IF NOT EXISTS tags (
+    tag TEXT NOT NULL,
+    key TEXT NOT NULL,
+    PRIMARY KEY (tag, key)
+);
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    token TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+-- Total de bytes mantido por triggers (compartilhado pelos processos), sem SUM na gravação
+CREATE TABLE IF NOT EXISTS totals (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    bytes INTEGER NOT NULL
+);
+INSERT INTO totals (id, bytes)
+    SELECT 0, (SELECT COALESCE(SUM(size), 0) FROM entries) WHERE NOT EXISTS (SELECT 1 FROM totals);
+CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries
+    BEGIN UPDATE totals SET bytes = bytes + NEW.size WHERE id = 0; END;
+CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries
+    BEGIN UPDATE totals SET bytes = bytes - OLD.size WHERE id = 0; END;
+CREATE TRIGGER IF NOT EXISTS entries_update AFTER UPDATE OF size ON entries
+    BEGIN UPDATE totals SET bytes = bytes - OLD.size + NEW.size WHERE id = 0; END;
+COMMIT;
+"""
+
+# Namespace = parte da chave antes do primeiro ':'
+_NAMESPACE_SQL = "CASE WHEN instr(key, ':') > 0 THEN substr(key, 1, instr(key, ':') - 1) ELSE key END"
+
+def _like_prefix(prefix: str) -> str:
+    escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return escaped + ":%"
+
+class DiskCache:
+    """Nível persistente em SQLite para quando o Redis não está disponível.
+
+    Fica atrás do L1: sobrevive a restarts e é compartilhado pelos workers do
+    mesmo host (WAL + busy timeout; cada processo abre sua própria conexão).
+    Os valores usam o mesmo codec do Redis e guardam a expiração em epoch; o
+    banco é aberto na primeira utilização e as entradas são lidas sob demanda.
+    Desligado enquanto `CACHE_DISK_DIR` não for configurado.
+    """
+
+    def __init__(self):
+        self.directory = os.environ.get("CACHE_DISK_DIR", "")
+        self.enabled = bool(self.directory)
+        self.path = os.path.join(self.directory, "cache.sqlite3") if self.enabled else None
+        self.max_bytes = int(os.environ.get("CACHE_DISK_MAX_BYTES", str(512 * 1024 * 1024)))
+        self.busy_timeout = float(os.environ.get("CACHE_DISK_BUSY_TIMEOUT_SECONDS", "5"))
+        self._conn: Optional[sqlite3.Connection] = None
+        # Uma conexão por processo; as chamadas rodam em threads, uma por vez
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0, "expirations": 0, "errors": 0}
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(self.directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            # INSERT OR REPLACE só dispara o trigger de DELETE da linha substituída com isso ligado
+            conn.execute("PRAGMA recursive_triggers=ON")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _run(self, fn, *args):
+        with self._lock:
+            return fn(self._connect(), *args)
+
+    async def _call(self, fn, *args, default=None):
+        if not self.enabled:
+            return default
+        try:
+            return await asyncio.to_thread(self._run, fn, *args)
+        except (sqlite3.Error, OSError) as e:
+            self.stats["errors"] += 1
+            print(f"❌ Erro no cache em disco: {e}")
+            return default
+
+    @staticmethod
+    def _write(conn: sqlite3.Connection, statements):
+        """Executa as gravações em uma transação (BEGIN IMMEDIATE serializa entre processos)"""
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = statements(conn)
+            conn.execute("COMMIT")
+            return result
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    async def open(self):
+        """Abre o banco (sem carregar entradas) e descarta as vencidas"""
+        if await self._call(lambda conn: True, default=False):
+            removed = await self.purge_expired()
+            print(f"💾 Cache em disco em {self.path} ({removed} entradas vencidas removidas)")
+
+    async def get(self, key: str) -> Optional[Any]:
+        return (await self.get_many([key]))[0]
+
+    async def get_many(self, keys: list) -> list:
+        """Busca várias chaves (uma consulta), na ordem das chaves"""
+        if not keys:
+            return []
+
+        def select(conn):
+            marks = ",".join("?" * len(keys))
+            rows = conn.execute(f"SELECT key, value FROM entries WHERE key IN ({marks}) AND expires_at > ?",
+                                (*keys, time.time())).fetchall()
+            return dict(rows)
+
+        started = time.perf_counter()
+        found = await self._call(select, default={})
+        elapsed = time.perf_counter() - started
+        values = []
+        for key in keys:
+            blob = found.get(key)
+            cache_metrics.observe(key, "disk_read", elapsed)
+            if blob is None:
+                self.stats["misses"] += 1
+                values.append(None)
+                continue
+            self.stats["hits"] += 1
+            cache_metrics.incr(key, "bytes_read", "disk", len(blob))
+            values.append(revive_dataset(redis_codec.decode(blob)))
+        return values
+
+    async def set_many(self, items: dict, ttl_seconds: int, tags: Optional[dict] = None) -> bool:
+        """Grava vários valores em uma transação; `tags` = {chave: [tags]}"""
+        if not self.enabled or not items:
+            return True
+        expires_at = time.time() + ttl_seconds
+        rows = []
+        for key, value in items.items():
+            blob = redis_codec.encode(value)
+            rows.append((key, blob, len(blob), expires_at))
+        tag_rows = [(tag, key) for key, key_tags in (tags or {}).items() for tag in key_tags]
+
+        def write(conn):
+            conn.executemany("INSERT OR REPLACE INTO entries (key, value, size, expires_at) VALUES (?, ?, ?, ?)", rows)
+            conn.executemany("INSERT OR IGNORE INTO tags (tag, key) VALUES (?, ?)", tag_rows)
+            # Limite checado na mesma transação, pelo total mantido pelos triggers
+            return self._enforce_size(conn)
+
+        evicted = await self._call(self._write, write)
+        if evicted is None:
+            return False
+        self.stats["writes"] += len(rows)
+        self.stats["evictions"] += evicted
+        for key, _, size, _ in rows:
+            cache_metrics.incr(key, "bytes_written", "disk", size)
+        return True
+
+    async def delete_many(self, keys: list) -> int:
+        if not keys:
+            return 0
+
+        def delete(conn):
+            marks = ",".join("?" * len(keys))
+            removed = conn.execute(f"DELETE FROM entries WHERE key IN ({marks})", keys).rowcount
+            conn.execute(f"DELETE FROM tags WHERE key IN ({marks})", keys)
+            return removed
+
+        return await self._call(self._write, delete, default=0)
+
+    async def keys(self, prefix: str) -> list:
+        """Chaves vivas com o prefixo (a própria chave ou `prefix:...`)"""
+        def select(conn):
+            rows = conn.execute("SELECT key FROM entries WHERE (key = ? OR key LIKE ? ESCAPE '\\') AND expires_at > ?",
+                                (prefix, _like_prefix(prefix), time.time())).fetchall()
+            return [r[0] for r in rows]
+
+        return await self._call(select, default=[])
+
+    async def tag_keys(self, tag: str) -> list:
+        def select(conn):
+            return [r[0] for r in conn.execute("SELECT key FROM tags WHERE tag = ?", (tag,)).fetchall()]
+
+        return await self._call(select, default=[])
+
+    async def namespace_counts(self) -> dict:
+        def select(conn):
+            rows = conn.execute(f"SELECT {_NAMESPACE_SQL} AS ns, COUNT(*) FROM entries WHERE expires_at > ? GROUP BY ns",
+                                (time.time(),)).fetchall()
+            return dict(rows)
+
+        return await self._call(select, default={})
+
+    async def acquire_lock(self, name: str, ttl_ms: int) -> Optional[str]:
+        """Lease entre processos do host (equivalente ao SET NX PX do Redis)"""
+        token = uuid.uuid4().hex
+
+        def acquire(conn):
+            now = time.time()
+            conn.execute("DELETE FROM leases WHERE name = ? AND expires_at <= ?", (name, now))
+            inserted = conn.execute("INSERT OR IGNORE INTO leases (name, token, expires_at) VALUES (?, ?, ?)",
+                                    (name, token, now + ttl_ms / 1000)).rowcount
+            return token if inserted else None
+
+        return await self._call(self._write, acquire)
+
+    async def release_lock(self, name: str, token: str) -> bool:
+        def release(conn):
+            return conn.execute("DELETE FROM leases WHERE name = ? AND token = ?", (name, token)).rowcount > 0
+
+        return await self._call(self._write, release, default=False)
+
+    async def purge_expired(self) -> int:
+        def purge(conn):
+            now = time.time()
+            removed = conn.execute("DELETE FROM entries WHERE expires_at <= ?", (now,)).rowcount
+            conn.execute("DELETE FROM tags WHERE key NOT IN (SELECT key FROM entries)")
+            conn.execute("DELETE FROM leases WHERE expires_at <= ?", (now,))
+            return removed
+
+        removed = await self._call(self._write, purge, default=0)
+        self.stats["expirations"] += removed
+        return removed
+
+    @staticmethod
+    def _total(conn: sqlite3.Connection) -> int:
+        return conn.execute("SELECT bytes FROM totals WHERE id = 0").fetchone()[0]
+
+    def _enforce_size(self, conn: sqlite3.Connection) -> int:
+        """Acima de `max_bytes`, remove primeiro as entradas que vencem antes (em lotes, pelo índice)"""
+        total = self._total(conn)
+        removed = 0
+        while total > self.max_bytes:
+            batch = conn.execute("SELECT key, size FROM entries ORDER BY expires_at LIMIT 256").fetchall()
+            if not batch:
+                break
+            for key, size in batch:
+                if total <= self.max_bytes:
+                    break
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                total -= size
+                removed += 1
+        return removed
+
+    async def clear(self):
+        def clear(conn):
+            conn.execute("DELETE FROM entries")
+            conn.execute("DELETE FROM tags")
+
+        await self._call(self._write, clear)
+
+    async def get_stats(self) -> dict:
+        if not self.enabled:
+            return {"enabled": False}
+
+        def totals(conn):
+            return conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0], self._total(conn)
+
+        entries, size = await self._call(totals, default=(0, 0))
+        return {"enabled": True, "path": self.path, "entries": entries, "bytes": size,
+                "max_bytes": self.max_bytes, **self.stats}
+
+    async def close(self):
+        if self._conn is not None:
+            await asyncio.to_thread(self._run, lambda conn: conn.close())
+            self._conn = None
+
+# Instância global do cache em disco
+disk_cache = DiskCache()
@@ -1,71 +1,537 @@
-from typing import Any, Callable
+import asyncio
+import math
+import os
+import random
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Optional
 from .redis_client import redis_client
 from .memory_cache import memory_cache
+from .disk_cache import disk_cache
+from .columnar import compact_dataset, revive_dataset
+from .invalidation import l1_invalidator
+from .metrics import cache_metrics, namespace
+from . import key_index
+
+# TTL do L1 (memória do processo) por namespace (prefixo da chave antes de ':').
+# O TTL do L2 (Redis) continua sendo o informado em set(); o L1 nunca passa dele.
+# Ajustável por namespace: CACHE_L1_TTL_BENS_DISPONIVEIS=120
+L1_TTL_SECONDS = {
+    "tipos_grupos": 300,
+    "tipos_vendas": 300,
+    "bens_disponiveis": 300,
+    "calendario_assembleias": 300,
+    "caracteristicas_grupos": 300,
+    "regra_cobranca": 300,
+    "bancos_debito": 3600,
+}
+
+# Metadados gravados junto ao valor: expiração lógica (epoch), custo do recálculo e,
+# em entradas negativas ("o upstream respondeu, mas não há nada"), negative=True
+_META = "__cache__"
+
+def _wrap(value: Any, ttl_seconds: int, delta: float, negative: bool = False) -> dict:
+    meta = {"expires_at": time.time() + ttl_seconds, "delta": round(delta, 4)}
+    if negative:
+        meta["negative"] = True
+    return {_META: meta, "value": value}
+
+def _unwrap(raw: Any) -> tuple:
+    """(valor, metadados); entradas antigas, sem metadados, voltam com meta None"""
+    if isinstance(raw, dict) and _META in raw and "value" in raw:
+        return raw["value"], raw[_META]
+    return raw, None
+
+def _revive(raw: Any) -> Any:
+    """Reconstrói o DataSet colunar de uma entrada lida do Redis (uma vez, antes do L1)"""
+    if isinstance(raw, dict) and _META in raw and "value" in raw:
+        return {_META: raw[_META], "value": revive_dataset(raw["value"])}
+    return raw
+
+def _expired(meta: Optional[dict]) -> bool:
+    return meta is not None and time.time() >= meta["expires_at"]
+
+class _KeyLocks:
+    """Um asyncio.Lock por chave, descartado só quando ninguém mais o usa ou espera.
+
+    Remover o lock assim que é liberado (com chamadores ainda na fila) faria o
+    próximo chamador criar outro lock e recalcular junto com os que esperavam.
+    """
+
+    def __init__(self):
+        self._entries = {}
+
+    @contextmanager
+    def use(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            yield entry[0]
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._entries[key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
 
 class HybridCache:
+    """Cache em dois níveis: L1 em memória (TTL curto) na frente do L2 Redis.
+
+    Leituras consultam o L1 primeiro e só vão ao Redis em caso de falta; valores
+    vindos do Redis são promovidos para o L1. Sem Redis, o cache em disco (se
+    configurado, ver DiskCache) assume o papel de nível compartilhado; sem os
+    dois, a memória é o único nível e usa o TTL completo. Gravações e remoções
+    são propagadas para o L1 dos outros workers via pub/sub (ver L1Invalidator).
+
+    Cada valor carrega sua expiração lógica e fica guardado por mais
+    `stale_if_error` segundos: get_or_set usa essa cópia vencida quando o
+    recálculo falha ou enquanto outro chamador recalcula.
+    """
+
     def __init__(self):
-        self.redis_available = False
-    
+        # DataSets com pelo menos N linhas são guardados em formato colunar
+        self.columnar_min_rows = int(os.environ.get("CACHE_COLUMNAR_MIN_ROWS", "200"))
+        self.l1_enabled = os.environ.get("CACHE_L1", "true").lower() in ("1", "true", "yes")
+        self.l1_default_ttl = int(os.environ.get("CACHE_L1_TTL_SECONDS", "60"))
+        self.stale_if_error = int(os.environ.get("CACHE_STALE_IF_ERROR_SECONDS", "300"))
+        # XFetch: beta > 1 antecipa mais os recálculos, 0 desliga
+        self.xfetch_beta = float(os.environ.get("CACHE_XFETCH_BETA", "1.0"))
+        self.lock_ms = int(os.environ.get("CACHE_LOCK_LEASE_MS", "10000"))
+        self.poll_ms = int(os.environ.get("CACHE_LOCK_POLL_MS", "50"))
+        self._locks = _KeyLocks()
+        self._refreshing = {}
+        # Tags no modo só memória (com Redis ficam em cache:tag:<tag>)
+        self._memory_tags = {}
+        self.stats = {"l1_hits": 0, "l2_hits": 0, "disk_hits": 0, "misses": 0}
+        self.stampede = {
+            "recomputes": 0, "early_refreshes": 0, "lock_waits": 0, "lock_wait_ms": 0.0,
+            "lease_contended": 0, "stale_served": 0, "fetch_errors": 0,
+        }
+
+    @property
+    def redis_available(self) -> bool:
+        """Redis utilizável agora (acompanha quedas e reconexões do RedisClient)"""
+        return redis_client.connected
+
     async def initialize(self):
         """Inicializa o cache híbrido"""
-        self.redis_available = await redis_client.connect()
+        await redis_client.connect()
+        await disk_cache.open()
+        # Mesmo se o Redis estiver fora na startup, o monitor segue tentando reconectar
+        redis_client.start_monitor()
+        memory_cache.start_sweeper()
+        if redis_client.configured and self.l1_enabled:
+            l1_invalidator.start()
         if self.redis_available:
             print("🚀 Usando Redis como cache principal")
+        elif disk_cache.enabled:
+            print("💾 Usando cache em disco como fallback")
         else:
             print("⚠️ Usando cache em memória como fallback")
-    
-    async def get(self, key: str) -> Any:
-        """Busca valor no cache (Redis primeiro, depois memória)"""
+
+    def l1_ttl(self, key: str, ttl_seconds: Optional[float] = None) -> int:
+        """TTL do L1 para a chave (limitado pelo TTL do L2, quando conhecido)"""
+        ns = namespace(key)
+        ttl = int(os.environ.get(f"CACHE_L1_TTL_{ns.upper()}", L1_TTL_SECONDS.get(ns, self.l1_default_ttl)))
+        if not l1_invalidator.subscribed:
+            # Sem o canal de invalidação o L1 só pode ficar defasado por pouco tempo
+            ttl = min(ttl, l1_invalidator.degraded_ttl)
+        return ttl if ttl_seconds is None else max(0, min(ttl, int(ttl_seconds)))
+
+    def _use_l1(self) -> bool:
+        # Sem Redis a memória é sempre usada (na frente do disco ou como único nível)
+        return self.l1_enabled or not self.redis_available
+
+    def _shared(self) -> tuple:
+        """Nível compartilhado entre workers e seu nome: Redis, ou o disco enquanto o Redis estiver fora"""
         if self.redis_available:
-            value = await redis_client.get(key)
-            if value is not None:
-                return value
-        
-        # Fallback para memória
-        return await memory_cache.get(key)
-    
-    async def set(self, key: str, value: Any, ttl_seconds: int = 1800) -> bool:
-        """Salva valor no cache (Redis e memória)"""
+            return redis_client, "l2"
+        if disk_cache.enabled:
+            return disk_cache, "disk"
+        return None, None
+
+    async def _promote(self, key: str, raw: Any, meta: Optional[dict]):
+        """Copia para o L1 um valor lido do L2 ou do disco (sem passar da expiração lógica)"""
+        if not self._use_l1():
+            return
+        remaining = None if meta is None else meta["expires_at"] - time.time()
+        ttl = self.l1_ttl(key, remaining)
+        if ttl > 0:
+            await memory_cache.set(key, raw, ttl)
+
+    def _hit(self, key: str, tier: str, raw: Any):
+        self.stats[f"{tier}_hits"] += 1
+        cache_metrics.incr(key, "hits", tier)
+        meta = _unwrap(raw)[1]
+        if meta is not None and meta.get("negative"):
+            cache_metrics.incr(key, "negative_hits")
+
+    def _miss(self, key: str):
+        self.stats["misses"] += 1
+        cache_metrics.incr(key, "misses")
+
+    def _stale(self, key: str):
+        self.stampede["stale_served"] += 1
+        cache_metrics.incr(key, "stale_served")
+
+    async def _read(self, key: str) -> tuple:
+        """Lê a entrada crua (L1, depois Redis ou disco) e devolve (valor, metadados)"""
+        if self._use_l1():
+            raw = await memory_cache.get(key)
+            if raw is not None:
+                self._hit(key, "l1", raw)
+                return _unwrap(raw)
+            cache_metrics.incr(key, "misses", "l1")
+
+        shared, tier = self._shared()
+        if shared is not None:
+            raw = _revive(await shared.get(key))
+            if raw is not None:
+                self._hit(key, tier, raw)
+                value, meta = _unwrap(raw)
+                await self._promote(key, raw, meta)
+                return value, meta
+            cache_metrics.incr(key, "misses", tier)
+
+        self._miss(key)
+        return None, None
+
+    async def get(self, key: str) -> Any:
+        """Busca valor no cache (L1 em memória primeiro, depois Redis); vencidos contam como falta"""
+        value, meta = await self._read(key)
+        return None if _expired(meta) else value
+
+    async def get_many(self, keys: list) -> list:
+        """Busca várias chaves de uma vez: L1 primeiro, faltas via MGET no Redis (ou no disco)"""
+        raws = [None] * len(keys)
+        if self._use_l1():
+            for i, key in enumerate(keys):
+                raws[i] = await memory_cache.get(key)
+                if raws[i] is not None:
+                    self._hit(key, "l1", raws[i])
+                else:
+                    cache_metrics.incr(key, "misses", "l1")
+
+        missing = [i for i, r in enumerate(raws) if r is None]
+        shared, tier = self._shared()
+        if missing and shared is not None:
+            found = await shared.get_many([keys[i] for i in missing])
+            for i, raw in zip(missing, found):
+                if raw is not None:
+                    raws[i] = raw = _revive(raw)
+                    self._hit(keys[i], tier, raw)
+                    await self._promote(keys[i], raw, _unwrap(raw)[1])
+                else:
+                    cache_metrics.incr(keys[i], "misses", tier)
+
+        for key, raw in zip(keys, raws):
+            if raw is None:
+                self._miss(key)
+        values = []
+        for raw in raws:
+            value, meta = _unwrap(raw)
+            values.append(None if _expired(meta) else value)
+        return values
+
+    async def set(self, key: str, value: Any, ttl_seconds: int = 1800, delta: float = 0.0,
+                  tags: Optional[list] = None, negative: bool = False) -> bool:
+        """Salva valor no cache (Redis com o TTL completo, L1 com o TTL do namespace).
+
+        `delta` é o tempo gasto para calcular o valor (usado pelo XFetch) e
+        `tags` permitem invalidar grupos de chaves depois (delete_tag).
+        `negative` marca um resultado vazio válido (TTL curto, contado à parte).
+        """
+        return await self.set_many({key: value}, ttl_seconds, deltas={key: delta}, tags={key: tags or []},
+                                   negative=negative)
+
+    async def set_many(self, items: dict, ttl_seconds: int = 1800, deltas: Optional[dict] = None,
+                       tags: Optional[dict] = None, negative: bool = False) -> bool:
+        """Salva vários valores (pipeline no Redis, uma única mensagem de invalidação).
+
+        Cada chave é registrada nos índices de prefixo e nas tags informadas
+        ({chave: [tags]}), no mesmo pipeline.
+        """
+        deltas = deltas or {}
+        raws = {
+            key: _wrap(compact_dataset(value, self.columnar_min_rows), ttl_seconds, deltas.get(key, 0.0), negative)
+            for key, value in items.items()
+        }
+        if negative:
+            for key in raws:
+                cache_metrics.incr(key, "negative_writes")
         success = True
-        
+
         if self.redis_available:
-            success = await redis_client.set(key, value, ttl_seconds)
-        
-        # Sempre salva na memória como backup
-        await memory_cache.set(key, value, ttl_seconds)
-        
+            # A cópia vencida fica disponível por mais stale_if_error segundos
+            l2_ttl = ttl_seconds + self.stale_if_error
+            expires_at = time.time() + l2_ttl
+            indexes = key_index.index_entries({key: expires_at for key in raws}, tags)
+            success = await redis_client.set_many(raws, l2_ttl, indexes=indexes)
+            if self.l1_enabled:
+                for key, raw in raws.items():
+                    await memory_cache.set(key, raw, self.l1_ttl(key, ttl_seconds))
+                await l1_invalidator.invalidate_keys(list(raws))
+        elif disk_cache.enabled:
+            # O disco é compartilhado: o L1 fica curto, como na frente do Redis
+            success = await disk_cache.set_many(raws, ttl_seconds + self.stale_if_error, tags)
+            for key, raw in raws.items():
+                await memory_cache.set(key, raw, self.l1_ttl(key, ttl_seconds))
+        else:
+            for key, raw in raws.items():
+                await memory_cache.set(key, raw, ttl_seconds + self.stale_if_error)
+            for key, key_tags in (tags or {}).items():
+                for tag in key_tags:
+                    self._memory_tags.setdefault(tag, set()).add(key)
+
         return success
-    
+
     async def delete(self, key: str) -> bool:
         """Remove valor do cache (Redis e memória)"""
-        redis_success = True
+        await self.delete_many([key])
+        return True
+
+    async def delete_many(self, keys: list) -> int:
+        """Remove várias chaves (um único DEL no Redis); retorna quantas foram removidas"""
+        removed = 0
+        for key in keys:
+            if key in memory_cache._cache:
+                removed += 1
+            await memory_cache.delete(key)
+        if self.redis_available and keys:
+            removed = await redis_client.delete_many(keys, unindex=key_index.unindex_entries(keys))
+            if self.l1_enabled:
+                await l1_invalidator.invalidate_keys(keys)
+        elif disk_cache.enabled and keys:
+            removed = max(removed, await disk_cache.delete_many(keys))
+        return removed
+
+    async def keys(self, prefix: str) -> list:
+        """Chaves vivas de um namespace/prefixo (pelo índice, sem KEYS)"""
+        if self.redis_available:
+            return await key_index.prefix_keys(prefix)
+        keys = [k for k in memory_cache._cache if key_index.matches_prefix(k, prefix)]
+        if disk_cache.enabled:
+            keys = list(dict.fromkeys(keys + await disk_cache.keys(prefix)))
+        return keys
+
+    async def delete_prefix(self, prefix: str) -> int:
+        """Remove todas as chaves de um namespace/prefixo (ex.: bens_disponiveis:IM)"""
+        removed = await self.delete_many(await self.keys(prefix))
+        # Entradas do L1 gravadas antes do índice existir
+        await self.invalidate_l1_prefix(prefix)
+        return removed
+
+    async def delete_tag(self, tag: str) -> int:
+        """Remove todas as chaves marcadas com a tag"""
+        if self.redis_available:
+            keys = await key_index.tag_keys(tag)
+            removed = await self.delete_many(keys)
+            await key_index.drop_tag(tag)
+            return removed
+        keys = set(self._memory_tags.pop(tag, ()))
+        if disk_cache.enabled:
+            keys.update(await disk_cache.tag_keys(tag))
+        return await self.delete_many(list(keys))
+
+    async def clear(self) -> int:
+        """Remove do Redis as chaves de todos os namespaces do índice e descarta o L1 dos workers.
+
+        Só apaga chaves de cache: outros dados no mesmo banco (registros de
+        idempotência, leases) ficam intactos. Chaves gravadas antes do índice
+        existir vencem pelo TTL.
+        """
+        removed = 0
+        if self.redis_available:
+            for ns in await key_index.namespaces():
+                removed += await self.delete_many(await key_index.prefix_keys(ns))
+            await key_index.drop_indexes()
+        await self.invalidate_l1_all()
+        return removed
+
+    async def namespace_counts(self) -> dict:
+        """Quantidade de chaves por namespace"""
         if self.redis_available:
-            redis_success = await redis_client.delete(key)
-        
-        memory_success = await memory_cache.delete(key)
-        
-        return redis_success and memory_success
-    
-    async def get_or_set(self, key: str, fetch_func: Callable, ttl_seconds: int = 1800) -> Any:
-        """Busca no cache ou executa função e salva resultado"""
-        # Tenta buscar no cache
-        cached_value = await self.get(key)
-        if cached_value is not None:
-            return cached_value
-        
-        # Cache miss - executa função
+            return await key_index.namespace_counts()
+        if disk_cache.enabled:
+            return await disk_cache.namespace_counts()
+        counts = {}
+        for key in memory_cache._cache:
+            ns = key_index.key_prefixes(key)[0]
+            counts[ns] = counts.get(ns, 0) + 1
+        return counts
+
+    async def invalidate_l1_prefix(self, prefix: str) -> int:
+        """Remove do L1 (deste e dos outros workers) as chaves com o prefixo"""
+        removed = await memory_cache.delete_prefix(prefix)
+        await l1_invalidator.invalidate_prefix(prefix)
+        return removed
+
+    async def invalidate_l1_all(self):
+        """Descarta o L1 de todos os workers (exceto namespaces preservados)"""
+        memory_cache.invalidate_all()
+        await l1_invalidator.invalidate_all()
+
+    async def get_or_set_view(self, key: str, view: str, render: Callable[[Any], bytes], fetch_func: Callable,
+                              ttl_seconds: int = 1800, **kwargs) -> bytes:
+        """Como get_or_set, mas devolve `render(valor)` guardado junto da entrada no L1.
+
+        Usado para o JSON final da resposta: nos acertos seguintes os bytes são
+        reaproveitados sem serializar de novo. A representação só é guardada se
+        o valor ainda for o que está no L1, e é descartada quando a entrada muda.
+        """
+        value = await self.get_or_set(key, fetch_func, ttl_seconds, **kwargs)
+        body = memory_cache.get_view(key, view)
+        raw = memory_cache.peek(key)
+        current = _unwrap(raw)[0] if raw is not None else None
+        if current is not value:
+            return render(value)
+        if body is None:
+            body = render(value)
+            memory_cache.set_view(key, view, body)
+        return body
+
+    def _early_refresh(self, meta: Optional[dict]) -> bool:
+        """XFetch: recalcula antes do vencimento com probabilidade crescente"""
+        if meta is None or not meta.get("delta") or self.xfetch_beta <= 0:
+            return False
+        gap = -meta["delta"] * self.xfetch_beta * math.log(1.0 - random.random())
+        return time.time() + gap >= meta["expires_at"]
+
+    async def get_or_set(self, key: str, fetch_func: Callable, ttl_seconds: int = 1800,
+                         cacheable: Optional[Callable[[Any], bool]] = None, tags: Optional[list] = None,
+                         negative: Optional[Callable[[Any], bool]] = None, negative_ttl: int = 0) -> Any:
+        """Busca no cache ou executa função e salva resultado.
+
+        Apenas um chamador recalcula cada chave (lock local + lease SET NX no
+        Redis); os demais recebem o valor anterior enquanto houver um. Chaves
+        perto de vencer são recalculadas antecipadamente em segundo plano.
+        `cacheable` decide se o resultado pode ser gravado e `tags` são
+        repassadas para set(). Resultados recusados por `cacheable` para os
+        quais `negative` retorna True são gravados como entrada negativa por
+        `negative_ttl` segundos.
+        """
+        policy = (cacheable, tags, negative, negative_ttl)
+        value, meta = await self._read(key)
+        if value is not None and not _expired(meta):
+            if self._early_refresh(meta) and key not in self._refreshing:
+                self.stampede["early_refreshes"] += 1
+                task = asyncio.create_task(
+                    self._recompute(key, fetch_func, ttl_seconds, policy, stale=value, seen=meta))
+                self._refreshing[key] = task
+                task.add_done_callback(lambda _: self._refreshing.pop(key, None))
+            return value
+
+        return await self._recompute(key, fetch_func, ttl_seconds, policy, stale=value, seen=meta)
+
+    async def _recompute(self, key: str, fetch_func: Callable, ttl_seconds: int, policy: tuple,
+                         stale: Any = None, seen: Optional[dict] = None) -> Any:
+        with self._locks.use(key) as lock:
+            waited = lock.locked()
+            if waited:
+                if stale is not None:
+                    # Alguém deste worker já está recalculando: serve o valor anterior
+                    self._stale(key)
+                    return stale
+                self.stampede["lock_waits"] += 1
+            started = time.monotonic()
+            async with lock:
+                self.stampede["lock_wait_ms"] += (time.monotonic() - started) * 1000
+                if waited:
+                    # Quem esperou o lock encontra o valor recém-gravado por outro chamador
+                    value, meta = await self._read(key)
+                    if value is not None and not _expired(meta) and (seen is None or meta != seen):
+                        return value
+                return await self._fetch_with_lease(key, fetch_func, ttl_seconds, policy, stale)
+
+    async def _fetch_with_lease(self, key: str, fetch_func: Callable, ttl_seconds: int, policy: tuple,
+                                stale: Any) -> Any:
+        cacheable, tags, negative, negative_ttl = policy
+        lease_key = f"cache:lease:{key}"
+        token = None
+        # Lease entre workers no Redis, ou no disco quando o Redis está fora
+        shared, _ = self._shared()
+        if shared is not None:
+            token = await shared.acquire_lock(lease_key, self.lock_ms)
+            if token is None:
+                self.stampede["lease_contended"] += 1
+                if stale is not None:
+                    self._stale(key)
+                    return stale
+                # Outro worker está recalculando: aguarda o valor dele até o lease expirar
+                deadline = time.monotonic() + self.lock_ms / 1000
+                while time.monotonic() < deadline:
+                    await asyncio.sleep(self.poll_ms / 1000)
+                    raw = _revive(await shared.get(key))
+                    value, meta = _unwrap(raw)
+                    if value is not None and not _expired(meta):
+                        await self._promote(key, raw, meta)
+                        return value
+                    token = await shared.acquire_lock(lease_key, self.lock_ms)
+                    if token:
+                        break
+
         try:
-            result = await fetch_func()
-            await self.set(key, result, ttl_seconds)
+            self.stampede["recomputes"] += 1
+            started = time.monotonic()
+            try:
+                result = await fetch_func()
+            except Exception as e:
+                self.stampede["fetch_errors"] += 1
+                cache_metrics.incr(key, "fetch_errors")
+                if stale is not None:
+                    print(f"⚠️ Falha ao recalcular {key}, servindo valor anterior: {e}")
+                    self._stale(key)
+                    return stale
+                print(f"❌ Erro ao executar função: {e}")
+                raise
+            finally:
+                cache_metrics.observe(key, "fetch", time.monotonic() - started)
+            if result is not None:
+                delta = time.monotonic() - started
+                if cacheable is None or cacheable(result):
+                    await self.set(key, result, ttl_seconds, delta=delta, tags=tags)
+                elif negative is not None and negative_ttl > 0 and negative(result):
+                    await self.set(key, result, negative_ttl, delta=delta, tags=tags, negative=True)
             return result
-        except Exception as e:
-            print(f"❌ Erro ao executar função: {e}")
-            raise
-    
+        finally:
+            if token:
+                await shared.release_lock(lease_key, token)
+
+    def get_stats(self) -> dict:
+        """Taxas de acerto por nível e métricas de proteção contra stampede (totais)"""
+        total = sum(self.stats.values())
+        hits = self.stats["l1_hits"] + self.stats["l2_hits"] + self.stats["disk_hits"]
+        return {
+            "redis_available": self.redis_available,
+            "disk_enabled": disk_cache.enabled,
+            "l1_enabled": self.l1_enabled,
+            "invalidation": l1_invalidator.get_stats(),
+            **self.stats,
+            "l1_hit_ratio": round(self.stats["l1_hits"] / total, 4) if total else None,
+            "l2_hit_ratio": round(self.stats["l2_hits"] / total, 4) if total else None,
+            "disk_hit_ratio": round(self.stats["disk_hits"] / total, 4) if total else None,
+            "hit_ratio": round(hits / total, 4) if total else None,
+            "stampede": {**self.stampede, "lock_wait_ms": round(self.stampede["lock_wait_ms"], 1)},
+            "negative": {"hits": cache_metrics.totals("negative_hits"), "writes": cache_metrics.totals("negative_writes")},
+        }
+
+    def namespace_stats(self) -> dict:
+        """Acertos, faltas, latências e bytes por namespace e nível"""
+        return cache_metrics.get_stats(memory_cache.bytes_by_namespace())
+
+    def prometheus(self) -> str:
+        """Métricas por namespace no formato texto do Prometheus"""
+        return cache_metrics.prometheus(memory_cache.bytes_by_namespace())
+
     async def disconnect(self):
         """Desconecta do Redis"""
-        if self.redis_available:
-            await redis_client.disconnect()
+        await memory_cache.stop_sweeper()
+        await l1_invalidator.stop()
+        await redis_client.disconnect()
+        await disk_cache.close()
 
 # Instância global do cache híbrido
 hybrid_cache = HybridCache()
@@ -0,0 +1,117 @@
+import asyncio
+import json
+import os
+import uuid
+from typing import Optional
+
+from .redis_client import redis_client
+from .memory_cache import memory_cache
+
+class L1Invalidator:
+    """Invalidação do L1 entre workers via Redis pub/sub.
+
+    Cada gravação, remoção ou limpeza feita por um worker é publicada no canal;
+    os demais removem as entradas correspondentes do seu L1. Enquanto a
+    inscrição estiver perdida, `subscribed` fica False e o HybridCache reduz o
+    TTL do L1 para `degraded_ttl`; ao reinscrever, o L1 é descartado porque
+    mensagens podem ter sido perdidas no intervalo.
+    """
+
+    def __init__(self):
+        self.channel = os.environ.get("CACHE_INVALIDATION_CHANNEL", "cache:l1:invalidate")
+        self.degraded_ttl = int(os.environ.get("CACHE_L1_DEGRADED_TTL_SECONDS", "5"))
+        self.origin = uuid.uuid4().hex
+        self.subscribed = False
+        self._task: Optional[asyncio.Task] = None
+        self._ever_subscribed = False
+        self.stats = {"published": 0, "received": 0, "keys_evicted": 0, "resubscriptions": 0}
+
+    def start(self):
+        if self._task is None and redis_client.configured:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.subscribed = False
+
+    async def _listen(self):
+        backoff = 0.5
+        while True:
+            if not redis_client.connected:
+                # Redis fora: o RedisClient reconecta; até lá o L1 usa o TTL degradado
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+                continue
+            pubsub = redis_client.client.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                if self._ever_subscribed:
+                    memory_cache.invalidate_all()
+                    self.stats["resubscriptions"] += 1
+                    print("🔁 Invalidação do L1 reinscrita - L1 descartado")
+                self._ever_subscribed = True
+                self.subscribed = True
+                backoff = 0.5
+                while True:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message is not None:
+                        await self._apply(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Inscrição de invalidação do L1 perdida: {e}")
+            finally:
+                self.subscribed = False
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+    async def _apply(self, data: str):
+        try:
+            message = json.loads(data)
+        except (TypeError, ValueError):
+            return
+        # As próprias mensagens já foram aplicadas localmente
+        if message.get("origin") == self.origin:
+            return
+        self.stats["received"] += 1
+        op = message.get("op")
+        if op == "keys":
+            for key in message.get("keys", []):
+                await memory_cache.delete(key)
+            self.stats["keys_evicted"] += len(message.get("keys", []))
+        elif op == "prefix":
+            self.stats["keys_evicted"] += await memory_cache.delete_prefix(message.get("prefix", ""))
+        elif op == "clear":
+            self.stats["keys_evicted"] += memory_cache.invalidate_all()
+
+    async def _publish(self, message: dict):
+        message["origin"] = self.origin
+        if await redis_client.publish(self.channel, json.dumps(message)):
+            self.stats["published"] += 1
+
+    async def invalidate_keys(self, keys: list):
+        """Avisa os outros workers que essas chaves mudaram"""
+        if keys:
+            await self._publish({"op": "keys", "keys": list(keys)})
+
+    async def invalidate_prefix(self, prefix: str):
+        await self._publish({"op": "prefix", "prefix": prefix})
+
+    async def invalidate_all(self):
+        await self._publish({"op": "clear"})
+
+    def get_stats(self) -> dict:
+        return {"channel": self.channel, "subscribed": self.subscribed, **self.stats}
+
+# Instância global da invalidação do L1
+l1_invalidator = L1Invalidator()
@@ -0,0 +1,104 @@
+import time
+from typing import Optional
+
+from .redis_client import redis_client
+
+# Índices mantidos na gravação (sorted sets com score = expiração no Redis):
+#   cache:index:<prefixo>  chaves de cada prefixo (namespace e subníveis, ex.: bens_disponiveis:IM)
+#   cache:tag:<tag>        chaves marcadas com a tag (ex.: grupo:IM)
+#   cache:namespaces       namespaces com chaves gravadas
+INDEX_PREFIX = "cache:index:"
+TAG_PREFIX = "cache:tag:"
+NAMESPACES = "cache:namespaces"
+
+def key_prefixes(key: str) -> list:
+    """Prefixos da chave nos separadores ':' (a própria chave se não houver separador)"""
+    parts = key.split(":")
+    if len(parts) == 1:
+        return [key]
+    return [":".join(parts[:i]) for i in range(1, len(parts))]
+
+def matches_prefix(key: str, prefix: str) -> bool:
+    return key == prefix or key.startswith(prefix + ":")
+
+def index_entries(expires: dict, tags: Optional[dict] = None) -> dict:
+    """Monta {sorted set: {chave: expiração}} para as chaves gravadas"""
+    entries = {}
+    for key, expires_at in expires.items():
+        for prefix in key_prefixes(key):
+            entries.setdefault(INDEX_PREFIX + prefix, {})[key] = expires_at
+        namespaces = entries.setdefault(NAMESPACES, {})
+        ns = key_prefixes(key)[0]
+        namespaces[ns] = max(expires_at, namespaces.get(ns, 0))
+        for tag in (tags or {}).get(key, ()):
+            entries.setdefault(TAG_PREFIX + tag, {})[key] = expires_at
+    return entries
+
+def unindex_entries(keys: list) -> dict:
+    """Monta {sorted set: [chaves]} para remover chaves apagadas dos índices de prefixo"""
+    entries = {}
+    for key in keys:
+        for prefix in key_prefixes(key):
+            entries.setdefault(INDEX_PREFIX + prefix, []).append(key)
+    return entries
+
+def _text(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+async def _live_members(name: str) -> list:
+    """Membros ainda não expirados de um índice (remove os expirados)"""
+    now = time.time()
+    try:
+        async with redis_client.client.pipeline(transaction=False) as pipe:
+            pipe.zremrangebyscore(name, "-inf", now)
+            pipe.zrangebyscore(name, now, "+inf")
+            _, members = await pipe.execute()
+        return [_text(m) for m in members]
+    except Exception as e:
+        redis_client.on_error(e)
+        print(f"❌ Erro ao ler índice {name} no Redis: {e}")
+        return []
+
+async def prefix_keys(prefix: str) -> list:
+    return await _live_members(INDEX_PREFIX + prefix)
+
+async def tag_keys(tag: str) -> list:
+    return await _live_members(TAG_PREFIX + tag)
+
+async def namespace_counts() -> dict:
+    """Quantidade de chaves vivas por namespace (ZCOUNT, sem KEYS)"""
+    now = time.time()
+    namespaces = await _live_members(NAMESPACES)
+    if not namespaces:
+        return {}
+    try:
+        async with redis_client.client.pipeline(transaction=False) as pipe:
+            for ns in namespaces:
+                pipe.zcount(INDEX_PREFIX + ns, now, "+inf")
+            counts = await pipe.execute()
+        return {ns: count for ns, count in zip(namespaces, counts) if count}
+    except Exception as e:
+        redis_client.on_error(e)
+        print(f"❌ Erro ao contar chaves por namespace no Redis: {e}")
+        return {}
+
+async def namespaces() -> list:
+    return await _live_members(NAMESPACES)
+
+async def drop_indexes():
+    """Remove os índices de prefixo e de tag e a lista de namespaces (depois de apagar as chaves)"""
+    try:
+        names = [NAMESPACES]
+        for pattern in (INDEX_PREFIX + "*", TAG_PREFIX + "*"):
+            names += [name async for name in redis_client.client.scan_iter(match=pattern, count=500)]
+        await redis_client.client.delete(*names)
+    except Exception as e:
+        redis_client.on_error(e)
+        print(f"❌ Erro ao remover índices do cache no Redis: {e}")
+
+async def drop_tag(tag: str):
+    try:
+        await redis_client.client.delete(TAG_PREFIX + tag)
+    except Exception as e:
+        redis_client.on_error(e)
+        print(f"❌ Erro ao remover tag {tag} no Redis: {e}")
@@ -1,63 +1,208 @@
 import asyncio
+import heapq
+import os
+import sys
+import time
+from collections import OrderedDict
 from typing import Any, Optional, Callable
-from datetime import datetime, timedelta
-import json
+from .columnar import ColumnarRows
+from .metrics import cache_metrics, namespace
+
+def approx_size(value: Any, _sample: int = 32) -> int:
+    """Tamanho aproximado em bytes (listas grandes são estimadas por amostragem)"""
+    if isinstance(value, ColumnarRows):
+        return value.approx_bytes()
+    if isinstance(value, (str, bytes, int, float, bool)) or value is None:
+        return sys.getsizeof(value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(approx_size(k) + approx_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        n = len(value)
+        if n <= _sample:
+            return sys.getsizeof(value) + sum(approx_size(v) for v in value)
+        amostra = sum(approx_size(value[i * n // _sample]) for i in range(_sample))
+        return sys.getsizeof(value) + amostra * n // _sample
+    return sys.getsizeof(value)
 
 class MemoryCache:
+    """Cache em memória limitado: LRU por número de entradas e orçamento aproximado
+    de bytes, com expiração em relógio monotônico controlada por um min-heap e
+    varrida periodicamente por uma task em segundo plano."""
+
     def __init__(self):
-        self._cache = {}
-        self._timestamps = {}
-    
+        self.max_entries = int(os.environ.get("MEMORY_CACHE_MAX_ENTRIES", "5000"))
+        self.max_bytes = int(os.environ.get("MEMORY_CACHE_MAX_BYTES", str(128 * 1024 * 1024)))
+        self.sweep_interval = float(os.environ.get("MEMORY_CACHE_SWEEP_SECONDS", "30"))
+        self._cache = OrderedDict()
+        self._expires = {}
+        self._sizes = {}
+        # Representações derivadas de cada entrada (ex.: JSON pronto da resposta)
+        self._views = {}
+        self._heap = []
+        self._bytes = 0
+        # Namespaces que não são cópia do L2 e sobrevivem à invalidação do L1 inteiro
+        self.preserved = set()
+        self._sweeper: Optional[asyncio.Task] = None
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
     async def get(self, key: str) -> Optional[Any]:
         """Busca valor no cache em memória"""
         if key not in self._cache:
+            self.stats["misses"] += 1
             return None
-            
+
         # Verifica se expirou
-        if key in self._timestamps:
-            if datetime.now() > self._timestamps[key]:
-                del self._cache[key]
-                del self._timestamps[key]
-                return None
-        
+        if time.monotonic() >= self._expires[key]:
+            self._remove(key)
+            self.stats["expirations"] += 1
+            cache_metrics.incr(key, "expirations", "l1")
+            self.stats["misses"] += 1
+            return None
+
+        self._cache.move_to_end(key)
+        self.stats["hits"] += 1
         return self._cache[key]
-    
+
     async def set(self, key: str, value: Any, ttl_seconds: int = 1800) -> bool:
         """Salva valor no cache em memória"""
+        size = approx_size(value)
+        if size > self.max_bytes:
+            # Maior que o orçamento inteiro: não vale guardar
+            self._remove(key)
+            return False
+
+        self._remove(key)
+        expires_at = time.monotonic() + ttl_seconds
         self._cache[key] = value
-        self._timestamps[key] = datetime.now() + timedelta(seconds=ttl_seconds)
+        self._expires[key] = expires_at
+        self._sizes[key] = size
+        self._bytes += size
+        heapq.heappush(self._heap, (expires_at, key))
+        self._evict()
         return True
-    
+
     async def delete(self, key: str) -> bool:
         """Remove valor do cache"""
+        self._remove(key)
+        return True
+
+    async def delete_prefix(self, prefix: str) -> int:
+        """Remove a chave `prefix` e todas as chaves abaixo dela (`prefix:...`)"""
+        keys = [k for k in self._cache if k == prefix or k.startswith(prefix + ":")]
+        for key in keys:
+            self._remove(key)
+        return len(keys)
+
+    def peek(self, key: str) -> Optional[Any]:
+        """Valor atual da chave sem contar acerto nem mexer na ordem do LRU"""
+        if key in self._cache and time.monotonic() < self._expires[key]:
+            return self._cache[key]
+        return None
+
+    def get_view(self, key: str, name: str) -> Optional[bytes]:
+        return self._views.get(key, {}).get(name)
+
+    def set_view(self, key: str, name: str, body: bytes) -> bool:
+        """Guarda uma representação da entrada; some junto com ela (regravação, remoção, evição)"""
+        if key not in self._cache:
+            return False
+        views = self._views.setdefault(key, {})
+        size = len(body) - len(views.get(name, b""))
+        views[name] = body
+        self._sizes[key] += size
+        self._bytes += size
+        self._evict()
+        return True
+
+    def _remove(self, key: str):
         if key in self._cache:
             del self._cache[key]
-        if key in self._timestamps:
-            del self._timestamps[key]
-        return True
-    
-    async def get_or_set(self, key: str, fetch_func: Callable, ttl_seconds: int = 1800) -> Any:
-        """Busca no cache ou executa função e salva resultado"""
-        # Tenta buscar no cache
-        cached_value = await self.get(key)
-        if cached_value is not None:
-            print(f"📦 Memory Cache HIT: {key}")
-            return cached_value
-        
-        # Cache miss - executa função
-        print(f"🔄 Memory Cache MISS: {key} - executando função")
-        try:
-            result = await fetch_func()
-            await self.set(key, result, ttl_seconds)
-            return result
-        except Exception as e:
-            print(f"❌ Erro ao executar função: {e}")
-            raise
-    
+            del self._expires[key]
+            self._views.pop(key, None)
+            self._bytes -= self._sizes.pop(key)
+
+    def _evict(self):
+        """Remove as entradas menos usadas até caber nos limites"""
+        while self._cache and (len(self._cache) > self.max_entries or self._bytes > self.max_bytes):
+            key = next(iter(self._cache))
+            self._remove(key)
+            self.stats["evictions"] += 1
+            cache_metrics.incr(key, "evictions", "l1")
+
+    def purge_expired(self) -> int:
+        """Remove entradas vencidas a partir do topo do heap"""
+        now = time.monotonic()
+        removed = 0
+        while self._heap and self._heap[0][0] <= now:
+            expires_at, key = heapq.heappop(self._heap)
+            # Entradas do heap podem estar obsoletas (chave regravada ou removida)
+            if self._expires.get(key) == expires_at:
+                self._remove(key)
+                cache_metrics.incr(key, "expirations", "l1")
+                removed += 1
+        self.stats["expirations"] += removed
+        # Evita que entradas obsoletas acumulem no heap
+        if len(self._heap) > 2 * len(self._cache) + 64:
+            self._heap = [(exp, k) for k, exp in self._expires.items()]
+            heapq.heapify(self._heap)
+        return removed
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            self.purge_expired()
+
+    def start_sweeper(self):
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_loop())
+
+    async def stop_sweeper(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+
+    async def get_or_set(self, key: str, fetch_func, ttl_seconds: int = 1800) -> Any:
+        """Delegado para hybrid_cache.get_or_set (lock por chave, lease entre workers,
+        refresh antecipado e valor anterior em caso de erro), que usa este cache como L1"""
+        from .hybrid_cache import hybrid_cache
+        return await hybrid_cache.get_or_set(key, fetch_func, ttl_seconds)
+
     def clear(self):
         """Limpa todo o cache"""
         self._cache.clear()
-        self._timestamps.clear()
+        self._expires.clear()
+        self._sizes.clear()
+        self._views.clear()
+        self._heap.clear()
+        self._bytes = 0
+
+    def invalidate_all(self) -> int:
+        """Descarta as entradas copiadas do L2, mantendo os namespaces em `preserved`"""
+        keys = [k for k in self._cache if namespace(k) not in self.preserved]
+        for key in keys:
+            self._remove(key)
+        return len(keys)
+
+    def bytes_by_namespace(self) -> dict:
+        """Tamanho aproximado ocupado por namespace"""
+        sizes = {}
+        for key, size in self._sizes.items():
+            ns = namespace(key)
+            sizes[ns] = sizes.get(ns, 0) + size
+        return sizes
+
+    def get_stats(self) -> dict:
+        return {
+            "entries": len(self._cache),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            **self.stats,
+        }
 
 # Instância global do cache em memória
 memory_cache = MemoryCache()
@@ -0,0 +1,95 @@
+from collections import defaultdict
+
+def namespace(key: str) -> str:
+    return key.split(":", 1)[0]
+
+class _Summary:
+    """Contagem, soma e máximo de uma latência (em segundos)"""
+
+    __slots__ = ("count", "total", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total / self.count * 1000, 2) if self.count else None,
+            "max_ms": round(self.max * 1000, 2),
+        }
+
+class CacheMetrics:
+    """Contadores do cache por namespace (prefixo da chave) e por nível (l1, l2).
+
+    Registra acertos, faltas, entradas negativas (resultado vazio) lidas e
+    gravadas, valores vencidos servidos, latência de leitura do L2 e de
+    recálculo (fetch), bytes lidos/gravados no L2 e evições/expirações do L1.
+    Exportado em /utils/cache/stats e em formato Prometheus em /utils/metrics.
+    """
+
+    COUNTERS = ("hits", "misses", "negative_hits", "negative_writes", "stale_served", "fetch_errors",
+                "evictions", "expirations", "bytes_read", "bytes_written")
+
+    def __init__(self):
+        # counters[namespace][(nome, nível)] = valor
+        self.counters = defaultdict(lambda: defaultdict(int))
+        self.latency = defaultdict(lambda: defaultdict(_Summary))
+
+    def incr(self, key: str, name: str, tier: str = "", amount: int = 1):
+        self.counters[namespace(key)][(name, tier)] += amount
+
+    def observe(self, key: str, name: str, seconds: float):
+        self.latency[namespace(key)][name].observe(seconds)
+
+    def totals(self, name: str, tier: str = "") -> int:
+        return sum(c.get((name, tier), 0) for c in self.counters.values())
+
+    def get_stats(self, l1_bytes: dict = None) -> dict:
+        """Estatísticas por namespace; `l1_bytes` é o tamanho atual no L1 por namespace"""
+        out = {}
+        for ns in sorted(set(self.counters) | set(self.latency) | set(l1_bytes or {})):
+            counters = self.counters.get(ns, {})
+            tiers = {}
+            for (name, tier), value in counters.items():
+                tiers.setdefault(tier or "total", {})[name] = value
+            hits = sum(v for (name, _), v in counters.items() if name == "hits")
+            lookups = hits + counters.get(("misses", ""), 0)
+            out[ns] = {
+                **tiers,
+                "hit_ratio": round(hits / lookups, 4) if lookups else None,
+                "l1_bytes": (l1_bytes or {}).get(ns, 0),
+                "latency": {name: s.as_dict() for name, s in self.latency.get(ns, {}).items()},
+            }
+        return out
+
+    def prometheus(self, l1_bytes: dict = None) -> str:
+        """Exporta no formato texto do Prometheus"""
+        lines = []
+        # Amostras de uma mesma métrica precisam ficar juntas, logo após o # TYPE
+        for metric in self.COUNTERS:
+            lines.append(f"# TYPE cache_{metric}_total counter")
+            for ns, counters in sorted(self.counters.items()):
+                for (name, tier), value in sorted(counters.items()):
+                    if name == metric:
+                        labels = f'namespace="{ns}"' + (f',tier="{tier}"' if tier else "")
+                        lines.append(f"cache_{metric}_total{{{labels}}} {value}")
+        lines.append("# TYPE cache_latency_seconds summary")
+        for ns, summaries in sorted(self.latency.items()):
+            for name, s in sorted(summaries.items()):
+                labels = f'namespace="{ns}",op="{name}"'
+                lines.append(f"cache_latency_seconds_count{{{labels}}} {s.count}")
+                lines.append(f"cache_latency_seconds_sum{{{labels}}} {s.total:.6f}")
+        lines.append("# TYPE cache_l1_bytes gauge")
+        for ns, size in sorted((l1_bytes or {}).items()):
+            lines.append(f'cache_l1_bytes{{namespace="{ns}"}} {size}')
+        return "\n".join(lines) + "\n"
+
+# Instância global das métricas do cache
+cache_metrics = CacheMetrics()
@@ -1,15 +1,48 @@
 import os
-import json
 import asyncio
+import random
+import time
+import uuid
 from typing import Optional, Any
 import redis.asyncio as redis
 from datetime import timedelta
+from .columnar import revive_dataset
+from .codec import redis_codec
+from .metrics import cache_metrics
+
+# Compare-and-delete: só remove o lock se o token ainda for o nosso
+_RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
 
 class RedisClient:
+    """Cliente Redis com pool explícito, timeouts e reconexão automática.
+
+    Um health check em segundo plano pinga o Redis; quando uma operação falha
+    por conexão/timeout o cliente entra em fast-fail (`connected = False`) e
+    todas as chamadas pulam o Redis até a próxima reconexão, tentada com
+    backoff exponencial.
+    """
+
     def __init__(self):
         self.client: Optional[redis.Redis] = None
         self.connected = False
+        self.configured = False
         self.is_upstash = False
+        self.max_connections = int(os.environ.get("REDIS_MAX_CONNECTIONS", "20"))
+        self.socket_timeout = float(os.environ.get("REDIS_SOCKET_TIMEOUT_SECONDS", "2"))
+        self.connect_timeout = float(os.environ.get("REDIS_CONNECT_TIMEOUT_SECONDS", "2"))
+        self.probe_interval = float(os.environ.get("REDIS_HEALTH_PROBE_SECONDS", "10"))
+        self.fast_fail_seconds = float(os.environ.get("REDIS_FAST_FAIL_SECONDS", "5"))
+        self.max_backoff = float(os.environ.get("REDIS_RECONNECT_MAX_BACKOFF_SECONDS", "60"))
+        self._monitor: Optional[asyncio.Task] = None
+        self.down_until = 0.0
+        self.last_error: Optional[str] = None
+        self.failures = 0
+        self.reconnects = 0
     
     def _get_config(self):
         """Carrega configurações Redis das variáveis de ambiente"""
@@ -18,62 +51,131 @@ class RedisClient:
             "upstash_rest_url": os.environ.get("UPSTASH_REDIS_REST_URL", ""),
             "upstash_token": os.environ.get("UPSTASH_REDIS_REST_TOKEN", "")
         }
-        
-    async def connect(self):
-        """Conecta ao Redis (tradicional ou Upstash)"""
+
+    def _build_pool(self) -> Optional[redis.ConnectionPool]:
+        """Pool de conexões com limites e timeouts explícitos (Upstash ou Redis tradicional)"""
         config = self._get_config()
-        upstash_rest_url = config["upstash_rest_url"]
-        upstash_token = config["upstash_token"]
-        redis_url = config["redis_url"]
-        
+        common = {
+            "max_connections": self.max_connections,
+            "socket_timeout": self.socket_timeout,
+            "socket_connect_timeout": self.connect_timeout,
+            "health_check_interval": 30,
+            # Valores são bytes (ver codec.py)
+            "decode_responses": False,
+        }
         # Prioriza Upstash se configurado
-        if upstash_rest_url and upstash_token:
-            try:
-                # Converte URL REST do Upstash para URL Redis tradicional
-                # https://neutral-penguin-9127.upstash.io -> redis://neutral-penguin-9127.upstash.io:6379
-                redis_host = upstash_rest_url.replace("https://", "").replace("http://", "")
-                
-                # Usar configuração SSL mais compatível
-                self.client = redis.Redis(
-                    host=redis_host,
-                    port=6379,
-                    password=upstash_token,
-                    decode_responses=True,
-                    ssl=True,
-                    ssl_cert_reqs=None
-                )
-                await self.client.ping()
-                self.connected = True
-                self.is_upstash = True
-                print("✅ Upstash Redis conectado com sucesso")
-                return True
-            except Exception as e:
-                print(f"❌ Erro ao conectar Upstash Redis: {e}")
-                self.connected = False
-                return False
-        
+        if config["upstash_rest_url"] and config["upstash_token"]:
+            # Converte URL REST do Upstash para host Redis
+            # https://neutral-penguin-9127.upstash.io -> neutral-penguin-9127.upstash.io:6379
+            redis_host = config["upstash_rest_url"].replace("https://", "").replace("http://", "")
+            self.is_upstash = True
+            return redis.ConnectionPool(
+                connection_class=redis.SSLConnection,
+                host=redis_host,
+                port=6379,
+                password=config["upstash_token"],
+                ssl_cert_reqs=None,
+                **common,
+            )
         # Fallback para Redis tradicional
-        elif redis_url:
-            try:
-                self.client = redis.from_url(redis_url, decode_responses=True)
-                await self.client.ping()
-                self.connected = True
-                self.is_upstash = False
-                print("✅ Redis tradicional conectado com sucesso")
-                return True
-            except Exception as e:
-                print(f"❌ Erro ao conectar Redis tradicional: {e}")
-                self.connected = False
-                return False
+        if config["redis_url"]:
+            self.is_upstash = False
+            return redis.ConnectionPool.from_url(config["redis_url"], **common)
+        return None
         
-        else:
-            print("⚠️ Nenhuma configuração Redis encontrada - usando cache em memória")
+    async def connect(self):
+        """Conecta ao Redis (tradicional ou Upstash)"""
+        if self.client is None:
+            pool = self._build_pool()
+            if pool is None:
+                print("⚠️ Nenhuma configuração Redis encontrada - usando cache em memória")
+                return False
+            self.configured = True
+            self.client = redis.Redis(connection_pool=pool)
+
+        nome = "Upstash Redis" if self.is_upstash else "Redis tradicional"
+        try:
+            await self.client.ping()
+            self.connected = True
+            self.last_error = None
+            print(f"✅ {nome} conectado com sucesso")
+            return True
+        except Exception as e:
+            print(f"❌ Erro ao conectar {nome}: {e}")
+            self._mark_down(e)
             return False
+
+    def _mark_down(self, error: Exception):
+        """Entra em fast-fail: o Redis é ignorado até a próxima reconexão"""
+        if self.connected:
+            print(f"⚠️ Redis indisponível - usando apenas memória: {error}")
+        self.connected = False
+        self.failures += 1
+        self.last_error = f"{type(error).__name__}: {error}"
+        self.down_until = time.monotonic() + self.fast_fail_seconds
+
+    def on_error(self, error: Exception):
+        # Só falhas de conexão/timeout derrubam o cliente; erros de dados não
+        if isinstance(error, (redis.ConnectionError, redis.TimeoutError, OSError, asyncio.TimeoutError)):
+            self._mark_down(error)
+
+    def start_monitor(self):
+        """Inicia o health check/reconexão em segundo plano (se houver Redis configurado)"""
+        if self.configured and self._monitor is None:
+            self._monitor = asyncio.create_task(self._monitor_loop())
+
+    async def _monitor_loop(self):
+        backoff = self.fast_fail_seconds
+        while True:
+            if self.connected:
+                backoff = self.fast_fail_seconds
+                await asyncio.sleep(self.probe_interval)
+                try:
+                    await asyncio.wait_for(self.client.ping(), self.socket_timeout)
+                except Exception as e:
+                    self._mark_down(e)
+                continue
+
+            await asyncio.sleep(max(0.0, self.down_until - time.monotonic()))
+            if await self.connect():
+                self.reconnects += 1
+                print("🔁 Redis reconectado")
+            else:
+                backoff = min(backoff * 2, self.max_backoff)
+                self.down_until = time.monotonic() + backoff * random.uniform(0.8, 1.2)
+
+    def get_state(self) -> dict:
+        """Estado da conexão para health/stats"""
+        if not self.configured:
+            state = "disabled"
+        else:
+            state = "up" if self.connected else "down"
+        pool = self.client.connection_pool if self.client else None
+        return {
+            "state": state,
+            "is_upstash": self.is_upstash,
+            "failures": self.failures,
+            "reconnects": self.reconnects,
+            "last_error": self.last_error,
+            "retry_in_seconds": round(max(0.0, self.down_until - time.monotonic()), 1) if state == "down" else None,
+            "pool": {
+                "max_connections": self.max_connections,
+                "in_use": len(getattr(pool, "_in_use_connections", ())),
+                "available": len(getattr(pool, "_available_connections", ())),
+            } if pool else None,
+        }
     
     async def disconnect(self):
         """Desconecta do Redis"""
+        if self._monitor is not None:
+            self._monitor.cancel()
+            try:
+                await self._monitor
+            except asyncio.CancelledError:
+                pass
+            self._monitor = None
         if self.client:
-            await self.client.aclose()
+            await self.client.aclose(close_connection_pool=True)
             self.connected = False
     
     async def get(self, key: str) -> Optional[Any]:
@@ -82,27 +184,78 @@ class RedisClient:
             return None
             
         try:
+            started = time.perf_counter()
             value = await self.client.get(key)
+            cache_metrics.observe(key, "l2_read", time.perf_counter() - started)
             if value:
-                return json.loads(value)
+                cache_metrics.incr(key, "bytes_read", "l2", len(value))
+                return revive_dataset(redis_codec.decode(value))
             return None
         except Exception as e:
+            self.on_error(e)
             print(f"❌ Erro ao buscar no Redis: {e}")
             return None
     
+    async def get_many(self, keys: list) -> list:
+        """Busca vários valores em uma única ida ao Redis (MGET), na ordem das chaves"""
+        if not self.connected or not self.client or not keys:
+            return [None] * len(keys)
+
+        try:
+            started = time.perf_counter()
+            values = await self.client.mget(keys)
+            elapsed = time.perf_counter() - started
+            for key, value in zip(keys, values):
+                cache_metrics.observe(key, "l2_read", elapsed)
+                if value:
+                    cache_metrics.incr(key, "bytes_read", "l2", len(value))
+            return [revive_dataset(redis_codec.decode(v)) if v else None for v in values]
+        except Exception as e:
+            self.on_error(e)
+            print(f"❌ Erro ao buscar múltiplas chaves no Redis: {e}")
+            return [None] * len(keys)
+
     async def set(self, key: str, value: Any, ttl_seconds: int = 1800) -> bool:
         """Salva valor no cache com TTL (padrão 30 minutos)"""
         if not self.connected or not self.client:
             return False
             
         try:
-            json_value = json.dumps(value, ensure_ascii=False)
-            await self.client.setex(key, ttl_seconds, json_value)
+            payload = redis_codec.encode(value)
+            await self.client.setex(key, ttl_seconds, payload)
+            cache_metrics.incr(key, "bytes_written", "l2", len(payload))
             return True
         except Exception as e:
+            self.on_error(e)
             print(f"❌ Erro ao salvar no Redis: {e}")
             return False
     
+    async def set_many(self, items: dict, ttl_seconds: int = 1800, indexes: Optional[dict] = None) -> bool:
+        """Salva vários valores em uma única ida ao Redis (SETEX em pipeline).
+
+        `indexes` ({sorted set: {membro: score}}) é gravado no mesmo pipeline.
+        """
+        if not self.connected or not self.client:
+            return False
+        if not items:
+            return True
+
+        try:
+            payloads = {key: redis_codec.encode(value) for key, value in items.items()}
+            async with self.client.pipeline(transaction=False) as pipe:
+                for key, payload in payloads.items():
+                    pipe.setex(key, ttl_seconds, payload)
+                for name, members in (indexes or {}).items():
+                    pipe.zadd(name, members)
+                await pipe.execute()
+            for key, payload in payloads.items():
+                cache_metrics.incr(key, "bytes_written", "l2", len(payload))
+            return True
+        except Exception as e:
+            self.on_error(e)
+            print(f"❌ Erro ao salvar múltiplas chaves no Redis: {e}")
+            return False
+
     async def delete(self, key: str) -> bool:
         """Remove valor do cache"""
         if not self.connected or not self.client:
@@ -112,26 +265,75 @@ class RedisClient:
             await self.client.delete(key)
             return True
         except Exception as e:
+            self.on_error(e)
             print(f"❌ Erro ao deletar do Redis: {e}")
             return False
     
-    async def get_or_set(self, key: str, fetch_func, ttl_seconds: int = 1800) -> Any:
-        """Busca no cache ou executa função e salva resultado"""
-        # Tenta buscar no cache
-        cached_value = await self.get(key)
-        if cached_value is not None:
-            print(f"📦 Cache HIT: {key}")
-            return cached_value
-        
-        # Cache miss - executa função
-        print(f"🔄 Cache MISS: {key} - executando função")
+    async def delete_many(self, keys: list, unindex: Optional[dict] = None) -> int:
+        """Remove várias chaves com um único DEL; retorna quantas existiam.
+
+        `unindex` ({sorted set: [membros]}) é removido no mesmo pipeline.
+        """
+        if not self.connected or not self.client or not keys:
+            return 0
+
+        try:
+            async with self.client.pipeline(transaction=False) as pipe:
+                pipe.delete(*keys)
+                for name, members in (unindex or {}).items():
+                    pipe.zrem(name, *members)
+                results = await pipe.execute()
+            return results[0]
+        except Exception as e:
+            self.on_error(e)
+            print(f"❌ Erro ao deletar múltiplas chaves do Redis: {e}")
+            return 0
+
+    async def acquire_lock(self, key: str, ttl_ms: int) -> Optional[str]:
+        """Tenta obter um lease curto (SET NX PX); retorna o token ou None"""
+        if not self.connected or not self.client:
+            return None
+
         try:
-            result = await fetch_func()
-            await self.set(key, result, ttl_seconds)
-            return result
+            token = uuid.uuid4().hex
+            if await self.client.set(key, token, nx=True, px=ttl_ms):
+                return token
+            return None
+        except Exception as e:
+            self.on_error(e)
+            print(f"❌ Erro ao obter lock no Redis: {e}")
+            return None
+
+    async def release_lock(self, key: str, token: str) -> bool:
+        """Libera o lease apenas se ainda pertencer ao token informado"""
+        if not self.connected or not self.client:
+            return False
+
+        try:
+            return bool(await self.client.eval(_RELEASE_LOCK_SCRIPT, 1, key, token))
         except Exception as e:
-            print(f"❌ Erro ao executar função: {e}")
-            raise
+            self.on_error(e)
+            print(f"❌ Erro ao liberar lock no Redis: {e}")
+            return False
+
+    async def publish(self, channel: str, message: str) -> bool:
+        """Publica uma mensagem em um canal pub/sub"""
+        if not self.connected or not self.client:
+            return False
+
+        try:
+            await self.client.publish(channel, message)
+            return True
+        except Exception as e:
+            self.on_error(e)
+            print(f"❌ Erro ao publicar no Redis: {e}")
+            return False
+
+    async def get_or_set(self, key: str, fetch_func, ttl_seconds: int = 1800) -> Any:
+        """Delegado para hybrid_cache.get_or_set (lock por chave, lease SET NX, refresh
+        antecipado e valor anterior em caso de erro), com o Redis como L2"""
+        from .hybrid_cache import hybrid_cache
+        return await hybrid_cache.get_or_set(key, fetch_func, ttl_seconds)
 
 # Instância global do Redis
 redis_client = RedisClient()
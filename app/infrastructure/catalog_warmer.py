@@ -0,0 +1,158 @@
+import asyncio
+import os
+import random
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from app.infrastructure.cache.redis_client import redis_client
+from app.infrastructure.cache.disk_cache import disk_cache
+from app.infrastructure.newcon_cache import CATALOG_TTL_SECONDS, refresh_call, bens_params
+from app.infrastructure.newcon_client import NewconClient
+
+FAMILIES = ("tipos_grupos", "tipos_vendas", "bens_disponiveis", "calendario_assembleias")
+
+class CatalogWarmer:
+    """Aquece o catálogo em segundo plano (stale-while-revalidate).
+
+    A cada ciclo percorre cnsTiposGrupos → cnsTiposVendas → cnsBensDisponiveis e
+    cnsCalendarioAssembleias com concorrência limitada e jitter, regravando as
+    chaves antes de expirarem. Os leitores continuam recebendo o valor atual até
+    a nova versão ser gravada; falhas de refresh mantêm o valor anterior. Um
+    lease no Redis (ou no cache em disco, sem Redis) garante que apenas um
+    worker aqueça por ciclo; como o lease do disco sobrevive ao restart, um
+    processo reiniciado não reaquece um catálogo que ainda está no disco. O
+    lease vence antes do menor intervalo até o próximo ciclo (intervalo -
+    jitter), então o próprio worker nunca encontra o lease dele ainda ativo.
+    """
+
+    def __init__(self):
+        self.enabled = os.environ.get("CATALOG_WARMER", "true").lower() in ("1", "true", "yes")
+        self.interval = float(os.environ.get("CATALOG_WARMER_INTERVAL_SECONDS", str(CATALOG_TTL_SECONDS * 0.8)))
+        self.jitter = float(os.environ.get("CATALOG_WARMER_JITTER_SECONDS", "60"))
+        # 90% do menor intervalo possível entre dois ciclos do mesmo worker
+        self.lease_seconds = max(1.0, self.interval - self.jitter) * 0.9
+        self.initial_delay = float(os.environ.get("CATALOG_WARMER_INITIAL_DELAY_SECONDS", "5"))
+        self.concurrency = int(os.environ.get("CATALOG_WARMER_CONCURRENCY", "4"))
+        self.request_jitter = float(os.environ.get("CATALOG_WARMER_REQUEST_JITTER_MS", "200")) / 1000
+        self._task: Optional[asyncio.Task] = None
+        self._sem: Optional[asyncio.Semaphore] = None
+        self.running = False
+        self.cycles = 0
+        self.next_run: Optional[str] = None
+        self.families = {f: self._empty_progress() for f in FAMILIES}
+
+    @staticmethod
+    def _empty_progress() -> dict:
+        return {"keys_total": 0, "keys_done": 0, "errors": 0, "last_refresh": None, "last_duration_seconds": None}
+
+    def start(self, nc: NewconClient):
+        if not self.enabled or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._loop(nc))
+        print("🔥 Warmer do catálogo iniciado")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self, nc: NewconClient):
+        delay = self.initial_delay
+        while True:
+            self.next_run = datetime.fromtimestamp(time.time() + delay, timezone.utc).isoformat()
+            await asyncio.sleep(delay)
+            try:
+                await self.run_once(nc)
+            except Exception as e:
+                print(f"❌ Erro no warmer do catálogo: {e}")
+            delay = max(1.0, self.interval + random.uniform(-self.jitter, self.jitter))
+
+    async def run_once(self, nc: NewconClient) -> bool:
+        """Executa um ciclo completo; retorna False se outro worker já está aquecendo"""
+        token = None
+        lock_key = "catalog_warmer:lock"
+        lease = redis_client if redis_client.connected else disk_cache if disk_cache.enabled else None
+        if lease is not None:
+            token = await lease.acquire_lock(lock_key, int(self.lease_seconds * 1000))
+            if token is None:
+                return False
+
+        self.running = True
+        self._sem = asyncio.Semaphore(self.concurrency)
+        try:
+            for family in FAMILIES:
+                self.families[family].update(keys_total=0, keys_done=0, errors=0)
+            started = time.monotonic()
+            await asyncio.gather(self._warm_tree(nc), self._warm_calendario(nc))
+            self.cycles += 1
+            print(f"🔥 Catálogo aquecido em {time.monotonic() - started:.1f}s")
+            # O lease fica até expirar: os outros workers pulam o restante deste intervalo
+            return True
+        except BaseException:
+            if token:
+                await lease.release_lock(lock_key, token)
+            raise
+        finally:
+            self.running = False
+
+    async def _fetch(self, family: str, nc: NewconClient, method: str, params: dict) -> Optional[dict]:
+        """Busca e regrava uma chave (política do método); em erro mantém o valor atual no cache"""
+        progress = self.families[family]
+        progress["keys_total"] += 1
+        async with self._sem:
+            await asyncio.sleep(random.uniform(0, self.request_jitter))
+            try:
+                data = await refresh_call(nc, method, params)
+            except Exception as e:
+                progress["errors"] += 1
+                print(f"⚠️ Warmer falhou em {method} {params}: {e}")
+                return None
+        progress["keys_done"] += 1
+        return data
+
+    def _finish(self, family: str, started: float):
+        progress = self.families[family]
+        progress["last_refresh"] = datetime.now(timezone.utc).isoformat()
+        progress["last_duration_seconds"] = round(time.monotonic() - started, 2)
+
+    async def _warm_tree(self, nc: NewconClient):
+        started = time.monotonic()
+        tipos = await self._fetch("tipos_grupos", nc, "cnsTiposGrupos", {})
+        self._finish("tipos_grupos", started)
+        grupos = [str(i["CODIGO_TIPO_GRUPO"]) for i in (tipos or {}).get("items", []) if i.get("CODIGO_TIPO_GRUPO")]
+
+        async def warm_grupo(grupo: str):
+            vendas = await self._fetch("tipos_vendas", nc, "cnsTiposVendas", {"Codigo_Tipo_Grupo": grupo})
+            codigos = [str(i["CODIGO_TIPO_VENDA"]) for i in (vendas or {}).get("items", []) if i.get("CODIGO_TIPO_VENDA")]
+            await asyncio.gather(*(
+                self._fetch("bens_disponiveis", nc, "cnsBensDisponiveis", bens_params(grupo, v))
+                for v in codigos
+            ))
+
+        await asyncio.gather(*(warm_grupo(g) for g in grupos))
+        self._finish("tipos_vendas", started)
+        self._finish("bens_disponiveis", started)
+
+    async def _warm_calendario(self, nc: NewconClient):
+        started = time.monotonic()
+        await self._fetch("calendario_assembleias", nc, "cnsCalendarioAssembleias", {})
+        self._finish("calendario_assembleias", started)
+
+    def get_stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "running": self.running,
+            "cycles": self.cycles,
+            "interval_seconds": self.interval,
+            "lease_seconds": round(self.lease_seconds, 1),
+            "next_run": self.next_run,
+            "families": self.families,
+        }
+
+# Instância global do warmer do catálogo
+catalog_warmer = CatalogWarmer()
@@ -0,0 +1,152 @@
+import asyncio
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+import httpx
+
+class UpstreamOverloaded(Exception):
+    """Chamada rejeitada pelo limitador (fila cheia ou espera acima do orçamento)"""
+
+    def __init__(self, status_code: int, code: str, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+        self.code = code
+
+class AdaptiveLimiter:
+    """Limitador de concorrência AIMD para o upstream Newcon.
+
+    A janela cresce aditivamente (+1/limite por chamada bem-sucedida dentro da
+    latência alvo) e encolhe multiplicativamente quando a latência passa do alvo
+    ou a chamada termina em timeout/erro de rede. Escritas (prc*) podem usar toda
+    a janela; leituras (cns*) ficam com a janela menos as vagas reservadas, e as
+    escritas na fila são atendidas primeiro.
+    """
+
+    def __init__(self):
+        self.enabled = os.environ.get("NEWCON_LIMITER", "true").lower() in ("1", "true", "yes")
+        self.min_limit = max(1, int(os.environ.get("NEWCON_LIMITER_MIN", "2")))
+        self.max_limit = int(os.environ.get("NEWCON_LIMITER_MAX", "20"))
+        self.limit = float(os.environ.get("NEWCON_LIMITER_INITIAL", "10"))
+        self.reserved_writes = int(os.environ.get("NEWCON_LIMITER_RESERVED_WRITES", "2"))
+        self.target_latency = float(os.environ.get("NEWCON_LIMITER_TARGET_LATENCY_MS", "3000")) / 1000
+        self.backoff = float(os.environ.get("NEWCON_LIMITER_BACKOFF", "0.9"))
+        self.queue_timeout = float(os.environ.get("NEWCON_LIMITER_QUEUE_TIMEOUT_MS", "2000")) / 1000
+        self.max_queue = int(os.environ.get("NEWCON_LIMITER_MAX_QUEUE", "100"))
+        self.inflight = 0
+        self._queues = {"write": deque(), "read": deque()}
+        self.stats = {"acquired": 0, "queued": 0, "rejected_queue_full": 0, "rejected_timeout": 0,
+                      "increases": 0, "decreases": 0}
+
+    @staticmethod
+    def priority_for(method: str) -> str:
+        return "write" if method.startswith("prc") else "read"
+
+    def _capacity(self, priority: str) -> int:
+        limit = int(self.limit)
+        if priority == "write":
+            return limit
+        return max(1, limit - self.reserved_writes)
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    async def acquire(self, priority: str):
+        ahead = self._queues["write"] if priority == "read" else ()
+        if self.inflight < self._capacity(priority) and not self._queues[priority] and not ahead:
+            self.inflight += 1
+            self.stats["acquired"] += 1
+            return
+
+        if self.queue_depth >= self.max_queue:
+            self.stats["rejected_queue_full"] += 1
+            raise UpstreamOverloaded(429, "upstream_queue_full", "Fila de chamadas ao Newcon cheia, tente novamente")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._queues[priority].append(waiter)
+        self.stats["queued"] += 1
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._abandon(priority, waiter)
+            self.stats["rejected_timeout"] += 1
+            raise UpstreamOverloaded(503, "upstream_overloaded", "Newcon sobrecarregado, tente novamente em instantes")
+        except asyncio.CancelledError:
+            self._abandon(priority, waiter)
+            raise
+        self.stats["acquired"] += 1
+
+    def release(self, latency: float, dropped: bool = False):
+        self.inflight -= 1
+        if dropped or latency > self.target_latency:
+            new_limit = max(self.min_limit, self.limit * self.backoff)
+            if new_limit < self.limit:
+                self.stats["decreases"] += 1
+            self.limit = new_limit
+        elif self.inflight + 1 >= self.limit / 2:
+            # Só cresce quando a janela está de fato sendo usada
+            new_limit = min(self.max_limit, self.limit + 1 / self.limit)
+            if new_limit > self.limit:
+                self.stats["increases"] += 1
+            self.limit = new_limit
+        self._wake()
+
+    def _wake(self):
+        for priority in ("write", "read"):
+            queue = self._queues[priority]
+            while queue and self.inflight < self._capacity(priority):
+                waiter = queue.popleft()
+                if waiter.done():
+                    continue
+                self.inflight += 1
+                waiter.set_result(True)
+            if queue:
+                # Escritas ainda aguardando têm precedência sobre leituras
+                break
+
+    def _abandon(self, priority: str, waiter):
+        """Desiste da espera (timeout/cancelamento); devolve a vaga se ela já tinha sido concedida"""
+        if waiter.done() and not waiter.cancelled():
+            self.inflight -= 1
+            self._wake()
+        else:
+            self._discard(priority, waiter)
+
+    def _discard(self, priority: str, waiter):
+        try:
+            self._queues[priority].remove(waiter)
+        except ValueError:
+            pass
+
+    @asynccontextmanager
+    async def slot(self, method: str):
+        """Ocupa uma vaga durante a chamada upstream e realimenta a janela com a latência"""
+        if not self.enabled:
+            yield
+            return
+
+        await self.acquire(self.priority_for(method))
+        start = time.monotonic()
+        dropped = False
+        try:
+            yield
+        except (httpx.TimeoutException, httpx.NetworkError):
+            dropped = True
+            raise
+        finally:
+            self.release(time.monotonic() - start, dropped)
+
+    def get_stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "limit": round(self.limit, 2),
+            "inflight": self.inflight,
+            "queue_depth": self.queue_depth,
+            "queue_depth_by_priority": {p: len(q) for p, q in self._queues.items()},
+            **self.stats,
+        }
+
+# Instância global do limitador das chamadas Newcon
+newcon_limiter = AdaptiveLimiter()
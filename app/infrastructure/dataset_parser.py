@@ -0,0 +1,115 @@
+import xml.etree.ElementTree as ET
+from typing import Iterable, Optional
+
+class DataSetStreamParser:
+    """Parser incremental para respostas DataSet da Newcon.
+
+    Alimentado em pedaços (feed), ignora o bloco xs:schema e extrai as linhas de
+    diffgr:diffgram/NewDataSet como dicts planos, liberando cada elemento assim que
+    é convertido. O resultado segue o mesmo formato do caminho xmltodict:
+    atributos com prefixo '@', texto em '#text', filhos repetidos em listas e
+    linhas agrupadas por nome de tabela na ordem em que aparecem.
+    """
+
+    def __init__(self):
+        self._parser = ET.XMLPullParser(events=("start-ns", "start", "end"))
+        self._prefixes = {}
+        self._stack = []
+        self._in_diffgram = False
+        self._nds_depth: Optional[int] = None
+        self._tables = {}
+
+    def feed(self, data):
+        self._parser.feed(data)
+        self._consume()
+
+    def close(self) -> dict:
+        self._parser.close()
+        self._consume()
+        rows = []
+        for table_rows in self._tables.values():
+            rows.extend(table_rows)
+        return {"items": rows}
+
+    def _consume(self):
+        for event, payload in self._parser.read_events():
+            if event == "start-ns":
+                prefix, uri = payload
+                self._prefixes.setdefault(uri, prefix)
+            elif event == "start":
+                self._start(payload)
+            else:
+                self._end(payload)
+
+    def _start(self, elem):
+        self._stack.append(elem)
+        local = _local(elem.tag)
+        if local == "diffgram":
+            self._in_diffgram = True
+        elif local == "NewDataSet" and self._in_diffgram and self._nds_depth is None:
+            self._nds_depth = len(self._stack)
+
+    def _end(self, elem):
+        depth = len(self._stack)
+        self._stack.pop()
+        parent = self._stack[-1] if self._stack else None
+        local = _local(elem.tag)
+
+        if self._nds_depth is not None and depth == self._nds_depth + 1:
+            # Linha do DataSet: converte e libera imediatamente
+            value = self._to_value(elem)
+            if isinstance(value, dict):
+                self._tables.setdefault(self._qname(elem.tag), []).append(value)
+            parent.remove(elem)
+        elif local == "schema" and parent is not None:
+            # Bloco XSD inline não interessa ao contrato de saída
+            parent.remove(elem)
+        elif local == "diffgram":
+            self._in_diffgram = False
+
+    def _qname(self, tag: str) -> str:
+        if tag[0] != "{":
+            return tag
+        uri, local = tag[1:].split("}", 1)
+        prefix = self._prefixes.get(uri, "")
+        return f"{prefix}:{local}" if prefix else local
+
+    def _to_value(self, elem):
+        """Converte um elemento no mesmo formato produzido pelo xmltodict"""
+        out = {}
+        for k, v in elem.attrib.items():
+            out["@" + self._qname(k)] = v
+        text = elem.text or ""
+        for child in elem:
+            key = self._qname(child.tag)
+            value = self._to_value(child)
+            if key in out:
+                current = out[key]
+                if isinstance(current, list):
+                    current.append(value)
+                else:
+                    out[key] = [current, value]
+            else:
+                out[key] = value
+            if child.tail:
+                text += child.tail
+        text = text.strip()
+        if not out:
+            return text or None
+        if text:
+            out["#text"] = text
+        return out
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+def parse_dataset(chunks: Iterable, chunk_size: int = 65536) -> dict:
+    """Extrai {"items": [...]} de uma resposta SOAP/DataSet (str, bytes ou iterável de pedaços)"""
+    parser = DataSetStreamParser()
+    if isinstance(chunks, (str, bytes)):
+        for i in range(0, len(chunks), chunk_size):
+            parser.feed(chunks[i:i + chunk_size])
+    else:
+        for chunk in chunks:
+            parser.feed(chunk)
+    return parser.close()
@@ -0,0 +1,441 @@
+import asyncio
+import datetime
+import hashlib
+import json
+import os
+import time
+import uuid
+from typing import Awaitable, Callable, Optional
+
+from redis.exceptions import WatchError
+
+from app.infrastructure.cache.redis_client import redis_client
+from app.infrastructure.concurrency_limiter import newcon_limiter
+from app.infrastructure.resilience import newcon_resilience
+
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+IN_PROGRESS = "in_progress"
+DONE = "done"
+
+class IdempotencyError(Exception):
+    """Requisição recusada pela idempotência (chave em uso ou reutilizada com outro payload)"""
+
+    def __init__(self, status_code: int, code: str, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+        self.code = code
+
+def upstream_budget_seconds() -> float:
+    """Pior caso de uma chamada prc* com Idempotency-Key: fila do limitador + timeout a cada
+    tentativa, mais o backoff máximo entre as tentativas"""
+    retry = newcon_resilience.retry
+    per_attempt = newcon_limiter.queue_timeout + float(os.environ.get("NEWCON_TIMEOUT_SECONDS", "30"))
+    backoff = sum(min(retry.cap, retry.base * (2 ** (a - 1))) for a in range(1, retry.attempts))
+    return retry.attempts * per_attempt + backoff
+
+def _hash(payload: Optional[dict]) -> str:
+    return hashlib.sha256((json.dumps(payload, sort_keys=True, default=str) if payload else "").encode()).hexdigest()
+
+class _MemoryBackend:
+    """Registros no processo (só vale para um worker; usado sem Redis/Postgres)"""
+
+    name = "memory"
+    available = True
+
+    def __init__(self):
+        self._records = {}
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def claim(self, k: str, payload_hash: str, token: str, lease_ms: int) -> Optional[dict]:
+        record = await self.get(k)
+        if record is not None:
+            return record
+        self._records[k] = {"state": IN_PROGRESS, "hash": payload_hash, "token": token,
+                            "expires_at": time.time() + lease_ms / 1000}
+        return None
+
+    async def get(self, k: str) -> Optional[dict]:
+        record = self._records.get(k)
+        if record is None or record["expires_at"] <= time.time():
+            return None
+        return record
+
+    async def complete(self, k: str, token: str, response: dict, ttl_seconds: int) -> bool:
+        record = self._records.get(k)
+        if record is None or record["token"] != token:
+            return False
+        record.update(state=DONE, response=response, expires_at=time.time() + ttl_seconds)
+        return True
+
+    async def renew(self, k: str, token: str, lease_ms: int) -> bool:
+        record = self._records.get(k)
+        if record is None or record["token"] != token or record["state"] != IN_PROGRESS:
+            return False
+        record["expires_at"] = time.time() + lease_ms / 1000
+        return True
+
+    async def release(self, k: str, token: str):
+        if self._records.get(k, {}).get("token") == token:
+            del self._records[k]
+
+    async def cleanup(self) -> int:
+        now = time.time()
+        expired = [k for k, r in self._records.items() if r["expires_at"] <= now]
+        for k in expired:
+            del self._records[k]
+        return len(expired)
+
+class _RedisBackend:
+    """Registros no Redis: SET NX PX toma o lease, o TTL da chave cuida da expiração"""
+
+    name = "redis"
+    prefix = "idempotency:"
+
+    @property
+    def available(self) -> bool:
+        return redis_client.connected
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    @staticmethod
+    def _failed(error: Exception):
+        # Falhas de conexão colocam o redis_client em fast-fail (a store cai para a memória)
+        redis_client.on_error(error)
+        print(f"❌ Erro na idempotência no Redis: {error}")
+
+    async def claim(self, k: str, payload_hash: str, token: str, lease_ms: int) -> Optional[dict]:
+        record = json.dumps({"state": IN_PROGRESS, "hash": payload_hash, "token": token})
+        try:
+            claimed = await redis_client.client.set(self.prefix + k, record, nx=True, px=lease_ms)
+        except Exception as e:
+            self._failed(e)
+            raise
+        if claimed:
+            return None
+        # Já existe: devolve o registro atual (ou {} se expirou entre o SET e o GET)
+        return await self.get(k) or {}
+
+    async def get(self, k: str) -> Optional[dict]:
+        try:
+            value = await redis_client.client.get(self.prefix + k)
+        except Exception as e:
+            self._failed(e)
+            raise
+        return json.loads(value) if value else None
+
+    async def _swap(self, k: str, token: str, new_value: Optional[str], ttl_seconds: int = 0,
+                    lease_ms: int = 0) -> bool:
+        """Troca, renova (`lease_ms`) ou remove o registro só se o lease ainda for nosso (WATCH/MULTI)"""
+        name = self.prefix + k
+        try:
+            async with redis_client.client.pipeline(transaction=True) as pipe:
+                await pipe.watch(name)
+                current = await pipe.get(name)
+                if not current or json.loads(current).get("token") != token:
+                    await pipe.unwatch()
+                    return False
+                pipe.multi()
+                if lease_ms:
+                    pipe.pexpire(name, lease_ms)
+                elif new_value is None:
+                    pipe.delete(name)
+                else:
+                    pipe.set(name, new_value, ex=ttl_seconds)
+                await pipe.execute()
+                return True
+        except WatchError:
+            return False
+        except Exception as e:
+            self._failed(e)
+            raise
+
+    async def complete(self, k: str, token: str, response: dict, ttl_seconds: int) -> bool:
+        record = await self.get(k) or {}
+        value = json.dumps({"state": DONE, "hash": record.get("hash"), "token": token, "response": response},
+                           default=str)
+        return await self._swap(k, token, value, ttl_seconds)
+
+    async def renew(self, k: str, token: str, lease_ms: int) -> bool:
+        return await self._swap(k, token, None, lease_ms=lease_ms)
+
+    async def release(self, k: str, token: str):
+        await self._swap(k, token, None)
+
+    async def cleanup(self) -> int:
+        # As chaves expiram sozinhas no Redis
+        return 0
+
+_PG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS idempotency (
+    k TEXT PRIMARY KEY,
+    route TEXT NOT NULL,
+    payload_hash TEXT NOT NULL,
+    state TEXT NOT NULL,
+    token TEXT NOT NULL,
+    response TEXT,
+    expires_at TIMESTAMPTZ NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idempotency_expires_at ON idempotency (expires_at);
+"""
+
+class _PostgresBackend:
+    """Registros no Postgres (asyncpg com pool); o lease é um INSERT ... ON CONFLICT atômico"""
+
+    name = "postgres"
+    available = True
+
+    def __init__(self, dsn: str):
+        self.dsn = dsn
+        self.min_size = int(os.environ.get("IDEMPOTENCY_PG_POOL_MIN", "1"))
+        self.max_size = int(os.environ.get("IDEMPOTENCY_PG_POOL_MAX", "5"))
+        self.pool = None
+
+    async def start(self):
+        self.pool = await asyncpg.create_pool(self.dsn, min_size=self.min_size, max_size=self.max_size,
+                                              command_timeout=5)
+        async with self.pool.acquire() as conn:
+            await conn.execute(_PG_SCHEMA)
+
+    async def stop(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    async def claim(self, k: str, payload_hash: str, token: str, lease_ms: int) -> Optional[dict]:
+        expires_at = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(milliseconds=lease_ms)
+        # Insere, ou assume um registro já expirado; RETURNING só volta se o lease é nosso
+        claimed = await self.pool.fetchval("""
+            INSERT INTO idempotency (k, route, payload_hash, state, token, response, expires_at)
+            VALUES ($1, split_part($1, ':', 1), $2, $3, $4, NULL, $5)
+            ON CONFLICT (k) DO UPDATE SET payload_hash = EXCLUDED.payload_hash, state = EXCLUDED.state,
+                token = EXCLUDED.token, response = NULL, expires_at = EXCLUDED.expires_at
+            WHERE idempotency.expires_at <= now()
+            RETURNING token
+        """, k, payload_hash, IN_PROGRESS, token, expires_at)
+        if claimed == token:
+            return None
+        return await self.get(k) or {}
+
+    async def get(self, k: str) -> Optional[dict]:
+        row = await self.pool.fetchrow(
+            "SELECT state, payload_hash, token, response FROM idempotency WHERE k = $1 AND expires_at > now()", k)
+        if row is None:
+            return None
+        return {"state": row["state"], "hash": row["payload_hash"], "token": row["token"],
+                "response": json.loads(row["response"]) if row["response"] else None}
+
+    async def complete(self, k: str, token: str, response: dict, ttl_seconds: int) -> bool:
+        result = await self.pool.execute("""
+            UPDATE idempotency SET state = $3, response = $4, expires_at = now() + make_interval(secs => $5)
+            WHERE k = $1 AND token = $2
+        """, k, token, DONE, json.dumps(response, default=str), float(ttl_seconds))
+        return result.endswith(" 1")
+
+    async def renew(self, k: str, token: str, lease_ms: int) -> bool:
+        result = await self.pool.execute("""
+            UPDATE idempotency SET expires_at = now() + make_interval(secs => $4)
+            WHERE k = $1 AND token = $2 AND state = $3
+        """, k, token, IN_PROGRESS, lease_ms / 1000)
+        return result.endswith(" 1")
+
+    async def release(self, k: str, token: str):
+        await self.pool.execute("DELETE FROM idempotency WHERE k = $1 AND token = $2", k, token)
+
+    async def cleanup(self) -> int:
+        result = await self.pool.execute("DELETE FROM idempotency WHERE expires_at <= now()")
+        return int(result.split()[-1])
+
+class IdempotencyStore:
+    """Idempotência assíncrona das operações prc* (Redis ou Postgres, com pool).
+
+    A primeira requisição com uma `Idempotency-Key` toma um lease "em andamento"
+    (atômico no backend) e executa a operação; duplicatas concorrentes esperam
+    pelo resultado e o reutilizam. Se a operação falhar o lease é liberado para
+    o cliente poder tentar de novo. A mesma chave com outro payload é recusada.
+    Registros vencidos são removidos por uma task em segundo plano.
+
+    O lease padrão cobre o pior caso da chamada upstream (tentativas × timeout
+    mais o backoff) e é renovado enquanto a operação roda, então não vence com
+    a primeira execução ainda em andamento. Se o backend falhar, a store cai
+    para a memória do processo (Redis fora) ou responde 503.
+
+    Backend por `IDEMPOTENCY_BACKEND` (auto, postgres, redis, memory); em auto
+    usa Postgres se `DATABASE_URL_IDEMPOTENCY` estiver definida, senão Redis
+    quando configurado, senão memória do processo. Com o Postgres configurado,
+    asyncpg ausente ou falha ao abrir o pool interrompem a startup em vez de
+    cair silenciosamente para uma proteção mais fraca.
+    """
+
+    def __init__(self):
+        self.ttl_seconds = int(os.environ.get("IDEMPOTENCY_TTL_SECONDS", "86400"))
+        budget = upstream_budget_seconds() + 5
+        self.lease_ms = int(os.environ.get("IDEMPOTENCY_LEASE_MS", str(int(budget * 1000))))
+        # Duplicatas esperam enquanto a primeira execução ainda pode terminar
+        self.wait_seconds = float(os.environ.get("IDEMPOTENCY_WAIT_SECONDS", str(budget)))
+        self.poll_ms = int(os.environ.get("IDEMPOTENCY_POLL_MS", "100"))
+        self.cleanup_interval = float(os.environ.get("IDEMPOTENCY_CLEANUP_SECONDS", "600"))
+        self.backend = _MemoryBackend()
+        # Com o Redis fora, a proteção cai para a memória do processo
+        self._local = _MemoryBackend()
+        self._cleaner: Optional[asyncio.Task] = None
+        self.stats = {"executed": 0, "replayed": 0, "waited": 0, "conflicts": 0, "released": 0, "cleaned": 0,
+                      "renewed": 0, "lease_lost": 0, "fallbacks": 0, "backend_errors": 0}
+
+    def _choose_backend(self):
+        choice = os.environ.get("IDEMPOTENCY_BACKEND", "auto").lower()
+        dsn = os.environ.get("DATABASE_URL_IDEMPOTENCY", "")
+        if choice in ("auto", "postgres") and dsn:
+            if asyncpg is None:
+                raise RuntimeError("DATABASE_URL_IDEMPOTENCY definido mas o asyncpg não está instalado")
+            return _PostgresBackend(dsn)
+        if choice in ("auto", "redis", "postgres") and redis_client.configured:
+            return _RedisBackend()
+        return _MemoryBackend()
+
+    async def start(self):
+        """Escolhe e abre o backend (chamar depois do Redis conectar) e inicia a limpeza"""
+        backend = self._choose_backend()
+        try:
+            await backend.start()
+            self.backend = backend
+        except Exception as e:
+            if backend.name == "postgres":
+                print(f"❌ Erro ao iniciar idempotência (postgres): {e}")
+                raise
+            print(f"❌ Erro ao iniciar idempotência ({backend.name}): {e} - usando memória")
+            self.backend = _MemoryBackend()
+        print(f"🔑 Idempotência usando {self.backend.name}")
+        if self._cleaner is None:
+            self._cleaner = asyncio.create_task(self._cleanup_loop())
+
+    async def stop(self):
+        if self._cleaner is not None:
+            self._cleaner.cancel()
+            try:
+                await self._cleaner
+            except asyncio.CancelledError:
+                pass
+            self._cleaner = None
+        await self.backend.stop()
+
+    async def _cleanup_loop(self):
+        while True:
+            await asyncio.sleep(self.cleanup_interval)
+            try:
+                self.stats["cleaned"] += await self.backend.cleanup() + await self._local.cleanup()
+            except Exception as e:
+                print(f"❌ Erro na limpeza da idempotência: {e}")
+
+    def _check(self, record: dict, payload_hash: str):
+        if record.get("hash") and record["hash"] != payload_hash:
+            self.stats["conflicts"] += 1
+            raise IdempotencyError(422, "IDEMPOTENCY_KEY_REUSED",
+                                   "Idempotency-Key já usada com outro payload")
+
+    async def run(self, route: str, key: Optional[str], payload: Optional[dict],
+                  func: Callable[[], Awaitable[dict]]) -> dict:
+        """Executa `func` uma única vez por (rota, chave); sem chave apenas executa"""
+        if not key:
+            return await func()
+
+        backend = self.backend if self.backend.available else self._local
+        k = f"{route}:{key}"
+        payload_hash = _hash(payload)
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.wait_seconds
+        waited = False
+        while True:
+            try:
+                record = await backend.claim(k, payload_hash, token, self.lease_ms)
+            except Exception as e:
+                backend = self._fallback(backend, e)
+                continue
+            if record is None:
+                break
+            self._check(record, payload_hash)
+            if record.get("state") == DONE:
+                self.stats["replayed"] += 1
+                return record["response"]
+            # Outra requisição com a mesma chave está em andamento: espera o resultado
+            if not waited:
+                self.stats["waited"] += 1
+                waited = True
+            if time.monotonic() >= deadline:
+                raise IdempotencyError(409, "IDEMPOTENCY_IN_PROGRESS",
+                                       "Requisição com a mesma Idempotency-Key em andamento")
+            await asyncio.sleep(self.poll_ms / 1000)
+
+        heartbeat = asyncio.create_task(self._renew_loop(backend, k, token))
+        try:
+            try:
+                response = await func()
+            finally:
+                # Para a renovação antes de gravar/liberar (não disputa o registro com o complete)
+                heartbeat.cancel()
+                await asyncio.gather(heartbeat, return_exceptions=True)
+        except BaseException:
+            # Falhou: libera a chave para o cliente tentar de novo
+            self.stats["released"] += 1
+            try:
+                await backend.release(k, token)
+            except Exception as e:
+                self.stats["backend_errors"] += 1
+                print(f"❌ Erro ao liberar idempotência {k}: {e}")
+            raise
+        self.stats["executed"] += 1
+        try:
+            completed = await backend.complete(k, token, response, self.ttl_seconds)
+        except Exception as e:
+            # A operação já foi feita: responde mesmo sem conseguir gravar o resultado
+            self.stats["backend_errors"] += 1
+            print(f"❌ Erro ao gravar resultado da idempotência {k}: {e}")
+            return response
+        if not completed:
+            self.stats["lease_lost"] += 1
+            print(f"⚠️ Lease de idempotência {k} expirou antes do fim da operação")
+        return response
+
+    def _fallback(self, backend, error: Exception):
+        """Backend falhou no claim: memória do processo se o Redis caiu, senão 503"""
+        self.stats["backend_errors"] += 1
+        if backend is not self._local and not backend.available:
+            self.stats["fallbacks"] += 1
+            print(f"⚠️ Idempotência ({backend.name}) indisponível - usando memória: {error}")
+            return self._local
+        print(f"❌ Erro na idempotência ({backend.name}): {error}")
+        raise IdempotencyError(503, "IDEMPOTENCY_UNAVAILABLE",
+                               "Controle de idempotência indisponível, tente novamente") from error
+
+    async def _renew_loop(self, backend, k: str, token: str):
+        """Renova o lease a cada 1/3 da duração enquanto a operação roda"""
+        while True:
+            await asyncio.sleep(self.lease_ms / 3000)
+            try:
+                if await backend.renew(k, token, self.lease_ms):
+                    self.stats["renewed"] += 1
+                else:
+                    self.stats["lease_lost"] += 1
+                    print(f"⚠️ Lease de idempotência {k} perdido durante a operação")
+                    return
+            except Exception as e:
+                self.stats["backend_errors"] += 1
+                print(f"❌ Erro ao renovar idempotência {k}: {e}")
+
+    def get_stats(self) -> dict:
+        return {"backend": self.backend.name, "lease_ms": self.lease_ms, "wait_seconds": self.wait_seconds, **self.stats}
+
+# Instância global da idempotência
+idempotency_store = IdempotencyStore()
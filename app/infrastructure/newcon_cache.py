@@ -0,0 +1,214 @@
+import asyncio
+import json
+import os
+import time
+from typing import Callable, Optional
+
+from fastapi.responses import Response
+
+from app.infrastructure.cache import hybrid_cache, cache_metrics
+from app.infrastructure.newcon_client import NewconClient
+from app.infrastructure.value_index import with_value_index
+from app.schemas.base import ok_json
+
+def approx_json_bytes(data: dict, _sample: int = 32) -> int:
+    """Tamanho aproximado do JSON da resposta: `items` grandes são estimados por amostragem"""
+    items = data.get("items")
+    if not isinstance(items, list) or len(items) <= _sample:
+        return len(json.dumps(data, ensure_ascii=False, default=str))
+    n = len(items)
+    rest = {k: v for k, v in data.items() if k != "items"}
+    amostra = sum(len(json.dumps(items[i * n // _sample], ensure_ascii=False, default=str)) for i in range(_sample))
+    # + separadores entre as linhas
+    return len(json.dumps(rest, ensure_ascii=False, default=str)) + amostra * n // _sample + n
+
+class CachePolicy:
+    """Política de cache read-through de um método Newcon"""
+
+    def __init__(self, key: Callable[[dict], str], ttl_seconds: int, cache_empty: bool = False,
+                 max_bytes: Optional[int] = None, prepare: Optional[Callable[[dict], dict]] = None,
+                 tags: Optional[Callable[[dict], list]] = None, negative_ttl_seconds: int = 0):
+        self.key = key
+        self.ttl_seconds = ttl_seconds
+        self.cache_empty = cache_empty
+        # Resultado vazio válido ("nada disponível") fica em cache por pouco tempo; 0 desliga
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.max_bytes = max_bytes
+        # Pré-processamento feito uma única vez, na gravação do cache (ex.: índices)
+        self.prepare = prepare
+        # Tags para invalidação em grupo (ex.: tudo do tipo de grupo IM)
+        self.tags = tags
+
+    def tags_for(self, params: dict) -> list:
+        return self.tags(params) if self.tags is not None else []
+
+    def _valid(self, data) -> bool:
+        if not isinstance(data, dict) or data.get("stale"):
+            return False
+        # Erros de parse/extração e respostas cruas nunca são cacheadas
+        if "parse_error" in data or "extract_error" in data or "raw" in data:
+            return False
+        return True
+
+    def accepts(self, data) -> bool:
+        """Decide se a resposta pode ir para o cache"""
+        if not self._valid(data):
+            return False
+        if not data.get("items") and not self.cache_empty:
+            return False
+        if self.max_bytes is not None and approx_json_bytes(data) > self.max_bytes:
+            return False
+        return True
+
+    def negative(self, data) -> bool:
+        """Resposta vazia válida que vai para o cache como entrada negativa (TTL curto)"""
+        return (self.negative_ttl_seconds > 0 and not self.cache_empty
+                and self._valid(data) and not data.get("items"))
+
+def _policy(method: str, key: Callable[[dict], str], ttl_seconds: int, **kwargs) -> CachePolicy:
+    # TTL pode ser ajustado por método: NEWCON_CACHE_TTL_CNSTIPOSGRUPOS=7200
+    ttl = int(os.environ.get(f"NEWCON_CACHE_TTL_{method.upper()}", ttl_seconds))
+    max_bytes = int(os.environ.get("NEWCON_CACHE_MAX_BYTES", "5000000"))
+    # TTL do cache negativo (resultado vazio): NEWCON_CACHE_NEGATIVE_TTL_CNSBENSDISPONIVEIS=300, 0 desliga
+    negative_ttl = int(os.environ.get(f"NEWCON_CACHE_NEGATIVE_TTL_{method.upper()}",
+                                      os.environ.get("NEWCON_CACHE_NEGATIVE_TTL_SECONDS", "120")))
+    return CachePolicy(key, ttl, max_bytes=max_bytes, negative_ttl_seconds=negative_ttl, **kwargs)
+
+def _grupo_tag(params: dict) -> list:
+    return [f"grupo:{params['Codigo_Tipo_Grupo']}"]
+
+# TTL padrão do catálogo (o warmer reaquece antes desse prazo)
+CATALOG_TTL_SECONDS = 1800
+
+CACHE_POLICIES = {
+    "cnsTiposGrupos": _policy("cnsTiposGrupos", lambda p: "tipos_grupos", CATALOG_TTL_SECONDS),
+    "cnsTiposVendas": _policy("cnsTiposVendas", lambda p: f"tipos_vendas:{p['Codigo_Tipo_Grupo']}", CATALOG_TTL_SECONDS,
+                              tags=_grupo_tag),
+    "cnsBensDisponiveis": _policy("cnsBensDisponiveis",
+                                  lambda p: f"bens_disponiveis:{p['Codigo_Tipo_Grupo']}:{p['Codigo_Tipo_Venda']}",
+                                  CATALOG_TTL_SECONDS, prepare=with_value_index, tags=_grupo_tag),
+    "cnsCalendarioAssembleias": _policy("cnsCalendarioAssembleias", lambda p: "calendario_assembleias", CATALOG_TTL_SECONDS),
+    "cnsCaracteristicasGrupos": _policy("cnsCaracteristicasGrupos",
+                                        lambda p: f"caracteristicas_grupos:{p['Codigo_Grupo']}", 3600),
+    "cnsRegraCobranca": _policy("cnsRegraCobranca", lambda p: f"regra_cobranca:{p['Codigo_Grupo']}:{p['Prazo']}", 3600),
+    "cnsBancosDebito": _policy("cnsBancosDebito", lambda p: "bancos_debito", 86400),
+}
+
+def bens_params(Codigo_Tipo_Grupo: str, Codigo_Tipo_Venda: str) -> dict:
+    # Codigo_Filial sempre será 001 (hardcoded)
+    return {"Codigo_Filial": "001", "Codigo_Tipo_Grupo": Codigo_Tipo_Grupo, "Codigo_Tipo_Venda": Codigo_Tipo_Venda}
+
+def cache_key(method: str, params: dict) -> str:
+    return CACHE_POLICIES[method].key(params)
+
+async def refresh_call(nc: NewconClient, method: str, params: dict) -> dict:
+    """Busca no Newcon e grava no cache conforme a política, ignorando o valor atual"""
+    started = time.monotonic()
+    data = await nc.call(method, params)
+    policy = CACHE_POLICIES.get(method)
+    if policy is not None:
+        cache_metrics.observe(policy.key(params), "fetch", time.monotonic() - started)
+    if policy is not None and policy.accepts(data):
+        if policy.prepare is not None:
+            data = policy.prepare(data)
+        await hybrid_cache.set(policy.key(params), data, ttl_seconds=policy.ttl_seconds,
+                               delta=time.monotonic() - started, tags=policy.tags_for(params))
+    elif policy is not None and policy.negative(data):
+        await hybrid_cache.set(policy.key(params), data, ttl_seconds=policy.negative_ttl_seconds,
+                               delta=time.monotonic() - started, tags=policy.tags_for(params), negative=True)
+    return data
+
+async def refresh_many(nc: NewconClient, method: str, params_list: list, concurrency: int = 8) -> list:
+    """Busca várias chaves no Newcon em paralelo e grava as aceitas com um único set_many
+    (e as vazias, como entradas negativas, com outro).
+
+    Retorna, na ordem de `params_list`, os dados ou a exceção de cada chamada.
+    """
+    policy = CACHE_POLICIES[method]
+    sem = asyncio.Semaphore(concurrency)
+
+    async def fetch(params: dict):
+        async with sem:
+            started = time.monotonic()
+            data = await nc.call(method, params)
+            return data, time.monotonic() - started
+
+    results = await asyncio.gather(*(fetch(p) for p in params_list), return_exceptions=True)
+    items, empty, deltas, tags, out = {}, {}, {}, {}, []
+    for params, result in zip(params_list, results):
+        if isinstance(result, BaseException):
+            out.append(result)
+            continue
+        data, delta = result
+        cache_metrics.observe(policy.key(params), "fetch", delta)
+        if policy.accepts(data):
+            if policy.prepare is not None:
+                data = policy.prepare(data)
+            key = policy.key(params)
+            items[key], deltas[key], tags[key] = data, delta, policy.tags_for(params)
+        elif policy.negative(data):
+            key = policy.key(params)
+            empty[key], deltas[key], tags[key] = data, delta, policy.tags_for(params)
+        out.append(data)
+    if items:
+        await hybrid_cache.set_many(items, ttl_seconds=policy.ttl_seconds, deltas=deltas, tags=tags)
+    if empty:
+        await hybrid_cache.set_many(empty, ttl_seconds=policy.negative_ttl_seconds, deltas=deltas, tags=tags,
+                                    negative=True)
+    return out
+
+def cached_hit(method: str, cached) -> bool:
+    """Valor vindo do cache pode ser servido segundo a política do método?"""
+    if cached is None:
+        return False
+    policy = CACHE_POLICIES[method]
+    # Vazio só é gravado como entrada negativa (TTL curto) quando o cache negativo está ligado
+    return policy.cache_empty or policy.negative_ttl_seconds > 0 or bool(cached.get("items"))
+
+async def cached_call(nc: NewconClient, method: str, params: dict) -> dict:
+    """Chamada Newcon com cache read-through segundo CACHE_POLICIES.
+
+    Passa por hybrid_cache.get_or_set: um único recálculo por chave, refresh
+    antecipado e valor anterior servido se o Newcon falhar. Respostas vazias
+    válidas viram entradas negativas por `negative_ttl_seconds`; erros nunca.
+    """
+    policy = CACHE_POLICIES.get(method)
+    if policy is None:
+        return await nc.call(method, params)
+    fetch, options = _read_through(nc, method, params, policy)
+    return await hybrid_cache.get_or_set(policy.key(params), fetch, **options)
+
+def _read_through(nc: NewconClient, method: str, params: dict, policy: CachePolicy) -> tuple:
+    """(fetch, opções do get_or_set) segundo a política do método.
+
+    A política é avaliada uma vez por busca; o get_or_set reaproveita o veredito.
+    """
+    accepted = [False]
+
+    async def fetch():
+        data = await nc.call(method, params)
+        accepted[0] = policy.accepts(data)
+        if policy.prepare is not None and accepted[0]:
+            data = policy.prepare(data)
+        return data
+
+    return fetch, {"ttl_seconds": policy.ttl_seconds, "cacheable": lambda _: accepted[0],
+                   "tags": policy.tags_for(params), "negative": policy.negative,
+                   "negative_ttl": policy.negative_ttl_seconds}
+
+async def cached_response(nc: NewconClient, method: str, params: dict, view: str = "ok",
+                          transform: Optional[Callable[[dict], dict]] = None) -> Response:
+    """Como ok(cached_call(...)), mas com o JSON do envelope guardado junto da entrada do cache.
+
+    Nos acertos a resposta sai dos bytes já prontos, sem validar nem serializar
+    as linhas de novo. `transform` ajusta os dados antes do envelope e `view`
+    identifica o resultado (uma rota, uma representação).
+    """
+    policy = CACHE_POLICIES[method]
+    fetch, options = _read_through(nc, method, params, policy)
+
+    def render(data) -> bytes:
+        return ok_json(transform(data) if transform is not None else data)
+
+    body = await hybrid_cache.get_or_set_view(policy.key(params), view, render, fetch, **options)
+    return Response(content=body, media_type="application/json")
@@ -1,7 +1,12 @@
-import os, httpx
-import xml.etree.ElementTree as ET
+import os, httpx, asyncio, time
 import xmltodict
 import re
+from typing import Optional
+from app.infrastructure.dataset_parser import parse_dataset
+from app.infrastructure.soap_envelope import soap_envelope
+from app.infrastructure.singleflight import newcon_singleflight, canonical_key
+from app.infrastructure.concurrency_limiter import newcon_limiter
+from app.infrastructure.resilience import newcon_resilience, is_retryable, CircuitOpen
 
 class NewconClient:
     def __init__(self):
@@ -9,14 +14,88 @@ class NewconClient:
         self.mode = os.environ.get("NEWCON_MODE","soap").lower()
         self.soap_ns = os.environ.get("SOAP_NAMESPACE","http://tempuri.org/")
         self.timeout = int(os.environ.get("NEWCON_TIMEOUT_SECONDS","30"))
-        self.client = httpx.AsyncClient(timeout=self.timeout)
+        self.limits = httpx.Limits(
+            max_connections=int(os.environ.get("NEWCON_MAX_CONNECTIONS","20")),
+            max_keepalive_connections=int(os.environ.get("NEWCON_MAX_KEEPALIVE_CONNECTIONS","10")),
+            keepalive_expiry=float(os.environ.get("NEWCON_KEEPALIVE_EXPIRY_SECONDS","30")),
+        )
+        self.http2 = self._http2_enabled()
+        # "stream" (iterparse, padrão) ou "xmltodict" (caminho legado)
+        self.parser = os.environ.get("NEWCON_PARSER","stream").lower()
+        self.client = httpx.AsyncClient(timeout=self.timeout, limits=self.limits, http2=self.http2)
 
-    async def call(self, method: str, params: dict):
+    def _http2_enabled(self) -> bool:
+        """HTTP/2 é opcional e depende do pacote h2 (httpx[http2])"""
+        if os.environ.get("NEWCON_HTTP2","false").lower() not in ("1","true","yes"):
+            return False
+        try:
+            import h2  # noqa: F401
+            return True
+        except ImportError:
+            print("⚠️ NEWCON_HTTP2 ativo mas pacote h2 não instalado - usando HTTP/1.1")
+            return False
+
+    async def call(self, method: str, params: dict, idempotency_key: Optional[str] = None):
+        # Leituras idênticas em andamento compartilham a mesma chamada upstream
+        if method.startswith("cns"):
+            return await newcon_singleflight.do(canonical_key(method, params), lambda: self._call(method, params, idempotency_key))
+        return await self._call(method, params, idempotency_key)
+
+    async def _call(self, method: str, params: dict, idempotency_key: Optional[str] = None):
+        breaker = newcon_resilience.breaker(method)
+        stale_key = canonical_key(method, params)
+        if not breaker.allow_request():
+            stale = breaker.stale(stale_key)
+            if stale is None:
+                raise CircuitOpen(method, breaker.retry_in())
+            return stale
+
+        # cns* são idempotentes; prc* só repetem com Idempotency-Key
+        retryable = method.startswith("cns") or idempotency_key is not None
+        try:
+            data = await self._request(method, params, retryable)
+        except Exception as e:
+            if not is_retryable(e):
+                breaker.release_trial()
+                raise
+            breaker.record_failure()
+            stale = breaker.stale(stale_key) if breaker.state == "open" else None
+            if stale is None:
+                raise
+            return stale
+        except BaseException:
+            breaker.release_trial()
+            raise
+
+        breaker.record_success()
+        if method.startswith("cns") and isinstance(data, dict) and "parse_error" not in data:
+            await breaker.remember(stale_key, data)
+        return data
+
+    async def _request(self, method: str, params: dict, retryable: bool):
+        attempts = newcon_resilience.retry.attempts if retryable else 1
+        for attempt in range(1, attempts + 1):
+            try:
+                if method.startswith("cns"):
+                    return await newcon_resilience.hedged(method, lambda: self._request_once(method, params))
+                return await self._request_once(method, params)
+            except Exception as e:
+                if attempt >= attempts or not is_retryable(e):
+                    raise
+                newcon_resilience.stats["retries"] += 1
+                await asyncio.sleep(newcon_resilience.retry.delay(attempt))
+
+    async def _request_once(self, method: str, params: dict):
+        start = time.monotonic()
         if self.mode == "rest":
-            r = await self.client.get(f"{self.base}/{method}", params=params)
-            r.raise_for_status()
+            async with newcon_limiter.slot(method):
+                r = await self.client.get(f"{self.base}/{method}", params=params)
+                r.raise_for_status()
+            newcon_resilience.latency.record(method, time.monotonic() - start)
             return r.json() if "application/json" in r.headers.get("content-type","") else {"raw": r.text}
-        xml = await self._soap_call(method, params)
+        async with newcon_limiter.slot(method):
+            xml = await self._soap_call(method, params)
+        newcon_resilience.latency.record(method, time.monotonic() - start)
         try:
             return self._parse(method, xml)
         except Exception as e:
@@ -37,27 +116,19 @@ class NewconClient:
             raise
 
     def _soap_envelope(self, method: str, params: dict) -> bytes:
-        # Usar o namespace correto da Newcon (como no projeto legado)
-        soap_env = "http://schemas.xmlsoap.org/soap/envelope/"
-        newcon_ns = "http://www.cnpm.com.br/"
-        
-        root = ET.Element("{%s}Envelope" % soap_env)
-        root.set("xmlns:xsi", "http://www.w3.org/2001/XMLSchema-instance")
-        root.set("xmlns:xsd", "http://www.w3.org/2001/XMLSchema")
-        root.set("xmlns:soap", soap_env)
-        
-        body = ET.SubElement(root, "{%s}Body" % soap_env)
-        m = ET.SubElement(body, method)
-        m.set("xmlns", newcon_ns)
-        
-        for k, v in params.items():
-            if v is not None:
-                el = ET.SubElement(m, k)
-                el.text = str(v)
-        
-        return ET.tostring(root, encoding="utf-8", xml_declaration=True)
+        # Template pré-compilado por método (mesmos bytes do ElementTree legado)
+        return soap_envelope(method, params)
 
     def _parse(self, method: str, xml_text: str) -> dict:
+        """Parse XML response para {"items": [...]} conforme NEWCON_PARSER"""
+        if self.parser == "xmltodict":
+            return self._parse_xmltodict(method, xml_text)
+        try:
+            return parse_dataset(xml_text)
+        except Exception as e:
+            return {"items": [], "parse_error": str(e)}
+
+    def _parse_xmltodict(self, method: str, xml_text: str) -> dict:
         """Parse XML response para dict Python usando xmltodict (igual à API legada)"""
         try:
             # Parse XML para dict usando xmltodict (igual à API legada)
@@ -151,3 +222,21 @@ class NewconClient:
     async def close(self):
         """Fecha o cliente HTTP"""
         await self.client.aclose()
+
+# Cliente compartilhado pelo processo: criado no startup e fechado no shutdown,
+# reaproveitando o pool de conexões keep-alive com o wsRegVenda
+_shared_client: Optional[NewconClient] = None
+
+def get_newcon_client() -> NewconClient:
+    """Retorna o cliente Newcon compartilhado (usado como dependência FastAPI)"""
+    global _shared_client
+    if _shared_client is None:
+        _shared_client = NewconClient()
+    return _shared_client
+
+async def close_newcon_client():
+    """Fecha o cliente Newcon compartilhado"""
+    global _shared_client
+    if _shared_client is not None:
+        await _shared_client.close()
+        _shared_client = None
@@ -0,0 +1,196 @@
+import asyncio
+import math
+import os
+import random
+import time
+from collections import deque
+from typing import Any, Optional
+
+import httpx
+
+from app.infrastructure.cache.memory_cache import memory_cache
+from app.infrastructure.concurrency_limiter import UpstreamOverloaded
+
+# Namespace do L1 com as últimas respostas boas servidas com o breaker aberto;
+# não é cópia do L2, então sobrevive à invalidação do L1 inteiro
+STALE_NAMESPACE = "newcon_stale"
+memory_cache.preserved.add(STALE_NAMESPACE)
+
+class CircuitOpen(UpstreamOverloaded):
+    """Breaker aberto e sem valor anterior para servir"""
+
+    def __init__(self, method: str, retry_in: float):
+        super().__init__(503, "upstream_circuit_open", f"Newcon indisponível para {method}, tente novamente em {retry_in:.0f}s")
+
+def is_retryable(exc: BaseException) -> bool:
+    """Timeouts, falhas de transporte e respostas 5xx/429 do upstream"""
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code >= 500 or exc.response.status_code == 429
+    return isinstance(exc, (httpx.TimeoutException, httpx.TransportError))
+
+class RetryPolicy:
+    """Backoff exponencial com full jitter"""
+
+    def __init__(self):
+        self.attempts = max(1, int(os.environ.get("NEWCON_RETRY_ATTEMPTS", "3")))
+        self.base = float(os.environ.get("NEWCON_RETRY_BASE_MS", "200")) / 1000
+        self.cap = float(os.environ.get("NEWCON_RETRY_MAX_MS", "2000")) / 1000
+
+    def delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.cap, self.base * (2 ** (attempt - 1))))
+
+class LatencyTracker:
+    """Janela deslizante de latências bem-sucedidas por método (para o p95 do hedge)"""
+
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples = {}
+        self._size = size
+
+    def record(self, method: str, latency: float):
+        samples = self._samples.get(method)
+        if samples is None:
+            samples = self._samples[method] = deque(maxlen=self._size)
+        samples.append(latency)
+
+    def p95(self, method: str) -> Optional[float]:
+        samples = self._samples.get(method)
+        if not samples or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        # Nearest-rank: menor amostra com pelo menos 95% das latências até ela
+        return ordered[min(len(ordered) - 1, math.ceil(0.95 * len(ordered)) - 1)]
+
+    def p95_all(self) -> dict:
+        return {m: p for m in self._samples if (p := self.p95(m)) is not None}
+
+class CircuitBreaker:
+    """Breaker por método: abre após N falhas seguidas, libera uma chamada de teste
+    depois do intervalo (half-open) e guarda as últimas respostas boas para servir
+    como stale enquanto estiver aberto. As respostas ficam no L1 (`memory_cache`,
+    namespace newcon_stale), dentro do mesmo orçamento de bytes e do mesmo LRU, e
+    não são descartadas por /utils/cache/clear nem pela reinscrição da invalidação."""
+
+    def __init__(self, method: str, failure_threshold: int, open_seconds: float, stale_ttl: int):
+        self.method = method
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.stale_ttl = stale_ttl
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_inflight = False
+        self.stats = {"opened": 0, "short_circuited": 0, "stale_served": 0}
+
+    def allow_request(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.open_seconds:
+            self.state = "half_open"
+        if self.state == "half_open" and not self._trial_inflight:
+            self._trial_inflight = True
+            return True
+        self.stats["short_circuited"] += 1
+        return False
+
+    def retry_in(self) -> float:
+        return max(0.0, self.open_seconds - (time.monotonic() - self.opened_at))
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+        self._trial_inflight = False
+
+    def release_trial(self):
+        """Chamada terminou sem indicar saúde do upstream (ex.: cancelada)"""
+        self._trial_inflight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_inflight = False
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.stats["opened"] += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    async def remember(self, key: str, value: Any):
+        if self.stale_ttl > 0:
+            await memory_cache.set(f"{STALE_NAMESPACE}:{key}", value, self.stale_ttl)
+
+    def stale(self, key: str) -> Optional[dict]:
+        value = memory_cache.peek(f"{STALE_NAMESPACE}:{key}")
+        if value is None:
+            return None
+        self.stats["stale_served"] += 1
+        return {**value, "stale": True} if isinstance(value, dict) else value
+
+    def get_stats(self) -> dict:
+        return {"state": self.state, "failures": self.failures, **self.stats}
+
+class Resilience:
+    """Retries, hedge e circuit breakers das chamadas Newcon"""
+
+    def __init__(self):
+        self.retry = RetryPolicy()
+        self.latency = LatencyTracker()
+        self.hedge = os.environ.get("NEWCON_HEDGE", "false").lower() in ("1", "true", "yes")
+        self.hedge_min = float(os.environ.get("NEWCON_HEDGE_MIN_MS", "100")) / 1000
+        self.failure_threshold = int(os.environ.get("NEWCON_BREAKER_FAILURES", "5"))
+        self.open_seconds = float(os.environ.get("NEWCON_BREAKER_OPEN_SECONDS", "30"))
+        self.stale_ttl = int(os.environ.get("NEWCON_BREAKER_STALE_TTL_SECONDS", "3600"))
+        self.breakers = {}
+        self.stats = {"retries": 0, "hedges": 0, "hedge_wins": 0}
+
+    def breaker(self, method: str) -> CircuitBreaker:
+        breaker = self.breakers.get(method)
+        if breaker is None:
+            breaker = self.breakers[method] = CircuitBreaker(method, self.failure_threshold, self.open_seconds, self.stale_ttl)
+        return breaker
+
+    def hedge_delay(self, method: str) -> Optional[float]:
+        if not self.hedge:
+            return None
+        p95 = self.latency.p95(method)
+        return None if p95 is None else max(self.hedge_min, p95)
+
+    async def hedged(self, method: str, attempt):
+        """Dispara `attempt()` e, se não responder até o p95, uma segunda cópia; vence a primeira resposta boa"""
+        delay = self.hedge_delay(method)
+        if delay is None:
+            return await attempt()
+
+        first = asyncio.ensure_future(attempt())
+        pending = {first}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return first.result()
+
+            self.stats["hedges"] += 1
+            second = asyncio.ensure_future(attempt())
+            pending.add(second)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self.stats["hedge_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "hedge_enabled": self.hedge,
+            "p95_ms": {m: round(p * 1000, 1) for m, p in self.latency.p95_all().items()},
+            "breakers": {m: b.get_stats() for m, b in self.breakers.items()},
+        }
+
+# Instância global de resiliência das chamadas Newcon
+newcon_resilience = Resilience()
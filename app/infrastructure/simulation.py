@@ -0,0 +1,268 @@
+import asyncio
+import json
+import os
+import random
+from typing import Optional
+
+from app.infrastructure.newcon_client import NewconClient
+from app.infrastructure.newcon_cache import cached_call
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Nomes de campo aceitos em cnsCaracteristicasGrupos / cnsRegraCobranca / cnsSimulador,
+# comparados sem diferenciar maiúsculas nem '_'. Outros nomes podem ser informados em
+# SIMULATION_FIELDS='{"taxa_administracao": ["MEU_CAMPO"]}' (têm prioridade).
+FIELD_ALIASES = {
+    "taxa_administracao": ("PERCENTUAL_TAXA_ADMINISTRACAO", "PE_TAXA_ADMINISTRACAO", "PC_TAXA_ADMINISTRACAO",
+                           "TAXA_ADMINISTRACAO", "TX_ADMINISTRACAO"),
+    "fundo_reserva": ("PERCENTUAL_FUNDO_RESERVA", "PE_FUNDO_RESERVA", "PC_FUNDO_RESERVA", "FUNDO_RESERVA",
+                      "TX_FUNDO_RESERVA"),
+    "seguro": ("PERCENTUAL_SEGURO", "PE_SEGURO", "PC_SEGURO", "SEGURO", "TX_SEGURO"),
+    "fundo_comum": ("PERCENTUAL_FUNDO_COMUM", "PE_FUNDO_COMUM", "PC_FUNDO_COMUM", "FUNDO_COMUM"),
+    "parcela_inicial": ("PARCELA_INICIAL", "NUMERO_PARCELA_INICIAL", "PARCELA_DE", "DE_PARCELA"),
+    "parcela_final": ("PARCELA_FINAL", "NUMERO_PARCELA_FINAL", "PARCELA_ATE", "ATE_PARCELA"),
+    "valor_parcela": ("VALOR_PARCELA", "VL_PARCELA", "VALOR_PRIMEIRA_PARCELA", "PARCELA"),
+}
+
+def _norm(name: str) -> str:
+    return name.upper().replace("_", "")
+
+def _aliases() -> dict:
+    aliases = {k: [_norm(n) for n in v] for k, v in FIELD_ALIASES.items()}
+    extra = os.environ.get("SIMULATION_FIELDS", "")
+    if extra:
+        try:
+            for k, names in json.loads(extra).items():
+                aliases[k] = [_norm(n) for n in names] + aliases.get(k, [])
+        except (ValueError, AttributeError) as e:
+            print(f"⚠️ SIMULATION_FIELDS inválido: {e}")
+    return aliases
+
+def _to_float(value) -> Optional[float]:
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip().replace("%", "")
+    if "," in text:
+        # Formato brasileiro: 1.234,56
+        text = text.replace(".", "").replace(",", ".")
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+class SimulationError(Exception):
+    """Regras de cobrança insuficientes para simular localmente"""
+
+class Plano:
+    """Percentuais (sobre o valor do bem) de cada parcela de um grupo/prazo.
+
+    `pct[i]` = fundo comum + taxa de administração + fundo de reserva + seguro
+    da parcela i+1. Como a parcela é linear no valor do bem, o plano é montado
+    uma vez por prazo e aplicado a todos os valores.
+    """
+
+    def __init__(self, prazo: int, pct: list, taxa_administracao: float, fundo_reserva: float,
+                 seguro: float, fonte: str):
+        self.prazo = prazo
+        self.pct = pct
+        self.taxa_administracao = taxa_administracao
+        self.fundo_reserva = fundo_reserva
+        self.seguro = seguro
+        self.fonte = fonte
+
+    def faixas(self) -> list:
+        """Trechos de parcelas com o mesmo percentual: [(de, ate, pct)]"""
+        out = []
+        for i, p in enumerate(self.pct, start=1):
+            if out and abs(out[-1][2] - p) < 1e-12:
+                out[-1] = (out[-1][0], i, p)
+            else:
+                out.append((i, i, p))
+        return out
+
+class SimulationEngine:
+    """Simulação de parcelas de consórcio calculada localmente.
+
+    Usa cnsCaracteristicasGrupos (taxa de administração, fundo de reserva,
+    seguro) e cnsRegraCobranca (distribuição por faixa de parcelas), ambos
+    lidos pelo cache read-through, e calcula a grade valores × prazos de uma
+    vez (numpy quando instalado). O modo de verificação compara amostras com
+    o cnsSimulador real e registra o desvio.
+
+    A fórmula da parcela (fundo comum da faixa + taxa de administração e fundo
+    de reserva proporcionais ao fundo comum + seguro) e os nomes em
+    FIELD_ALIASES são uma aproximação sem especificação do Newcon por trás.
+    Por isso a simulação local só é servida como resultado quando
+    `SIMULATION_LOCAL=true`, a ser ligado depois que a verificação contra
+    dados reais não mostrar desvio; desligada, a grade só sai junto com a
+    verificação e marcada como não autoritativa.
+    """
+
+    def __init__(self):
+        self.enabled = os.environ.get("SIMULATION_LOCAL", "false").lower() in ("1", "true", "yes")
+        self.max_cells = int(os.environ.get("SIMULATION_GRID_MAX_CELLS", "2500"))
+        self.drift_tolerance_pct = float(os.environ.get("SIMULATION_DRIFT_TOLERANCE_PCT", "1.0"))
+        self.aliases = _aliases()
+        self.stats = {"grids": 0, "cells": 0, "verified": 0, "drift_over_tolerance": 0, "max_drift_pct": 0.0,
+                      "verify_errors": 0, "verify_skipped_stale": 0}
+
+    def _field(self, row: dict, name: str) -> Optional[float]:
+        wanted = self.aliases[name]
+        found = {}
+        for key, value in row.items():
+            n = _norm(key)
+            if n in wanted:
+                found[n] = value
+        for n in wanted:
+            if n in found:
+                value = _to_float(found[n])
+                if value is not None:
+                    return value
+        return None
+
+    def _first(self, rows: list, name: str) -> Optional[float]:
+        for row in rows:
+            value = self._field(row, name)
+            if value is not None:
+                return value
+        return None
+
+    def build_plano(self, prazo: int, caracteristicas: list, regra: list) -> Plano:
+        """Monta os percentuais por parcela a partir das linhas das duas consultas"""
+        ta = self._first(regra, "taxa_administracao")
+        if ta is None:
+            ta = self._first(caracteristicas, "taxa_administracao")
+        fr = self._first(regra, "fundo_reserva")
+        if fr is None:
+            fr = self._first(caracteristicas, "fundo_reserva")
+        seguro = self._first(regra, "seguro")
+        if seguro is None:
+            seguro = self._first(caracteristicas, "seguro")
+        if ta is None:
+            raise SimulationError(f"Taxa de administração não encontrada para o prazo {prazo}")
+        fr = fr or 0.0
+        seguro = seguro or 0.0
+
+        # Fundo comum por parcela: faixas da regra de cobrança, o restante dividido igualmente
+        fc = [None] * prazo
+        for row in regra:
+            de, ate = self._field(row, "parcela_inicial"), self._field(row, "parcela_final")
+            pct = self._field(row, "fundo_comum")
+            if de is None or pct is None:
+                continue
+            ate = de if ate is None else ate
+            for i in range(max(1, int(de)), min(prazo, int(ate)) + 1):
+                fc[i - 1] = pct
+        livres = [i for i, p in enumerate(fc) if p is None]
+        if livres:
+            resto = max(0.0, 100.0 - sum(p for p in fc if p is not None)) / len(livres)
+            for i in livres:
+                fc[i] = resto
+        fonte = "regra_cobranca" if len(livres) < prazo else "uniforme"
+
+        # Taxa de administração e fundo de reserva acompanham a amortização do fundo comum
+        total_fc = sum(fc) or 100.0
+        pct = [p + (ta + fr) * p / total_fc + seguro for p in fc]
+        return Plano(prazo, pct, ta, fr, seguro, fonte)
+
+    async def plano(self, nc: NewconClient, grupo: int, prazo: int) -> Plano:
+        caracteristicas, regra = await asyncio.gather(
+            cached_call(nc, "cnsCaracteristicasGrupos", {"Codigo_Grupo": grupo}),
+            cached_call(nc, "cnsRegraCobranca", {"Codigo_Grupo": grupo, "Prazo": prazo}),
+        )
+        return self.build_plano(prazo, list((caracteristicas or {}).get("items") or []),
+                                list((regra or {}).get("items") or []))
+
+    @staticmethod
+    def _matrix(valores: list, pcts: list) -> list:
+        """valores × percentuais / 100, arredondado em centavos"""
+        if np is not None:
+            return np.round(np.outer(np.asarray(valores, dtype=float), np.asarray(pcts, dtype=float) / 100), 2).tolist()
+        return [[round(v * p / 100, 2) for p in pcts] for v in valores]
+
+    def simulate(self, plano: Plano, valores: list, detalhar: bool = False) -> list:
+        faixas = plano.faixas()
+        parcelas = self._matrix(valores, [f[2] for f in faixas])
+        totais = self._matrix(valores, [sum(plano.pct)])
+        detalhe = self._matrix(valores, plano.pct) if detalhar else None
+        out = []
+        for i, valor in enumerate(valores):
+            cell = {
+                "Valor_Bem": valor,
+                "Prazo": plano.prazo,
+                "Primeira_Parcela": parcelas[i][0],
+                "Total": totais[i][0],
+                "faixas": [{"de": de, "ate": ate, "valor_parcela": parcelas[i][j]}
+                           for j, (de, ate, _) in enumerate(faixas)],
+            }
+            if detalhe is not None:
+                cell["parcelas"] = detalhe[i]
+            out.append(cell)
+        return out
+
+    async def grid(self, nc: NewconClient, grupo: int, prazos: list, valores: list,
+                   detalhar: bool = False) -> dict:
+        """Grade completa valores × prazos para um grupo"""
+        prazos = list(dict.fromkeys(prazos))
+        valores = list(dict.fromkeys(valores))
+        if len(prazos) * len(valores) > self.max_cells:
+            raise SimulationError(f"Grade com mais de {self.max_cells} combinações")
+        planos = await asyncio.gather(*(self.plano(nc, grupo, p) for p in prazos))
+        self.stats["grids"] += 1
+        self.stats["cells"] += len(prazos) * len(valores)
+        return {
+            "Codigo_Grupo": grupo,
+            "planos": [{"Prazo": p.prazo, "taxa_administracao": p.taxa_administracao,
+                        "fundo_reserva": p.fundo_reserva, "seguro": p.seguro, "fonte": p.fonte} for p in planos],
+            "simulacoes": [cell for p in planos for cell in self.simulate(p, valores, detalhar)],
+        }
+
+    async def verify(self, nc: NewconClient, grupo: int, simulacoes: list, amostras: int) -> dict:
+        """Compara uma amostra da grade com o cnsSimulador e reporta o desvio da primeira parcela"""
+        sample = random.sample(simulacoes, min(amostras, len(simulacoes)))
+
+        async def check(cell: dict) -> dict:
+            params = {"Codigo_Grupo": grupo, "Prazo": cell["Prazo"], "Valor_Bem": cell["Valor_Bem"]}
+            try:
+                data = await nc.call("cnsSimulador", params)
+            except Exception as e:
+                self.stats["verify_errors"] += 1
+                return {**params, "erro": str(e)}
+            if isinstance(data, dict) and data.get("stale"):
+                # Breaker aberto: a resposta é a última boa guardada, não serve de referência
+                self.stats["verify_skipped_stale"] += 1
+                return {**params, "erro": "cnsSimulador indisponível (circuit breaker aberto); resposta stale ignorada"}
+            rows = (data or {}).get("items") or [data or {}]
+            upstream = self._first(list(rows), "valor_parcela")
+            if upstream is None:
+                self.stats["verify_errors"] += 1
+                return {**params, "erro": "valor da parcela não encontrado na resposta do cnsSimulador"}
+            drift = round(cell["Primeira_Parcela"] - upstream, 2)
+            drift_pct = round(abs(drift) / upstream * 100, 4) if upstream else None
+            self.stats["verified"] += 1
+            if drift_pct is not None:
+                self.stats["max_drift_pct"] = max(self.stats["max_drift_pct"], drift_pct)
+                if drift_pct > self.drift_tolerance_pct:
+                    self.stats["drift_over_tolerance"] += 1
+            return {**params, "local": cell["Primeira_Parcela"], "cnsSimulador": upstream,
+                    "desvio": drift, "desvio_pct": drift_pct}
+
+        resultados = await asyncio.gather(*(check(c) for c in sample))
+        desvios = [r["desvio_pct"] for r in resultados if r.get("desvio_pct") is not None]
+        return {
+            "amostras": resultados,
+            "max_desvio_pct": max(desvios) if desvios else None,
+            "tolerancia_pct": self.drift_tolerance_pct,
+            "dentro_da_tolerancia": all(d <= self.drift_tolerance_pct for d in desvios) if desvios else None,
+        }
+
+    def get_stats(self) -> dict:
+        return {"enabled": self.enabled, "numpy": np is not None, "max_cells": self.max_cells, **self.stats}
+
+# Instância global do motor de simulação
+simulation_engine = SimulationEngine()
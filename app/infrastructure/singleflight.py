@@ -0,0 +1,112 @@
+import asyncio
+import hashlib
+import json
+import math
+import os
+from typing import Any, Awaitable, Callable
+
+from app.infrastructure.cache.redis_client import redis_client
+from app.infrastructure.concurrency_limiter import UpstreamOverloaded
+
+def canonical_key(method: str, params: dict) -> str:
+    """Chave estável para método + parâmetros (ignora None, como o envelope SOAP)"""
+    clean = {k: v for k, v in params.items() if v is not None}
+    return f"{method}:{json.dumps(clean, sort_keys=True, default=str, ensure_ascii=False)}"
+
+class SingleFlight:
+    """Coalesce chamadas idênticas em andamento.
+
+    Chamadores concorrentes com a mesma chave aguardam a mesma task; o resultado
+    ou a exceção é entregue a todos. No modo cross-instance, um lease curto no
+    Redis (SET NX) elege um único worker para ir ao upstream e os demais leem o
+    resultado (ou o erro) publicado por ele. O resultado só é lido por quem
+    esperou o lease de outro worker e vive poucos intervalos de polling, então
+    não vira um cache para métodos sem política; se o lease expirar sem
+    publicação, cada worker volta a chamar por conta própria.
+    """
+
+    def __init__(self):
+        self.enabled = os.environ.get("NEWCON_SINGLEFLIGHT", "true").lower() in ("1", "true", "yes")
+        self.cross_instance = os.environ.get("NEWCON_SINGLEFLIGHT_REDIS", "false").lower() in ("1", "true", "yes")
+        self.lock_ms = int(os.environ.get("NEWCON_SINGLEFLIGHT_LOCK_MS", "10000"))
+        self.poll_ms = int(os.environ.get("NEWCON_SINGLEFLIGHT_POLL_MS", "50"))
+        self._inflight = {}
+        self.stats = {"leaders": 0, "coalesced": 0, "remote_hits": 0, "remote_errors": 0}
+
+    async def do(self, key: str, fetch_func: Callable[[], Awaitable[Any]]) -> Any:
+        if not self.enabled:
+            return await fetch_func()
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+            # shield: o cancelamento de um chamador não cancela os demais
+            return await asyncio.shield(task)
+
+        self.stats["leaders"] += 1
+        task = asyncio.ensure_future(self._run(key, fetch_func))
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _run(self, key: str, fetch_func: Callable[[], Awaitable[Any]]) -> Any:
+        if not (self.cross_instance and redis_client.connected):
+            return await fetch_func()
+
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        lock_key = f"singleflight:lock:{digest}"
+        result_key = f"singleflight:result:{digest}"
+        deadline = asyncio.get_running_loop().time() + self.lock_ms / 1000
+        # Suficiente para os workers em polling lerem a publicação do líder
+        result_ttl = max(1, math.ceil(self.poll_ms * 4 / 1000))
+        waited = False
+
+        while True:
+            token = await redis_client.acquire_lock(lock_key, self.lock_ms)
+            if token:
+                try:
+                    if waited:
+                        # O líder que aguardávamos pode ter publicado e liberado entre dois polls
+                        published = await redis_client.get(result_key)
+                        if published is not None:
+                            return self._remote(published)
+                    else:
+                        # Publicação de um voo anterior não serve para este
+                        await redis_client.delete(result_key)
+                    try:
+                        result = await fetch_func()
+                    except Exception as e:
+                        await redis_client.set(result_key, {"error": {
+                            "status_code": getattr(e, "status_code", 502),
+                            "code": getattr(e, "code", "upstream_error"),
+                            "message": str(e) or type(e).__name__,
+                        }}, result_ttl)
+                        raise
+                    await redis_client.set(result_key, {"value": result}, result_ttl)
+                    return result
+                finally:
+                    await redis_client.release_lock(lock_key, token)
+
+            # Outro worker é o líder: aguarda o resultado publicado
+            waited = True
+            published = await redis_client.get(result_key)
+            if published is not None:
+                return self._remote(published)
+            if asyncio.get_running_loop().time() >= deadline:
+                return await fetch_func()
+            await asyncio.sleep(self.poll_ms / 1000)
+
+    def _remote(self, published: dict) -> Any:
+        """Entrega o resultado do líder remoto; o erro dele vira o mesmo erro aqui"""
+        error = published.get("error")
+        if error is not None:
+            self.stats["remote_errors"] += 1
+            raise UpstreamOverloaded(error["status_code"], error["code"], error["message"])
+        self.stats["remote_hits"] += 1
+        return published["value"]
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "inflight": len(self._inflight)}
+
+# Instância global do single-flight das chamadas Newcon
+newcon_singleflight = SingleFlight()
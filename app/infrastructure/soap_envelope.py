@@ -0,0 +1,92 @@
+import xml.etree.ElementTree as ET
+
+SOAP_ENV_NS = "http://schemas.xmlsoap.org/soap/envelope/"
+NEWCON_NS = "http://www.cnpm.com.br/"
+
+# Métodos do wsRegVenda (01–11) pré-compilados na importação
+WSREGVENDA_METHODS = (
+    "cnsTiposGrupos", "cnsTiposVendas", "cnsBensDisponiveis", "cnsPrazosDisponiveis",
+    "cnsRegraCobranca", "cnsCaracteristicasGrupos", "cnsReservaCotas", "cnsCalendarioAssembleias",
+    "cnsSimulador", "prcIncluiReservaCotas", "prcIncluiProposta", "prcIncluiPropostaRecebimento",
+    "cnsEmiteProposta", "cnsCliente", "prcManutencaoCliente_new", "cnsBancosDebito",
+    "prcIncluiRegistroDebitoConta", "cnsEmiteBoletoProposta",
+)
+
+_MARK = "NEWCONPARAM"
+
+def build_envelope_etree(method: str, params: dict) -> bytes:
+    """Monta o envelope via ElementTree (referência para os templates)"""
+    # Usar o namespace correto da Newcon (como no projeto legado)
+    root = ET.Element("{%s}Envelope" % SOAP_ENV_NS)
+    root.set("xmlns:xsi", "http://www.w3.org/2001/XMLSchema-instance")
+    root.set("xmlns:xsd", "http://www.w3.org/2001/XMLSchema")
+    root.set("xmlns:soap", SOAP_ENV_NS)
+
+    body = ET.SubElement(root, "{%s}Body" % SOAP_ENV_NS)
+    m = ET.SubElement(body, method)
+    m.set("xmlns", NEWCON_NS)
+
+    for k, v in params.items():
+        if v is not None:
+            el = ET.SubElement(m, k)
+            el.text = str(v)
+
+    return ET.tostring(root, encoding="utf-8", xml_declaration=True)
+
+def _escape_text(text: str) -> str:
+    # Mesmo escape de texto do ElementTree (apenas &, < e >)
+    if "&" in text:
+        text = text.replace("&", "&amp;")
+    if "<" in text:
+        text = text.replace("<", "&lt;")
+    if ">" in text:
+        text = text.replace(">", "&gt;")
+    return text
+
+class EnvelopeTemplate:
+    """Envelope SOAP de um método compilado em fragmentos de bytes.
+
+    Os fragmentos são extraídos da própria saída do ElementTree, então o
+    resultado de render() é idêntico byte a byte ao de build_envelope_etree().
+    """
+
+    def __init__(self, method: str):
+        self.method = method
+        self.empty = build_envelope_etree(method, {})
+        marked = build_envelope_etree(method, {_MARK: _MARK})
+        self.prefix, rest = marked.split(f"<{_MARK}>".encode(), 1)
+        _, self.suffix = rest.split(f"</{_MARK}>".encode(), 1)
+        self._tags = {}
+
+    def _tag(self, key: str):
+        tags = self._tags.get(key)
+        if tags is None:
+            tags = self._tags[key] = (f"<{key}>".encode(), f"</{key}>".encode(), f"<{key} />".encode())
+        return tags
+
+    def render(self, params: dict) -> bytes:
+        parts = [self.prefix]
+        for k, v in params.items():
+            if v is None:
+                continue
+            open_tag, close_tag, empty_tag = self._tag(k)
+            text = str(v)
+            if text:
+                parts.append(open_tag)
+                parts.append(_escape_text(text).encode("utf-8", "xmlcharrefreplace"))
+                parts.append(close_tag)
+            else:
+                parts.append(empty_tag)
+        if len(parts) == 1:
+            return self.empty
+        parts.append(self.suffix)
+        return b"".join(parts)
+
+_templates = {method: EnvelopeTemplate(method) for method in WSREGVENDA_METHODS}
+
+def soap_envelope(method: str, params: dict) -> bytes:
+    """Renderiza o envelope SOAP do método a partir do template em cache"""
+    template = _templates.get(method)
+    if template is None:
+        template = _templates[method] = EnvelopeTemplate(method)
+    return template.render(params)
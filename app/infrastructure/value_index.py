@@ -0,0 +1,77 @@
+from bisect import bisect_left, bisect_right
+from typing import Optional
+
+# Campo onde o índice é guardado junto ao payload em cache (removido na resposta)
+INDEX_FIELD = "_valor_index"
+
+def _to_float(value) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def with_value_index(data: dict, field: str = "Valor_Bem") -> dict:
+    """Anexa ao payload o índice ordenado de `field` (montado uma vez, na gravação do cache)"""
+    pares = sorted(
+        (valor, pos) for pos, item in enumerate(data.get("items") or [])
+        if isinstance(item, dict) and (valor := _to_float(item.get(field))) is not None
+    )
+    return {**data, INDEX_FIELD: {"valores": [v for v, _ in pares], "posicoes": [p for _, p in pares]}}
+
+def without_value_index(data):
+    """Remove o índice antes de devolver o payload ao cliente"""
+    if isinstance(data, dict) and INDEX_FIELD in data:
+        return {k: v for k, v in data.items() if k != INDEX_FIELD}
+    return data
+
+class ValueIndex:
+    """Índice ordenado de valores com buscas por faixa e vizinhos mais próximos via bisect"""
+
+    def __init__(self, items: list, valores: list, posicoes: list):
+        self.items = items
+        self.valores = valores
+        self.posicoes = posicoes
+
+    @classmethod
+    def from_data(cls, data: dict, field: str = "Valor_Bem") -> "ValueIndex":
+        index = data.get(INDEX_FIELD)
+        if index is None:
+            # Payload sem índice (ex.: não veio do cache): monta na hora
+            index = with_value_index(data, field)[INDEX_FIELD]
+        return cls(data.get("items") or [], index["valores"], index["posicoes"])
+
+    def __len__(self) -> int:
+        return len(self.valores)
+
+    def range(self, valor_min: float, valor_max: float) -> list:
+        """Itens com valor em [valor_min, valor_max], na ordem original"""
+        lo = bisect_left(self.valores, valor_min)
+        hi = bisect_right(self.valores, valor_max)
+        return [self.items[p] for p in sorted(self.posicoes[lo:hi])]
+
+    def nearest(self, valor: float, k: int = 1) -> list:
+        """Os k itens mais próximos de `valor` (empates resolvidos pela ordem original)"""
+        n = len(self.valores)
+        if n == 0 or k <= 0:
+            return []
+        k = min(k, n)
+        left = bisect_left(self.valores, valor) - 1
+        right = left + 1
+        candidatos = []
+        # Expande para os dois lados até ter k itens e esgotar empates com o k-ésimo
+        while left >= 0 or right < n:
+            d_left = valor - self.valores[left] if left >= 0 else None
+            d_right = self.valores[right] - valor if right < n else None
+            if d_right is None or (d_left is not None and d_left <= d_right):
+                dist, pos = d_left, self.posicoes[left]
+                left -= 1
+            else:
+                dist, pos = d_right, self.posicoes[right]
+                right += 1
+            if len(candidatos) >= k and dist > candidatos[k - 1][0]:
+                break
+            candidatos.append((dist, pos))
+        candidatos.sort()
+        return [self.items[p] for _, p in candidatos[:k]]
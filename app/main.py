@@ -1,4 +1,5 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
 import os
 
@@ -8,6 +9,11 @@ load_dotenv()
 from app.routers import health, utils, catalog, simulate, proposals, clients, billing
 from app.routers.integrations import crm, whatsapp, outlook, docusign, reports
 from app.infrastructure.cache import hybrid_cache
+from app.infrastructure.newcon_client import get_newcon_client, close_newcon_client
+from app.infrastructure.concurrency_limiter import UpstreamOverloaded
+from app.infrastructure.catalog_warmer import catalog_warmer
+from app.infrastructure.idempotency import idempotency_store, IdempotencyError
+from app.schemas.base import fail
 
 app = FastAPI(
     title="Triângulo Consórcio - API Copilot",
@@ -17,14 +23,30 @@ app = FastAPI(
 
 @app.on_event("startup")
 async def startup_event():
-    """Inicializa o cache híbrido na startup"""
+    """Inicializa o cache híbrido, a idempotência, o cliente Newcon compartilhado e o warmer do catálogo na startup"""
     await hybrid_cache.initialize()
+    await idempotency_store.start()
+    catalog_warmer.start(get_newcon_client())
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    """Desconecta do Redis na shutdown"""
+    """Para o warmer, fecha o cliente Newcon e desconecta do Redis na shutdown"""
+    await catalog_warmer.stop()
+    await close_newcon_client()
+    await idempotency_store.stop()
     await hybrid_cache.disconnect()
 
+@app.exception_handler(UpstreamOverloaded)
+async def upstream_overloaded_handler(request: Request, exc: UpstreamOverloaded):
+    """Load shedding: responde rápido com envelope de erro em vez de enfileirar"""
+    return JSONResponse(status_code=exc.status_code, content=fail(exc.code, str(exc)).model_dump(), headers={"Retry-After": "1"})
+
+@app.exception_handler(IdempotencyError)
+async def idempotency_error_handler(request: Request, exc: IdempotencyError):
+    """Chave em andamento (409, tente de novo) ou reutilizada com outro payload (422)"""
+    headers = {"Retry-After": "1"} if exc.status_code == 409 else None
+    return JSONResponse(status_code=exc.status_code, content=fail(exc.code, str(exc)).model_dump(), headers=headers)
+
 # Core wsRegVenda
 app.include_router(health.router, prefix="")
 app.include_router(utils.router, prefix="/utils")
@@ -1,20 +1,23 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Header
 from pydantic import BaseModel
 from app.security import require_api_key
 from app.schemas.base import ok, Envelope
-from app.infrastructure.newcon_client import NewconClient
+from app.infrastructure.newcon_client import NewconClient, get_newcon_client
+from app.infrastructure.newcon_cache import cached_response
+from app.infrastructure.idempotency import idempotency_store
 router=APIRouter(dependencies=[Depends(require_api_key)], tags=["billing"])
 @router.get("/cnsBancosDebito", response_model=Envelope)
-async def bancos():
-    nc=NewconClient(); data=await nc.call("cnsBancosDebito", {}); await nc.close(); return ok(data)
+async def bancos(nc: NewconClient = Depends(get_newcon_client)):
+    return await cached_response(nc, "cnsBancosDebito", {})
 class RegistroDebitoIn(BaseModel):
     Numero_Contrato:int; Banco:str; Agencia:str; Conta:str
 @router.post("/prcIncluiRegistroDebitoConta", response_model=Envelope)
-async def registra(body: RegistroDebitoIn):
-    nc=NewconClient(); data=await nc.call("prcIncluiRegistroDebitoConta", body.model_dump()); await nc.close(); return ok(data)
+async def registra(body: RegistroDebitoIn, idempotency_key: str | None = Header(default=None, alias="Idempotency-Key"), nc: NewconClient = Depends(get_newcon_client)):
+    run=lambda: nc.call("prcIncluiRegistroDebitoConta", body.model_dump(), idempotency_key=idempotency_key)
+    data=await idempotency_store.run("prcIncluiRegistroDebitoConta", idempotency_key, body.model_dump(), run); return ok(data)
 class BoletoIn(BaseModel):
     Numero_Contrato:int|None=None; Data_Vencimento_Boleto:str="1900-01-01"
 @router.post("/cnsEmiteBoletoProposta", response_model=Envelope)
-async def boleto(body: BoletoIn):
+async def boleto(body: BoletoIn, nc: NewconClient = Depends(get_newcon_client)):
     payload={k:v for k,v in body.model_dump().items() if v is not None}
-    nc=NewconClient(); data=await nc.call("cnsEmiteBoletoProposta", payload); await nc.close(); return ok(data)
+    data=await nc.call("cnsEmiteBoletoProposta", payload); return ok(data)
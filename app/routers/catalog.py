@@ -1,109 +1,125 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, HTTPException
 from datetime import date
+import os
 from app.security import require_api_key
 from app.schemas.base import ok, Envelope
-from app.infrastructure.newcon_client import NewconClient
+from app.infrastructure.newcon_client import NewconClient, get_newcon_client
+from app.infrastructure.newcon_cache import cached_call, cached_response, refresh_many, cached_hit, cache_key, bens_params
+from app.infrastructure.value_index import ValueIndex, without_value_index
 router=APIRouter(dependencies=[Depends(require_api_key)], tags=["catalog"])
 @router.get("/cnsTiposGrupos", response_model=Envelope)
-async def tipos(): nc=NewconClient(); data=await nc.call("cnsTiposGrupos", {}); await nc.close(); return ok(data)
+async def tipos(nc: NewconClient = Depends(get_newcon_client)): return await cached_response(nc, "cnsTiposGrupos", {})
 @router.get("/cnsTiposVendas", response_model=Envelope)
-async def vendas(Codigo_Tipo_Grupo:str): nc=NewconClient(); data=await nc.call("cnsTiposVendas", {"Codigo_Tipo_Grupo": Codigo_Tipo_Grupo}); await nc.close(); return ok(data)
+async def vendas(Codigo_Tipo_Grupo:str, nc: NewconClient = Depends(get_newcon_client)): return await cached_response(nc, "cnsTiposVendas", {"Codigo_Tipo_Grupo": Codigo_Tipo_Grupo})
 @router.get("/cnsBensDisponiveis", response_model=Envelope)
-async def bens(Codigo_Tipo_Grupo:str, Codigo_Tipo_Venda:str, valor_busca:float=None, tolerancia_percentual:float=5.0): 
-    from app.infrastructure.cache import hybrid_cache
-    
-    # Chave do cache baseada nos parâmetros
-    cache_key = f"bens_disponiveis:{Codigo_Tipo_Grupo}:{Codigo_Tipo_Venda}"
-    
-    async def fetch_bens():
-        nc=NewconClient()
-        # Codigo_Filial sempre será 001 (hardcoded)
-        data=await nc.call("cnsBensDisponiveis", {
-            "Codigo_Filial": "001",
-            "Codigo_Tipo_Grupo": Codigo_Tipo_Grupo,
-            "Codigo_Tipo_Venda": Codigo_Tipo_Venda
-        })
-        await nc.close()
-        return data
-    
-    # Verificar cache primeiro
-    cached_data = await hybrid_cache.get(cache_key)
-    if cached_data is not None:
-        # Se tem cache, verificar se tem bens válidos
-        if cached_data.get("items") and len(cached_data.get("items", [])) > 0:
-            data = cached_data
-        else:
-            # Cache vazio, buscar novamente
-            data = await fetch_bens()
-            # Só cacheia se tiver bens válidos
-            if data and data.get("items") and len(data.get("items", [])) > 0:
-                await hybrid_cache.set(cache_key, data, ttl_seconds=1800)
-    else:
-        # Sem cache, buscar dados
-        data = await fetch_bens()
-        # Só cacheia se tiver bens válidos
-        if data and data.get("items") and len(data.get("items", [])) > 0:
-            await hybrid_cache.set(cache_key, data, ttl_seconds=1800)
+async def bens(Codigo_Tipo_Grupo:str, Codigo_Tipo_Venda:str, valor_busca:float=None, tolerancia_percentual:float=5.0,
+               valores_busca:str|None=Query(None, description="Vários valores separados por vírgula"),
+               top_k:int=Query(1, ge=1, le=50, description="Quantos mais próximos retornar fora da tolerância"),
+               nc: NewconClient = Depends(get_newcon_client)): 
+    # Sem valor de busca retorna todos os bens: JSON pronto guardado junto da entrada do cache
+    if valor_busca is None and not valores_busca:
+        return await cached_response(nc, "cnsBensDisponiveis", bens_params(Codigo_Tipo_Grupo, Codigo_Tipo_Venda),
+                                     view="bens", transform=bens_sem_busca)
+
+    # Cache read-through conforme a política de cnsBensDisponiveis
+    data = await cached_call(nc, "cnsBensDisponiveis", bens_params(Codigo_Tipo_Grupo, Codigo_Tipo_Venda))
     
     # Verificar se há bens válidos antes de processar
     if not data or "items" not in data or not data["items"] or len(data["items"]) == 0:
         # Se não há bens, retorna resposta vazia
         return ok({"items": [], "ok": True, "error": None})
     
-    # Se não especificou valor de busca, retorna todos os bens
-    if valor_busca is None:
-        return ok(data)
+    # Índice ordenado de Valor_Bem (pré-calculado na gravação do cache)
+    index = ValueIndex.from_data(data)
+    if not len(index):
+        return ok(without_value_index(data))
     
-    # Aplicar tolerância e buscar o mais próximo
-    if "items" in data and data["items"]:
-        items = data["items"]
-        
-        # Calcular tolerância (±5% por padrão)
-        tolerancia_valor = valor_busca * (tolerancia_percentual / 100)
-        valor_min = valor_busca - tolerancia_valor
-        valor_max = valor_busca + tolerancia_valor
-        
-        # Filtrar bens dentro da tolerância
-        bens_tolerancia = []
-        for item in items:
-            if "Valor_Bem" in item and item["Valor_Bem"]:
-                valor_bem = float(item["Valor_Bem"])
-                if valor_min <= valor_bem <= valor_max:
-                    bens_tolerancia.append(item)
-        
-        # Se encontrou bens na tolerância, retorna eles
-        if bens_tolerancia:
-            return ok({"items": bens_tolerancia, "filtro_aplicado": f"Tolerância ±{tolerancia_percentual}%", "valor_busca": valor_busca})
-        
-        # Se não encontrou na tolerância, busca o mais próximo
-        bens_com_valor = [item for item in items if "Valor_Bem" in item and item["Valor_Bem"]]
-        if bens_com_valor:
-            # Ordenar por proximidade do valor buscado
-            bens_com_valor.sort(key=lambda x: abs(float(x["Valor_Bem"]) - valor_busca))
-            mais_proximo = bens_com_valor[0]
-            return ok({
-                "items": [mais_proximo], 
-                "filtro_aplicado": "Mais próximo disponível (fora da tolerância)",
-                "valor_busca": valor_busca,
-                "valor_encontrado": mais_proximo["Valor_Bem"]
-            })
+    if valores_busca:
+        try:
+            valores = [float(v) for v in valores_busca.split(",") if v.strip()]
+        except ValueError:
+            raise HTTPException(status_code=422, detail="valores_busca deve ser uma lista de números separados por vírgula")
+        return ok({"buscas": [buscar_por_valor(index, v, tolerancia_percentual, top_k) for v in valores]})
+    return ok(buscar_por_valor(index, valor_busca, tolerancia_percentual, top_k))
+def bens_sem_busca(data: dict) -> dict:
+    if not data or not data.get("items"):
+        return {"items": [], "ok": True, "error": None}
+    return without_value_index(data)
+def buscar_por_valor(index: ValueIndex, valor_busca: float, tolerancia_percentual: float, top_k: int = 1) -> dict:
+    # Calcular tolerância (±5% por padrão)
+    tolerancia_valor = valor_busca * (tolerancia_percentual / 100)
+    bens_tolerancia = index.range(valor_busca - tolerancia_valor, valor_busca + tolerancia_valor)
     
-    return ok(data)
+    # Se encontrou bens na tolerância, retorna eles
+    if bens_tolerancia:
+        return {"items": bens_tolerancia, "filtro_aplicado": f"Tolerância ±{tolerancia_percentual}%", "valor_busca": valor_busca}
+    
+    # Se não encontrou na tolerância, busca os mais próximos
+    mais_proximos = index.nearest(valor_busca, top_k)
+    return {
+        "items": mais_proximos,
+        "filtro_aplicado": "Mais próximo disponível (fora da tolerância)",
+        "valor_busca": valor_busca,
+        "valor_encontrado": mais_proximos[0]["Valor_Bem"]
+    }
+@router.get("/cnsBensDisponiveis/batch", response_model=Envelope, summary="03 - Bens Disponíveis em lote (vários tipos de venda)")
+async def bens_batch(Codigo_Tipo_Grupo:str, Codigos_Tipo_Venda:str="all", nc: NewconClient = Depends(get_newcon_client)):
+    """
+    Busca bens disponíveis de vários tipos de venda de um grupo em uma única chamada.
+
+    `Codigos_Tipo_Venda` aceita uma lista separada por vírgula ou `all` (todos os
+    tipos retornados por cnsTiposVendas). O cache é consultado com uma única busca
+    multi-chave e as faltas são buscadas no Newcon em paralelo, com concorrência
+    limitada por `CATALOG_BATCH_CONCURRENCY` e gravadas no cache em um único pipeline.
+    """
+    from app.infrastructure.cache import hybrid_cache
+
+    if Codigos_Tipo_Venda.strip().lower() == "all":
+        tipos = await cached_call(nc, "cnsTiposVendas", {"Codigo_Tipo_Grupo": Codigo_Tipo_Grupo})
+        vendas = [str(i["CODIGO_TIPO_VENDA"]) for i in tipos.get("items", []) if i.get("CODIGO_TIPO_VENDA")]
+    else:
+        vendas = [v.strip() for v in Codigos_Tipo_Venda.split(",") if v.strip()]
+    vendas = list(dict.fromkeys(vendas))
+
+    keys = [cache_key("cnsBensDisponiveis", bens_params(Codigo_Tipo_Grupo, v)) for v in vendas]
+    cached = await hybrid_cache.get_many(keys)
+    resultados = {}
+    faltas = []
+    for venda, data in zip(vendas, cached):
+        if cached_hit("cnsBensDisponiveis", data):
+            resultados[venda] = {"items": data["items"], "from_cache": True}
+        else:
+            faltas.append(venda)
+
+    buscados = await refresh_many(nc, "cnsBensDisponiveis", [bens_params(Codigo_Tipo_Grupo, v) for v in faltas],
+                                  concurrency=int(os.environ.get("CATALOG_BATCH_CONCURRENCY", "8")))
+    for venda, data in zip(faltas, buscados):
+        if isinstance(data, BaseException):
+            resultados[venda] = {"items": [], "from_cache": False, "error": str(data)}
+        else:
+            resultados[venda] = {"items": data.get("items", []) if data else [], "from_cache": False}
+
+    return ok({
+        "Codigo_Tipo_Grupo": Codigo_Tipo_Grupo,
+        "vendas": {v: resultados[v] for v in vendas},
+        "quantidade_bens": sum(len(r["items"]) for r in resultados.values()),
+        "vendas_com_bens": [v for v in vendas if resultados[v]["items"]]
+    })
 @router.get("/cnsPrazosDisponiveis", response_model=Envelope)
 async def prazos(Codigo_Unidade:int, Codigo_Tipo_Grupo:str, Codigo_Tipo_Venda:str, Codigo_Bem:int, Codigo_Representante:int,
                  Situacao_Grupo:str=Query("A", pattern="^[AFX]$"), Pessoa:str=Query("F", pattern="^[FJ]$"),
                  Ordem_Pesquisa:str=Query("P", pattern="^[PG]$"), Codigo_Filial:int=1, Prazo:int=0, Dia_Vencimento:int=0,
-                 Data_Assembleia:date=date.today(), Codigo_Grupo:int=0, SN_Rateia:str=Query("S", pattern="^[SN]$")):
+                 Data_Assembleia:date=date.today(), Codigo_Grupo:int=0, SN_Rateia:str=Query("S", pattern="^[SN]$"), nc: NewconClient = Depends(get_newcon_client)):
     payload={"Codigo_Unidade":Codigo_Unidade,"Codigo_Tipo_Grupo":Codigo_Tipo_Grupo,"Codigo_Tipo_Venda":Codigo_Tipo_Venda,"Codigo_Bem":Codigo_Bem,
              "Codigo_Representante":Codigo_Representante,"Situacao_Grupo":Situacao_Grupo,"Pessoa":Pessoa,"Ordem_Pesquisa":Ordem_Pesquisa,
              "Codigo_Filial":Codigo_Filial,"Prazo":Prazo,"Dia_Vencimento":Dia_Vencimento,"Data_Assembleia":Data_Assembleia.isoformat(),
              "Codigo_Grupo":Codigo_Grupo,"SN_Rateia":SN_Rateia}
-    nc=NewconClient(); data=await nc.call("cnsPrazosDisponiveis", payload); await nc.close(); return ok(data)
+    data=await nc.call("cnsPrazosDisponiveis", payload); return ok(data)
 @router.get("/cnsRegraCobranca", response_model=Envelope)
-async def regra(Codigo_Grupo:int, Prazo:int): nc=NewconClient(); data=await nc.call("cnsRegraCobranca", {"Codigo_Grupo":Codigo_Grupo,"Prazo":Prazo}); await nc.close(); return ok(data)
+async def regra(Codigo_Grupo:int, Prazo:int, nc: NewconClient = Depends(get_newcon_client)): return await cached_response(nc, "cnsRegraCobranca", {"Codigo_Grupo":Codigo_Grupo,"Prazo":Prazo})
 @router.get("/cnsCaracteristicasGrupos", response_model=Envelope)
-async def car(Codigo_Grupo:int): nc=NewconClient(); data=await nc.call("cnsCaracteristicasGrupos", {"Codigo_Grupo":Codigo_Grupo}); await nc.close(); return ok(data)
+async def car(Codigo_Grupo:int, nc: NewconClient = Depends(get_newcon_client)): return await cached_response(nc, "cnsCaracteristicasGrupos", {"Codigo_Grupo":Codigo_Grupo})
 @router.get("/cnsReservaCotas", response_model=Envelope)
-async def reserva(Codigo_Grupo_Inicial:int, Codigo_Grupo_Final:int): nc=NewconClient(); data=await nc.call("cnsReservaCotas", {"Codigo_Grupo_Inicial":Codigo_Grupo_Inicial,"Codigo_Grupo_Final":Codigo_Grupo_Final}); await nc.close(); return ok(data)
+async def reserva(Codigo_Grupo_Inicial:int, Codigo_Grupo_Final:int, nc: NewconClient = Depends(get_newcon_client)): data=await nc.call("cnsReservaCotas", {"Codigo_Grupo_Inicial":Codigo_Grupo_Inicial,"Codigo_Grupo_Final":Codigo_Grupo_Final}); return ok(data)
 @router.get("/cnsCalendarioAssembleias", response_model=Envelope)
-async def cal(): nc=NewconClient(); data=await nc.call("cnsCalendarioAssembleias", {}); await nc.close(); return ok(data)
+async def cal(nc: NewconClient = Depends(get_newcon_client)): return await cached_response(nc, "cnsCalendarioAssembleias", {})
@@ -1,19 +1,21 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Header
 from pydantic import BaseModel
 from app.security import require_api_key
 from app.schemas.base import ok, Envelope
-from app.infrastructure.newcon_client import NewconClient
+from app.infrastructure.newcon_client import NewconClient, get_newcon_client
+from app.infrastructure.idempotency import idempotency_store
 router=APIRouter(dependencies=[Depends(require_api_key)], tags=["clients"])
 @router.get("/cnsCliente", response_model=Envelope)
-async def cns_cliente(Documento: str | None = None, Codigo_Cliente: int | None = None):
+async def cns_cliente(Documento: str | None = None, Codigo_Cliente: int | None = None, nc: NewconClient = Depends(get_newcon_client)):
     params={}
     if Documento: params["Documento"]=Documento
     if Codigo_Cliente: params["Codigo_Cliente"]=Codigo_Cliente
-    nc=NewconClient(); data=await nc.call("cnsCliente", params); await nc.close()
+    data=await nc.call("cnsCliente", params)
     return ok(data)
 class ManutencaoClienteIn(BaseModel):
     Codigo_Cliente:int|None=None; Nome:str; Documento:str; Email:str|None=None; Telefone:str|None=None
 @router.post("/prcManutencaoCliente_new", response_model=Envelope)
-async def manutencao(body: ManutencaoClienteIn):
-    nc=NewconClient(); data=await nc.call("prcManutencaoCliente_new", body.model_dump()); await nc.close()
+async def manutencao(body: ManutencaoClienteIn, idempotency_key: str | None = Header(default=None, alias="Idempotency-Key"), nc: NewconClient = Depends(get_newcon_client)):
+    run=lambda: nc.call("prcManutencaoCliente_new", body.model_dump(), idempotency_key=idempotency_key)
+    data=await idempotency_store.run("prcManutencaoCliente_new", idempotency_key, body.model_dump(), run)
     return ok(data)
@@ -1,6 +1,8 @@
 from fastapi import APIRouter
 import os
+from app.infrastructure.cache.redis_client import redis_client
 router=APIRouter()
 @router.get('/healthz')
-async def healthz(): return {'ok': True}
-
+async def healthz():
+    # Redis fora não derruba a API (cache cai para memória), mas aparece no health
+    return {'ok': True, 'redis': redis_client.get_state()}
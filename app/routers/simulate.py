@@ -1,12 +1,36 @@
-from fastapi import APIRouter, Depends, Header
-from pydantic import BaseModel
+from fastapi import APIRouter, Depends, Header, HTTPException
+from pydantic import BaseModel, Field
 from app.security import require_api_key
 from app.schemas.base import ok, Envelope
-from app.infrastructure.newcon_client import NewconClient
+from app.infrastructure.newcon_client import NewconClient, get_newcon_client
+from app.infrastructure.simulation import simulation_engine, SimulationError
 router=APIRouter(dependencies=[Depends(require_api_key)], tags=["simulate"])
 class SimuladorIn(BaseModel):
     Codigo_Grupo:int; Prazo:int; Valor_Bem:float
 @router.post("/cnsSimulador", response_model=Envelope)
-async def sim(body: SimuladorIn, idempotency_key: str | None = Header(default=None, alias="Idempotency-Key")):
-    nc=NewconClient(); data=await nc.call("cnsSimulador", body.model_dump()); await nc.close()
+async def sim(body: SimuladorIn, idempotency_key: str | None = Header(default=None, alias="Idempotency-Key"), nc: NewconClient = Depends(get_newcon_client)):
+    data=await nc.call("cnsSimulador", body.model_dump())
     return ok({"simulacao": data, "idempotency_key": idempotency_key})
+class GradeIn(BaseModel):
+    Codigo_Grupo:int; Prazos:list[int]=Field(min_length=1); Valores_Bem:list[float]=Field(min_length=1)
+    detalhar:bool=False; verificar:int=Field(0, ge=0, le=20, description="Quantas combinações conferir no cnsSimulador")
+@router.post("/grade", response_model=Envelope, summary="Simulação local em lote (valores × prazos)")
+async def grade(body: GradeIn, nc: NewconClient = Depends(get_newcon_client)):
+    """
+    Calcula localmente as parcelas de todas as combinações de `Valores_Bem` × `Prazos` de um grupo,
+    a partir de cnsCaracteristicasGrupos e cnsRegraCobranca (em cache). `detalhar` inclui todas as
+    parcelas; `verificar` confere N combinações sorteadas no cnsSimulador e reporta o desvio.
+    Com `SIMULATION_LOCAL=false` (padrão) a grade só é devolvida junto com `verificar` e com
+    `autoritativo: false`.
+    """
+    if not simulation_engine.enabled and not body.verificar:
+        raise HTTPException(status_code=503, detail="Simulação local desativada (SIMULATION_LOCAL=false); "
+                                                    "informe verificar > 0 para avaliar o desvio contra o cnsSimulador")
+    try:
+        data=await simulation_engine.grid(nc, body.Codigo_Grupo, body.Prazos, body.Valores_Bem, body.detalhar)
+    except SimulationError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if body.verificar:
+        data["verificacao"]=await simulation_engine.verify(nc, body.Codigo_Grupo, data["simulacoes"], body.verificar)
+    data["autoritativo"]=simulation_engine.enabled
+    return ok(data)
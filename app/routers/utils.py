@@ -1,8 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import PlainTextResponse
+from typing import Optional
 from app.security import require_api_key
 from app.schemas.base import ok, Envelope
 from app.infrastructure.cache import hybrid_cache
 from app.infrastructure.cache.redis_client import redis_client
+from app.infrastructure.cache.memory_cache import memory_cache
+from app.infrastructure.cache.disk_cache import disk_cache
+from app.infrastructure.concurrency_limiter import newcon_limiter
+from app.infrastructure.singleflight import newcon_singleflight
+from app.infrastructure.resilience import newcon_resilience
+from app.infrastructure.catalog_warmer import catalog_warmer
+from app.infrastructure.idempotency import idempotency_store
+from app.infrastructure.simulation import simulation_engine
 import os
 from dotenv import load_dotenv
 
@@ -25,12 +35,35 @@ async def debug_env():
         "all_env_keys": [key for key in os.environ.keys() if "REDIS" in key.upper()]
     })
 
+@router.get('/newcon/stats', response_model=Envelope, summary="Métricas do upstream Newcon")
+async def newcon_stats():
+    """
+    Retorna o estado do limitador de concorrência, do single-flight, dos
+    retries/hedge/circuit breakers e da idempotência das chamadas Newcon, além
+    dos desvios da simulação local verificados contra o cnsSimulador.
+    """
+    return ok({
+        "limiter": newcon_limiter.get_stats(),
+        "singleflight": newcon_singleflight.get_stats(),
+        "resilience": newcon_resilience.get_stats(),
+        "idempotency": idempotency_store.get_stats(),
+        "simulation": simulation_engine.get_stats()
+    })
+
+@router.get('/cache/warmer', response_model=Envelope, summary="Progresso do warmer do catálogo")
+async def warmer_stats():
+    """
+    Retorna o progresso do aquecimento do catálogo e o último refresh por família de chaves.
+    """
+    return ok(catalog_warmer.get_stats())
+
 @router.delete('/cache/clear', response_model=Envelope, summary="Limpar todo o cache Redis")
 async def clear_cache():
     """
-    Limpa completamente o cache Redis.
-    
-    ⚠️ ATENÇÃO: Esta operação remove TODOS os dados do cache Redis!
+    Limpa todas as chaves de cache do Redis (namespaces do índice de chaves).
+
+    ⚠️ ATENÇÃO: Esta operação remove TODO o cache do catálogo!
+    Registros de idempotência e leases no mesmo banco são preservados.
     Use com cuidado em produção.
     """
     try:
@@ -38,14 +71,26 @@ async def clear_cache():
         if not redis_client.connected:
             await redis_client.connect()
         
+        if (not redis_client.connected or not redis_client.client) and disk_cache.enabled:
+            # Sem Redis: limpa o cache em disco compartilhado pelos workers
+            keys_before = (await disk_cache.get_stats())["entries"]
+            await disk_cache.clear()
+            memory_cache.invalidate_all()
+            return ok({
+                "message": "Cache em disco limpo com sucesso",
+                "keys_before": keys_before,
+                "keys_after": 0,
+                "keys_removed": keys_before
+            })
+
         if not redis_client.connected or not redis_client.client:
             raise HTTPException(status_code=500, detail="Erro ao conectar com Redis")
         
         # Contar chaves antes da limpeza
         keys_before = await redis_client.client.dbsize()
         
-        # Limpar todo o banco de dados
-        await redis_client.client.flushdb()
+        # Remove só as chaves de cache (sem FLUSHDB) e descarta o L1 de todos os workers
+        removed = await hybrid_cache.clear()
         
         # Verificar se foi limpo
         keys_after = await redis_client.client.dbsize()
@@ -54,7 +99,7 @@ async def clear_cache():
             "message": "Cache Redis limpo com sucesso",
             "keys_before": keys_before,
             "keys_after": keys_after,
-            "keys_removed": keys_before - keys_after
+            "keys_removed": removed
         })
         
     except Exception as e:
@@ -70,18 +115,28 @@ async def cache_stats():
         if not redis_client.connected:
             await redis_client.connect()
         
+        if (not redis_client.connected or not redis_client.client) and disk_cache.enabled:
+            # Sem Redis: contagens do cache em disco
+            keys_by_namespace = await hybrid_cache.namespace_counts()
+            return ok({
+                "total_keys": sum(keys_by_namespace.values()),
+                "keys_by_type": keys_by_namespace,
+                "redis_info": None,
+                "disk_cache": await disk_cache.get_stats(),
+                "memory_cache": memory_cache.get_stats(),
+                "tiers": hybrid_cache.get_stats(),
+                "namespaces": hybrid_cache.namespace_stats()
+            })
+
         if not redis_client.connected or not redis_client.client:
             raise HTTPException(status_code=500, detail="Erro ao conectar com Redis")
         
         # Obter estatísticas
         total_keys = await redis_client.client.dbsize()
         
-        # Contar chaves por padrão
-        bens_keys_list = await redis_client.client.keys("bens:*")
-        cache_keys_list = await redis_client.client.keys("*cache*")
-        bens_keys = len(bens_keys_list)
-        cache_keys = len(cache_keys_list)
-        other_keys = total_keys - bens_keys - cache_keys
+        # Contar chaves por namespace (índice mantido na gravação, sem KEYS)
+        keys_by_namespace = await hybrid_cache.namespace_counts()
+        other_keys = total_keys - sum(keys_by_namespace.values())
         
         # Obter informações do servidor
         info = await redis_client.client.info()
@@ -89,47 +144,76 @@ async def cache_stats():
         return ok({
             "total_keys": total_keys,
             "keys_by_type": {
-                "bens": bens_keys,
-                "cache": cache_keys,
+                **keys_by_namespace,
+                # Índices, leases e chaves gravadas fora do HybridCache
                 "other": other_keys
             },
             "redis_info": {
                 "version": info.get("redis_version", "N/A"),
                 "uptime_seconds": info.get("uptime_in_seconds", 0),
                 "used_memory_human": info.get("used_memory_human", "N/A"),
-                "connected_clients": info.get("connected_clients", 0)
-            }
+                "connected_clients": info.get("connected_clients", 0),
+                # Evições do L2 (o Redis não informa por namespace)
+                "evicted_keys": info.get("evicted_keys", 0)
+            },
+            "memory_cache": memory_cache.get_stats(),
+            "tiers": hybrid_cache.get_stats(),
+            "namespaces": hybrid_cache.namespace_stats()
         })
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao obter estatísticas: {str(e)}")
 
+@router.get('/metrics', response_class=PlainTextResponse, summary="Métricas do cache (Prometheus)")
+async def metrics():
+    """
+    Acertos, faltas, valores vencidos servidos, latências, bytes e evições do cache
+    por namespace e nível, no formato texto do Prometheus.
+    """
+    return PlainTextResponse(hybrid_cache.prometheus(), media_type="text/plain; version=0.0.4")
+
 @router.delete('/cache/bens', response_model=Envelope, summary="Limpar apenas cache de bens")
-async def clear_bens_cache():
+async def clear_bens_cache(Codigo_Tipo_Grupo: Optional[str] = None):
     """
-    Limpa apenas o cache de bens disponíveis.
+    Limpa o cache de bens disponíveis (todo ou só de um tipo de grupo).
     """
     try:
-        # Garantir que o Redis está conectado
-        if not redis_client.connected:
-            await redis_client.connect()
-        
-        if not redis_client.connected or not redis_client.client:
-            raise HTTPException(status_code=500, detail="Erro ao conectar com Redis")
-        
-        # Encontrar todas as chaves de bens
-        bens_keys = await redis_client.client.keys("bens:*")
-        
-        # Deletar chaves de bens
-        deleted_count = 0
-        if bens_keys:
-            deleted_count = await redis_client.client.delete(*bens_keys)
-        
+        prefix = "bens_disponiveis" if not Codigo_Tipo_Grupo else f"bens_disponiveis:{Codigo_Tipo_Grupo}"
+        deleted_count = await hybrid_cache.delete_prefix(prefix)
+
+        # Chaves "bens:*" gravadas pelo test_sales_flow.py (fora do índice): SCAN em lotes
+        legacy_count = 0
+        if redis_client.connected and redis_client.client:
+            match = "bens:*" if not Codigo_Tipo_Grupo else f"bens:{Codigo_Tipo_Grupo}:*"
+            lote = []
+            async for key in redis_client.client.scan_iter(match=match, count=500):
+                lote.append(key)
+                if len(lote) >= 500:
+                    legacy_count += await redis_client.delete_many(lote)
+                    lote = []
+            legacy_count += await redis_client.delete_many(lote)
+
         return ok({
             "message": "Cache de bens limpo com sucesso",
-            "keys_deleted": deleted_count,
-            "keys_found": len(bens_keys)
+            "prefix": prefix,
+            "keys_deleted": deleted_count + legacy_count
         })
-        
+
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao limpar cache de bens: {str(e)}")
+
+@router.delete('/cache/namespace/{prefix}', response_model=Envelope, summary="Limpar um namespace do cache")
+async def clear_namespace(prefix: str):
+    """
+    Remove todas as chaves de um namespace ou prefixo (ex.: `tipos_vendas`, `bens_disponiveis:IM`).
+    """
+    deleted_count = await hybrid_cache.delete_prefix(prefix)
+    return ok({"prefix": prefix, "keys_deleted": deleted_count})
+
+@router.delete('/cache/tag/{tag}', response_model=Envelope, summary="Limpar chaves de uma tag")
+async def clear_tag(tag: str):
+    """
+    Remove todas as chaves marcadas com a tag (ex.: `grupo:IM` = tipos de venda e bens do grupo IM).
+    """
+    deleted_count = await hybrid_cache.delete_tag(tag)
+    return ok({"tag": tag, "keys_deleted": deleted_count})
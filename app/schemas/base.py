@@ -1,5 +1,12 @@
+import json
 from typing import Any
 from pydantic import BaseModel
+from app.infrastructure.cache.columnar import materialize
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 class ErrorOut(BaseModel):
     code: str
@@ -11,7 +18,19 @@ class Envelope(BaseModel):
     error: ErrorOut | None = None
 
 def ok(data: Any) -> Envelope:
-    return Envelope(ok=True, data=data)
+    # DataSets compactos do cache voltam a ser listas de dicts só aqui
+    return Envelope(ok=True, data=materialize(data))
+
+def ok_json(data: Any) -> bytes:
+    """JSON de ok(data) pronto para a resposta, sem validar/serializar pelo Envelope.
+
+    Usado com bytes guardados no cache (ver newcon_cache.cached_response); a
+    rota continua declarando response_model=Envelope para o OpenAPI.
+    """
+    envelope = {"ok": True, "data": materialize(data), "error": None}
+    if orjson is not None:
+        return orjson.dumps(envelope, default=str)
+    return json.dumps(envelope, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=str).encode()
 
 def fail(code: str, message: str) -> Envelope:
     return Envelope(ok=False, error=ErrorOut(code=code, message=message))
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Benchmark - Codec dos valores do Redis: serializador x compressão
+Mede encode/decode e bytes gravados para payloads do catálogo (DataSet de bens
+em dicts e em formato colunar, como o HybridCache grava) e confere o round trip.
+
+Uso: python -m benchmarks.bench_codec
+"""
+
+import timeit
+
+from app.infrastructure.cache import codec as codec_module
+from app.infrastructure.cache.codec import Codec
+from app.infrastructure.cache.columnar import compact_dataset, materialize, revive_dataset
+from benchmarks.payloads import bens_items
+
+def payloads() -> dict:
+    cases = {}
+    for rows in (50, 1_000, 10_000):
+        data = {"items": bens_items(rows)}
+        cases[f"bens {rows} dicts"] = data
+        if rows >= 200:
+            cases[f"bens {rows} colunar"] = compact_dataset(data, 200)
+    return cases
+
+def combos() -> list:
+    out = []
+    for serializer in ("json", "orjson", "msgpack"):
+        for compression in ("none", "zlib", "zstd"):
+            if codec_module._available(serializer) and codec_module._available(compression):
+                out.append((serializer, compression))
+    return out
+
+def main():
+    print(f"{'payload':>20} {'codec':>16} {'bytes':>10} {'encode (ms)':>12} {'decode (ms)':>12}")
+    for name, value in payloads().items():
+        expected = materialize(value)
+        for serializer, compression in combos():
+            codec = Codec()
+            codec.serializer, codec.compression = serializer, compression
+            blob = codec.encode(value)
+            assert materialize(revive_dataset(codec.decode(blob))) == expected, (name, serializer, compression)
+            number = max(3, 2_000 // max(1, len(value["items"]) // 10))
+            t_enc = timeit.timeit(lambda: codec.encode(value), number=number) / number
+            t_dec = timeit.timeit(lambda: codec.decode(blob), number=number) / number
+            print(f"{name:>20} {serializer + '+' + compression:>16} {len(blob):>10} "
+                  f"{t_enc * 1e3:>12.3f} {t_dec * 1e3:>12.3f}")
+        print()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Benchmark - Montagem do envelope SOAP: templates pré-compilados vs ElementTree
+Também confere que ambos produzem exatamente os mesmos bytes.
+
+Uso: python -m benchmarks.bench_envelope
+"""
+
+import timeit
+
+from app.infrastructure.soap_envelope import build_envelope_etree, soap_envelope
+
+CASES = {
+    "cnsTiposGrupos": {},
+    "cnsBensDisponiveis": {"Codigo_Filial": "001", "Codigo_Tipo_Grupo": "IM", "Codigo_Tipo_Venda": "3"},
+    "cnsPrazosDisponiveis": {
+        "Codigo_Unidade": 1, "Codigo_Tipo_Grupo": "IM", "Codigo_Tipo_Venda": "3", "Codigo_Bem": 1234,
+        "Codigo_Representante": 1, "Situacao_Grupo": "A", "Pessoa": "F", "Ordem_Pesquisa": "P",
+        "Codigo_Filial": 1, "Prazo": 0, "Dia_Vencimento": 0, "Data_Assembleia": "2026-10-18",
+        "Codigo_Grupo": 0, "SN_Rateia": "S",
+    },
+    "prcManutencaoCliente_new": {
+        "Codigo_Cliente": None, "Nome": "João & Maria <Ltda>", "Documento": "12345678900",
+        "Email": "", "Telefone": None,
+    },
+}
+
+def main():
+    number = 20_000
+    print(f"{'método':>26} {'etree (µs)':>11} {'template (µs)':>14} {'ganho':>7}")
+    for method, params in CASES.items():
+        assert soap_envelope(method, params) == build_envelope_etree(method, params), method
+        t_etree = timeit.timeit(lambda: build_envelope_etree(method, params), number=number) / number
+        t_tpl = timeit.timeit(lambda: soap_envelope(method, params), number=number) / number
+        print(f"{method:>26} {t_etree * 1e6:>11.2f} {t_tpl * 1e6:>14.2f} {t_etree / t_tpl:>6.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Benchmark - Parse de DataSet Newcon: iterparse (stream) vs xmltodict
+Compara tempo de parse e pico de memória para 1k, 10k e 100k linhas.
+
+Uso: python -m benchmarks.bench_parse
+"""
+
+import gc
+import time
+import tracemalloc
+
+from app.infrastructure.newcon_client import NewconClient
+from benchmarks.payloads import soap_dataset_response
+
+SIZES = (1_000, 10_000, 100_000)
+
+def measure(fn, xml: str):
+    """Retorna (segundos, pico de memória em bytes, resultado)"""
+    gc.collect()
+    start = time.perf_counter()
+    result = fn(xml)
+    elapsed = time.perf_counter() - start
+
+    gc.collect()
+    tracemalloc.start()
+    fn(xml)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, result
+
+def main():
+    nc = NewconClient()
+    parsers = {
+        "stream": lambda xml: (setattr(nc, "parser", "stream"), nc._parse("cnsBensDisponiveis", xml))[1],
+        "xmltodict": lambda xml: (setattr(nc, "parser", "xmltodict"), nc._parse("cnsBensDisponiveis", xml))[1],
+    }
+
+    print(f"{'linhas':>8} {'parser':>10} {'tempo (ms)':>12} {'pico (MB)':>10}")
+    for rows in SIZES:
+        xml = soap_dataset_response("cnsBensDisponiveis", rows)
+        results = {}
+        for name, fn in parsers.items():
+            elapsed, peak, results[name] = measure(fn, xml)
+            print(f"{rows:>8} {name:>10} {elapsed * 1000:>12.1f} {peak / 1e6:>10.1f}")
+        assert results["stream"] == results["xmltodict"], "saídas divergentes entre parsers"
+
+if __name__ == "__main__":
+    main()
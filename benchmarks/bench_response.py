@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Benchmark - Resposta de um acerto de cache em /catalog/cnsBensDisponiveis
+Antes: ok(data) validado e serializado pelo FastAPI via response_model=Envelope.
+Depois: bytes do envelope guardados junto da entrada do L1 (cached_response).
+Mede CPU por acerto e confere que os dois caminhos geram o mesmo JSON.
+
+Uso: python -m benchmarks.bench_response
+"""
+
+import asyncio
+import json
+import time
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, Response
+from fastapi.routing import serialize_response
+
+from app.infrastructure.cache import hybrid_cache
+from app.infrastructure.newcon_cache import CACHE_POLICIES, cached_response, bens_params
+from app.infrastructure.value_index import with_value_index, without_value_index
+from app.routers.catalog import bens_sem_busca
+from app.schemas.base import ok, Envelope
+from benchmarks.payloads import bens_items
+
+app = FastAPI()
+
+@app.get("/antes", response_model=Envelope)
+async def antes():
+    pass
+
+FIELD = next(r for r in app.routes if getattr(r, "path", None) == "/antes").response_field
+
+async def hit_antes(key: str) -> bytes:
+    """Caminho anterior: dados do cache + validação/serialização do Envelope"""
+    data = await hybrid_cache.get(key)
+    content = await serialize_response(field=FIELD, response_content=ok(without_value_index(data)))
+    return JSONResponse(content).body
+
+async def hit_depois(params: dict) -> bytes:
+    # Nunca chamado em acerto; garante que o benchmark não vai ao Newcon
+    class SemNewcon:
+        async def call(self, method, params):
+            raise RuntimeError("cache miss inesperado")
+
+    response: Response = await cached_response(SemNewcon(), "cnsBensDisponiveis", params, view="bens",
+                                               transform=bens_sem_busca)
+    return response.body
+
+async def cpu_per_call(fn, number: int) -> float:
+    started = time.process_time()
+    for _ in range(number):
+        await fn()
+    return (time.process_time() - started) / number
+
+async def main():
+    policy = CACHE_POLICIES["cnsBensDisponiveis"]
+    print(f"{'linhas':>8} {'antes (ms)':>11} {'depois (ms)':>12} {'ganho':>8} {'bytes':>10}")
+    for rows in (1_000, 10_000, 50_000):
+        params = bens_params("IM", str(rows))
+        key = policy.key(params)
+        await hybrid_cache.set(key, with_value_index({"items": bens_items(rows)}), policy.ttl_seconds)
+        # Primeiro acerto gera e guarda os bytes
+        body = await hit_depois(params)
+        assert json.loads(body) == json.loads(await hit_antes(key)), rows
+        number = max(5, 200_000 // rows)
+        t_antes = await cpu_per_call(lambda: hit_antes(key), number)
+        t_depois = await cpu_per_call(lambda: hit_depois(params), number)
+        print(f"{rows:>8} {t_antes * 1e3:>11.3f} {t_depois * 1e3:>12.3f} {t_antes / t_depois:>7.0f}x {len(body):>10}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,47 @@
+"""
+Payloads sintéticos no formato do wsRegVenda para os benchmarks
+"""
+
+from xml.sax.saxutils import escape
+
+SCHEMA = (
+    '<xs:schema id="NewDataSet" xmlns="" xmlns:xs="http://www.w3.org/2001/XMLSchema" '
+    'xmlns:msdata="urn:schemas-microsoft-com:xml-msdata">'
+    '<xs:element name="NewDataSet" msdata:IsDataSet="true"><xs:complexType>'
+    '<xs:choice minOccurs="0" maxOccurs="unbounded"><xs:element name="Table"><xs:complexType><xs:sequence>'
+    + "".join(f'<xs:element name="{c}" type="xs:string" minOccurs="0" />' for c in
+              ("Codigo_Bem", "Descricao", "Valor_Bem", "Codigo_Tipo_Grupo", "Codigo_Tipo_Venda", "Situacao"))
+    + '</xs:sequence></xs:complexType></xs:element></xs:choice></xs:complexType></xs:element></xs:schema>'
+)
+
+def bens_row(i: int) -> dict:
+    """Linha representativa de cnsBensDisponiveis"""
+    return {
+        "Codigo_Bem": str(1000 + i),
+        "Descricao": f"CRÉDITO IMÓVEL {i} & CIA",
+        "Valor_Bem": f"{50000 + (i * 137) % 450000:.2f}",
+        "Codigo_Tipo_Grupo": "IM",
+        "Codigo_Tipo_Venda": str(i % 40),
+        "Situacao": "A",
+    }
+
+def bens_items(rows: int) -> list:
+    return [bens_row(i) for i in range(rows)]
+
+def soap_dataset_response(method: str, rows: int) -> str:
+    """Resposta SOAP com DataSet (schema inline + diffgram) contendo `rows` linhas"""
+    parts = [
+        '<?xml version="1.0" encoding="utf-8"?>'
+        '<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/" '
+        'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xmlns:xsd="http://www.w3.org/2001/XMLSchema">'
+        f'<soap:Body><{method}Response xmlns="http://www.cnpm.com.br/"><{method}Result>',
+        SCHEMA,
+        '<diffgr:diffgram xmlns:msdata="urn:schemas-microsoft-com:xml-msdata" '
+        'xmlns:diffgr="urn:schemas-microsoft-com:xml-diffgram-v1"><NewDataSet xmlns="">',
+    ]
+    for i in range(rows):
+        row = bens_row(i)
+        cols = "".join(f"<{k}>{escape(v)}</{k}>" for k, v in row.items())
+        parts.append(f'<Table diffgr:id="Table{i + 1}" msdata:rowOrder="{i}">{cols}</Table>')
+    parts.append(f'</NewDataSet></diffgr:diffgram></{method}Result></{method}Response></soap:Body></soap:Envelope>')
+    return "".join(parts)
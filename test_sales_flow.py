@@ -53,16 +53,12 @@ async def cache_bens_result(codigo_tipo_grupo, codigo_tipo_venda, bens_data):
     else:
         print(f"   ⚠️ Não cacheado (sem bens válidos)")
 
-async def get_cached_bens(codigo_tipo_grupo, codigo_tipo_venda):
-    """Recupera bens do cache Redis"""
+async def get_cached_bens_many(codigo_tipo_grupo, codigos_tipo_venda):
+    """Recupera bens de vários tipos de venda do cache Redis em uma única ida (MGET)"""
     if not redis_client.connected:
-        return None
-    cache_key = f"bens:{codigo_tipo_grupo}:{codigo_tipo_venda}"
-    cached_data = await redis_client.get(cache_key)
-    if cached_data:
-        print(f"   📦 Cache HIT: {len(cached_data.get('bens', []))} bens")
-        return cached_data.get('bens', [])
-    return None
+        return [None] * len(codigos_tipo_venda)
+    cache_keys = [f"bens:{codigo_tipo_grupo}:{codigo}" for codigo in codigos_tipo_venda]
+    return await redis_client.get_many(cache_keys)
 
 def make_request(endpoint, params=None):
     """Faz uma requisição para a API"""
@@ -90,12 +86,15 @@ async def test_bens_batch(session, codigo_tipo_grupo, tipos_vendas_batch):
     """Testa um lote de tipos de vendas em paralelo"""
     tasks = []
     
-    for tipo_venda in tipos_vendas_batch:
+    # Verificar cache primeiro (todas as vendas do lote de uma vez)
+    cached_batch = await get_cached_bens_many(
+        codigo_tipo_grupo, [tipo_venda.get("CODIGO_TIPO_VENDA") for tipo_venda in tipos_vendas_batch]
+    )
+    
+    for tipo_venda, cached_data in zip(tipos_vendas_batch, cached_batch):
         codigo_tipo_venda = tipo_venda.get("CODIGO_TIPO_VENDA")
         descricao_venda = tipo_venda.get("DESCRICAO")
         
-        # Verificar cache primeiro
-        cached_data = await get_cached_bens(codigo_tipo_grupo, codigo_tipo_venda)
         if cached_data:
             print(f"📋 Venda {codigo_tipo_venda} ({descricao_venda}) - 💾 Cache: {cached_data['quantidade_bens']} bens")
             tasks.append({
@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.infrastructure.cache.redis_client import redis_client
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """redis_client apontando para um fakeredis compartilhado (um servidor por teste)"""
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeAsyncRedis(server=fakeredis.FakeServer(), decode_responses=False)
+    monkeypatch.setattr(redis_client, "client", client)
+    monkeypatch.setattr(redis_client, "connected", True)
+    monkeypatch.setattr(redis_client, "configured", True)
+
+    # Sem lupa o fakeredis não executa Lua: compare-and-delete equivalente ao script
+    async def release_lock(key: str, token: str) -> bool:
+        if await client.get(key) == token.encode():
+            return bool(await client.delete(key))
+        return False
+
+    monkeypatch.setattr(redis_client, "release_lock", release_lock)
+    return redis_client
@@ -0,0 +1,47 @@
+import asyncio
+
+from app.infrastructure.cache.memory_cache import memory_cache
+from app.infrastructure.catalog_warmer import CatalogWarmer
+
+class FakeNewcon:
+    def __init__(self):
+        self.calls = []
+
+    async def call(self, method: str, params: dict, idempotency_key=None):
+        self.calls.append(method)
+        if method == "cnsTiposGrupos":
+            return {"items": [{"CODIGO_TIPO_GRUPO": "IM"}]}
+        if method == "cnsTiposVendas":
+            return {"items": [{"CODIGO_TIPO_VENDA": "1"}]}
+        return {"items": [{"Valor_Bem": 1000.0}]}
+
+def _warmer(interval: float, jitter: float) -> CatalogWarmer:
+    warmer = CatalogWarmer()
+    warmer.interval = interval
+    warmer.jitter = jitter
+    warmer.lease_seconds = max(1.0, interval - jitter) * 0.9
+    warmer.request_jitter = 0
+    return warmer
+
+def test_same_worker_runs_back_to_back_cycles(fake_redis):
+    memory_cache.clear()
+    warmer, other = _warmer(2, 0.5), _warmer(2, 0.5)
+    nc = FakeNewcon()
+
+    async def main():
+        first = await warmer.run_once(nc)
+        # Outro worker no mesmo intervalo pula o ciclo
+        skipped = await other.run_once(nc)
+        # Próximo ciclo no menor intervalo possível (intervalo - jitter)
+        await asyncio.sleep(warmer.interval - warmer.jitter)
+        second = await warmer.run_once(nc)
+        return first, skipped, second
+
+    assert asyncio.run(main()) == (True, False, True)
+    assert warmer.cycles == 2
+    assert nc.calls.count("cnsBensDisponiveis") == 2
+    memory_cache.clear()
+
+def test_lease_shorter_than_minimum_interval():
+    warmer = CatalogWarmer()
+    assert warmer.lease_seconds < warmer.interval - warmer.jitter
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+from app.infrastructure import concurrency_limiter
+from app.infrastructure.concurrency_limiter import AdaptiveLimiter, UpstreamOverloaded
+
+def _limiter(limit: int = 1) -> AdaptiveLimiter:
+    limiter = AdaptiveLimiter()
+    limiter.limit = limit
+    limiter.min_limit = 1
+    limiter.reserved_writes = 0
+    limiter.queue_timeout = 0.05
+    return limiter
+
+def _granted_then(limiter: AdaptiveLimiter, error: BaseException):
+    """wait_for que concede a vaga ao waiter e em seguida estoura (corrida timeout × _wake)"""
+    async def wait_for(waiter, timeout):
+        limiter.inflight -= 1
+        limiter._wake()
+        assert waiter.done()
+        raise error
+    return wait_for
+
+@pytest.mark.parametrize("error, expected", [(asyncio.TimeoutError(), UpstreamOverloaded),
+                                             (asyncio.CancelledError(), asyncio.CancelledError)])
+def test_slot_granted_during_timeout_or_cancel_is_returned(monkeypatch, error, expected):
+    limiter = _limiter()
+
+    async def main():
+        await limiter.acquire("read")
+        monkeypatch.setattr(concurrency_limiter.asyncio, "wait_for", _granted_then(limiter, error))
+        with pytest.raises(expected):
+            await limiter.acquire("read")
+
+    asyncio.run(main())
+    assert limiter.inflight == 0
+    assert limiter.queue_depth == 0
+
+def test_timeout_without_grant_leaves_capacity_intact():
+    limiter = _limiter()
+
+    async def main():
+        await limiter.acquire("read")
+        with pytest.raises(UpstreamOverloaded) as exc:
+            await limiter.acquire("read")
+        assert exc.value.status_code == 503
+        limiter.release(0.0)
+
+    asyncio.run(main())
+    assert limiter.inflight == 0
+    assert limiter.queue_depth == 0
+    assert limiter.stats["rejected_timeout"] == 1
+
+def test_queued_writes_are_served_before_reads():
+    limiter = _limiter()
+    limiter.queue_timeout = 1
+    order = []
+
+    async def take(priority: str):
+        await limiter.acquire(priority)
+        order.append(priority)
+
+    async def main():
+        await limiter.acquire("write")
+        read = asyncio.create_task(take("read"))
+        await asyncio.sleep(0)
+        write = asyncio.create_task(take("write"))
+        await asyncio.sleep(0)
+        limiter.release(0.0)
+        await write
+        limiter.release(0.0)
+        await read
+        limiter.release(0.0)
+
+    asyncio.run(main())
+    assert order == ["write", "read"]
+    assert limiter.inflight == 0
@@ -0,0 +1,98 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from app.infrastructure.cache.disk_cache import DiskCache
+
+@pytest.fixture
+def make_disk(tmp_path, monkeypatch):
+    """DiskCache no diretório temporário; várias instâncias simulam workers do mesmo host"""
+    monkeypatch.setenv("CACHE_DISK_DIR", str(tmp_path))
+    created = []
+
+    def make(max_bytes: int = 10_000_000) -> DiskCache:
+        disk = DiskCache()
+        disk.max_bytes = max_bytes
+        created.append(disk)
+        return disk
+
+    yield make
+    for disk in created:
+        asyncio.run(disk.close())
+
+def _real_total(disk: DiskCache) -> int:
+    with sqlite3.connect(disk.path) as conn:
+        return conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+def _stored_total(disk: DiskCache) -> int:
+    return disk._run(disk._total)
+
+def test_running_total_follows_writes_replaces_and_deletes(make_disk):
+    disk = make_disk()
+
+    async def main():
+        await disk.set_many({f"bens:{i}": {"items": list(range(i))} for i in range(20)}, 60)
+        assert _stored_total(disk) == _real_total(disk)
+        # Regravação troca o tamanho (INSERT OR REPLACE)
+        await disk.set_many({"bens:3": {"items": list(range(500))}}, 60)
+        assert _stored_total(disk) == _real_total(disk)
+        await disk.delete_many(["bens:1", "bens:2"])
+        assert _stored_total(disk) == _real_total(disk)
+        await disk.set_many({"bens:old": {"items": [1]}}, 0)
+        await disk.purge_expired()
+        assert _stored_total(disk) == _real_total(disk)
+        await disk.clear()
+        assert _stored_total(disk) == 0
+
+    asyncio.run(main())
+
+def test_total_is_shared_between_workers(make_disk):
+    a, b = make_disk(), make_disk()
+
+    async def main():
+        await a.set_many({"k:a": {"items": [1, 2, 3]}}, 60)
+        await b.set_many({"k:b": {"items": [4, 5, 6]}}, 60)
+        await a.delete_many(["k:b"])
+
+    asyncio.run(main())
+    assert _stored_total(a) == _stored_total(b) == _real_total(a)
+
+def test_write_path_does_not_scan_entries(make_disk):
+    disk = make_disk()
+    statements = []
+
+    async def main():
+        await disk.set_many({"k:1": {"items": [1]}}, 60)
+        disk._conn.set_trace_callback(statements.append)
+        await disk.set_many({f"k:{i}": {"items": [i]} for i in range(50)}, 60)
+
+    asyncio.run(main())
+    assert not [s for s in statements if "SUM(" in s.upper()]
+
+def test_eviction_removes_soonest_expiring_first(make_disk):
+    disk = make_disk(max_bytes=2_000)
+    payload = {"items": ["x" * 300]}
+
+    async def main():
+        for i in range(10):
+            # Vence mais cedo quanto menor o i
+            await disk.set_many({f"k:{i}": payload}, 60 + i)
+        return await disk.get_many([f"k:{i}" for i in range(10)])
+
+    values = asyncio.run(main())
+    kept = [i for i, v in enumerate(values) if v is not None]
+    assert kept and kept == list(range(10 - len(kept), 10))
+    assert _stored_total(disk) == _real_total(disk) <= 2_000
+    assert disk.stats["evictions"] == 10 - len(kept)
+
+def test_existing_database_is_backfilled_once(make_disk):
+    disk = make_disk()
+    asyncio.run(disk.set_many({"k:1": {"items": [1, 2]}}, 60))
+    expected = _real_total(disk)
+    # Banco de uma versão anterior: sem a tabela de totais nem os triggers
+    with sqlite3.connect(disk.path) as conn:
+        conn.executescript("DROP TRIGGER entries_insert; DROP TRIGGER entries_delete; DROP TRIGGER entries_update;"
+                           "DROP TABLE totals;")
+    fresh = make_disk()
+    assert _stored_total(fresh) == expected
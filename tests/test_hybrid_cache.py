@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+from app.infrastructure.cache import hybrid_cache
+from app.infrastructure.cache.hybrid_cache import _KeyLocks
+from app.infrastructure.cache.memory_cache import memory_cache
+from app.infrastructure.cache.redis_client import redis_client
+
+@pytest.fixture(autouse=True)
+def _clean_l1():
+    memory_cache.clear()
+    yield
+    memory_cache.clear()
+
+def _slow_fetch(calls: list, value, delay: float = 0.05):
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return value
+    return fetch
+
+def test_key_lock_survives_release_while_waiters_are_queued():
+    locks = _KeyLocks()
+    seen = []
+
+    async def holder(delay: float):
+        with locks.use("k") as lock:
+            seen.append(lock)
+            async with lock:
+                await asyncio.sleep(delay)
+
+    async def main():
+        first = asyncio.create_task(holder(0.01))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(holder(0.01))
+        await first
+        # O primeiro liberou, o segundo ainda está na fila: quem chega agora usa o mesmo lock
+        assert not second.done()
+        assert len(locks) == 1
+        await holder(0)
+        await second
+
+    asyncio.run(main())
+    assert seen[0] is seen[1] is seen[2]
+    assert len(locks) == 0
+
+@pytest.mark.parametrize("shared", [False, True])
+def test_single_recompute_for_waves_of_callers(shared, request):
+    if shared:
+        request.getfixturevalue("fake_redis")
+    calls = []
+    fetch = _slow_fetch(calls, {"items": [1]})
+
+    async def main():
+        tasks = []
+        # Chamadores chegando durante todo o recálculo, inclusive logo depois dele
+        for _ in range(10):
+            tasks += [asyncio.create_task(hybrid_cache.get_or_set("stampede:k", fetch, 60)) for _ in range(5)]
+            await asyncio.sleep(0.008)
+        return await asyncio.gather(*tasks)
+
+    results = asyncio.run(main())
+    assert calls == [1]
+    assert all(r == {"items": [1]} for r in results)
+
+@pytest.mark.parametrize("cache", [memory_cache, redis_client])
+def test_standalone_get_or_set_delegates(cache, fake_redis):
+    calls = []
+    fetch = _slow_fetch(calls, {"items": [2]})
+
+    async def main():
+        return await asyncio.gather(*(cache.get_or_set("standalone:k", fetch, 60) for _ in range(10)))
+
+    assert all(r == {"items": [2]} for r in asyncio.run(main()))
+    assert calls == [1]
+
+def test_stale_value_served_when_fetch_fails():
+    async def boom():
+        raise RuntimeError("upstream")
+
+    async def main():
+        await hybrid_cache.set("stale:k", {"items": [3]}, ttl_seconds=0)
+        return await hybrid_cache.get_or_set("stale:k", boom, 60)
+
+    assert asyncio.run(main()) == {"items": [3]}
+
+def test_early_refresh_runs_in_background(monkeypatch):
+    monkeypatch.setattr(hybrid_cache, "xfetch_beta", 1e9)
+    calls = []
+
+    async def main():
+        await hybrid_cache.set("xfetch:k", {"items": ["old"]}, ttl_seconds=60, delta=1.0)
+        before = hybrid_cache.stampede["early_refreshes"]
+        value = await hybrid_cache.get_or_set("xfetch:k", _slow_fetch(calls, {"items": ["new"]}, 0.01), 60)
+        await asyncio.sleep(0.05)
+        return value, hybrid_cache.stampede["early_refreshes"] - before, await hybrid_cache.get("xfetch:k")
+
+    value, refreshes, after = asyncio.run(main())
+    assert value == {"items": ["old"]}
+    assert refreshes == 1
+    assert calls == [1]
+    assert after == {"items": ["new"]}
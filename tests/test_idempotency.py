@@ -0,0 +1,147 @@
+import asyncio
+
+import pytest
+import redis.asyncio as redis
+
+from app.infrastructure.cache import hybrid_cache
+from app.infrastructure.cache.redis_client import redis_client
+from app.infrastructure.idempotency import (IdempotencyError, IdempotencyStore, _MemoryBackend, _RedisBackend,
+                                            _hash, upstream_budget_seconds)
+
+def _store(backend=None, lease_ms: int = 100) -> IdempotencyStore:
+    store = IdempotencyStore()
+    store.backend = backend or _MemoryBackend()
+    store.lease_ms = lease_ms
+    store.poll_ms = 5
+    store.wait_seconds = 5
+    return store
+
+def _counting(delay: float, calls: list):
+    async def func():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return {"proposta": len(calls)}
+    return func
+
+def test_default_lease_covers_upstream_retries():
+    store = IdempotencyStore()
+    assert store.lease_ms / 1000 > upstream_budget_seconds()
+    assert store.wait_seconds >= upstream_budget_seconds()
+
+@pytest.mark.parametrize("backend", ["memory", "redis"])
+def test_concurrent_duplicates_execute_once(backend, request):
+    if backend == "redis":
+        request.getfixturevalue("fake_redis")
+    store = _store(_RedisBackend() if backend == "redis" else None)
+    calls = []
+
+    async def main():
+        func = _counting(0.05, calls)
+        return await asyncio.gather(*(store.run("prcIncluiProposta", "k1", {"a": 1}, func) for _ in range(5)))
+
+    results = asyncio.run(main())
+    assert calls == [1]
+    assert all(r == {"proposta": 1} for r in results)
+
+@pytest.mark.parametrize("backend", ["memory", "redis"])
+def test_lease_renewed_while_operation_runs(backend, request):
+    if backend == "redis":
+        request.getfixturevalue("fake_redis")
+    # A operação dura 6 leases: sem renovação a duplicata assumiria a chave
+    store = _store(_RedisBackend() if backend == "redis" else None, lease_ms=50)
+    calls = []
+
+    async def main():
+        func = _counting(0.3, calls)
+        first = asyncio.create_task(store.run("prcIncluiProposta", "k2", {"a": 1}, func))
+        await asyncio.sleep(0.2)
+        second = await store.run("prcIncluiProposta", "k2", {"a": 1}, func)
+        return await first, second
+
+    first, second = asyncio.run(main())
+    assert calls == [1]
+    assert first == second == {"proposta": 1}
+    assert store.stats["renewed"] >= 3
+    assert store.stats["lease_lost"] == 0
+
+def test_payload_mismatch_and_release_on_failure():
+    store = _store()
+
+    async def boom():
+        raise RuntimeError("upstream")
+
+    async def main():
+        with pytest.raises(RuntimeError):
+            await store.run("r", "k", {"a": 1}, boom)
+        # Falhou: a chave foi liberada e a nova tentativa executa
+        assert await store.run("r", "k", {"a": 1}, _counting(0, [])) == {"proposta": 1}
+        with pytest.raises(IdempotencyError) as exc:
+            await store.run("r", "k", {"a": 2}, _counting(0, []))
+        assert exc.value.status_code == 422
+
+    asyncio.run(main())
+
+def test_redis_connection_error_falls_back_to_memory(fake_redis, monkeypatch):
+    store = _store(_RedisBackend())
+
+    async def down(*args, **kwargs):
+        raise redis.ConnectionError("connection refused")
+
+    monkeypatch.setattr(fake_redis.client, "set", down)
+    result = asyncio.run(store.run("r", "k", {"a": 1}, _counting(0, [])))
+    assert result == {"proposta": 1}
+    assert store.stats["fallbacks"] == 1
+    assert not redis_client.connected
+
+def test_backend_data_error_returns_503(fake_redis, monkeypatch):
+    store = _store(_RedisBackend())
+
+    async def broken(*args, **kwargs):
+        raise redis.ResponseError("WRONGTYPE")
+
+    monkeypatch.setattr(fake_redis.client, "set", broken)
+    with pytest.raises(IdempotencyError) as exc:
+        asyncio.run(store.run("r", "k", {"a": 1}, _counting(0, [])))
+    assert exc.value.status_code == 503
+
+def test_cache_clear_keeps_idempotency_records(fake_redis):
+    store = _store(_RedisBackend(), lease_ms=1000)
+
+    async def main():
+        await store.run("prcIncluiProposta", "k3", {"a": 1}, _counting(0, []))
+        await hybrid_cache.set("tipos_grupo:all", {"items": [1]}, 60)
+        await hybrid_cache.set("bens_disponiveis:IM:1", {"items": [2]}, 60, tags=["grupo:IM"])
+        removed = await hybrid_cache.clear()
+        keys = sorted(k.decode() for k in await fake_redis.client.keys("*"))
+        return removed, keys
+
+    removed, keys = asyncio.run(main())
+    assert removed == 2
+    assert keys == ["idempotency:prcIncluiProposta:k3"]
+
+@pytest.mark.parametrize("backend", ["memory", "redis"])
+def test_abandoned_lease_expires_and_key_can_be_reclaimed(backend, request):
+    if backend == "redis":
+        request.getfixturevalue("fake_redis")
+    store = _store(_RedisBackend() if backend == "redis" else None, lease_ms=50)
+
+    async def main():
+        # Worker que tomou o lease e morreu sem concluir nem liberar
+        assert await store.backend.claim("r:k4", _hash(None), "morto", store.lease_ms) is None
+        store.wait_seconds = 0.01
+        with pytest.raises(IdempotencyError) as exc:
+            await store.run("r", "k4", None, _counting(0, []))
+        assert exc.value.status_code == 409
+        await asyncio.sleep(0.08)
+        return await store.run("r", "k4", None, _counting(0, []))
+
+    assert asyncio.run(main()) == {"proposta": 1}
+
+def test_configured_postgres_without_asyncpg_fails_startup(monkeypatch):
+    from app.infrastructure import idempotency
+
+    monkeypatch.setenv("DATABASE_URL_IDEMPOTENCY", "postgresql://localhost/idem")
+    monkeypatch.setattr(idempotency, "asyncpg", None)
+    store = IdempotencyStore()
+    with pytest.raises(RuntimeError):
+        asyncio.run(store.start())
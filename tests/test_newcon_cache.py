@@ -0,0 +1,66 @@
+import asyncio
+import json
+
+import pytest
+
+from app.infrastructure import newcon_cache
+from app.infrastructure.cache import hybrid_cache
+from app.infrastructure.cache.memory_cache import memory_cache
+from app.infrastructure.newcon_cache import CACHE_POLICIES, approx_json_bytes, bens_params, cached_call
+from benchmarks.payloads import bens_items
+
+class FakeNewcon:
+    def __init__(self, data: dict):
+        self.data = data
+        self.calls = 0
+
+    async def call(self, method: str, params: dict, idempotency_key=None):
+        self.calls += 1
+        return self.data
+
+@pytest.fixture(autouse=True)
+def _clean_l1():
+    memory_cache.clear()
+    yield
+    memory_cache.clear()
+
+@pytest.mark.parametrize("rows", [10, 1_000, 10_000])
+def test_approx_json_bytes_close_to_real_size(rows):
+    data = {"items": bens_items(rows)}
+    real = len(json.dumps(data, ensure_ascii=False))
+    assert abs(approx_json_bytes(data) - real) / real < 0.05
+
+def test_miss_evaluates_policy_once(monkeypatch):
+    sizes = []
+    original = newcon_cache.approx_json_bytes
+
+    def counting(data):
+        sizes.append(1)
+        return original(data)
+
+    monkeypatch.setattr(newcon_cache, "approx_json_bytes", counting)
+    nc = FakeNewcon({"items": bens_items(500)})
+    params = bens_params("IM", "1")
+
+    async def main():
+        first = await cached_call(nc, "cnsBensDisponiveis", params)
+        second = await cached_call(nc, "cnsBensDisponiveis", params)
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert nc.calls == 1
+    assert len(sizes) == 1
+    assert len(first["items"]) == len(second["items"]) == 500
+
+def test_oversized_response_is_not_cached(monkeypatch):
+    monkeypatch.setattr(CACHE_POLICIES["cnsBensDisponiveis"], "max_bytes", 10_000)
+    nc = FakeNewcon({"items": bens_items(500)})
+    params = bens_params("IM", "2")
+
+    async def main():
+        await cached_call(nc, "cnsBensDisponiveis", params)
+        await cached_call(nc, "cnsBensDisponiveis", params)
+        return await hybrid_cache.get(CACHE_POLICIES["cnsBensDisponiveis"].key(params))
+
+    assert asyncio.run(main()) is None
+    assert nc.calls == 2
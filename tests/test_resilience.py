@@ -0,0 +1,73 @@
+import asyncio
+
+from app.infrastructure.cache.memory_cache import memory_cache
+from app.infrastructure.resilience import CircuitBreaker, LatencyTracker, STALE_NAMESPACE
+
+def _tracker(samples: list) -> LatencyTracker:
+    tracker = LatencyTracker(min_samples=1)
+    for s in samples:
+        tracker.record("cnsBens", s)
+    return tracker
+
+def test_p95_nearest_rank():
+    assert _tracker(range(1, 21)).p95("cnsBens") == 19
+    assert _tracker(range(1, 11)).p95("cnsBens") == 10
+    assert _tracker(range(1, 101)).p95("cnsBens") == 95
+    assert _tracker([7]).p95("cnsBens") == 7
+
+def test_breaker_opens_and_half_opens():
+    breaker = CircuitBreaker("cnsBens", failure_threshold=2, open_seconds=0, stale_ttl=60)
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    # Intervalo vencido: uma única chamada de teste
+    assert breaker.allow_request()
+    assert breaker.state == "half_open"
+    assert not breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+def test_stale_values_live_in_l1_budget(monkeypatch):
+    memory_cache.clear()
+    monkeypatch.setattr(memory_cache, "max_bytes", 20_000)
+    breaker = CircuitBreaker("cnsBens", failure_threshold=1, open_seconds=30, stale_ttl=60)
+
+    async def main():
+        for i in range(50):
+            await breaker.remember(f"cnsBens:{i}", {"items": [{"Valor_Bem": i, "Descricao": "x" * 200}]})
+
+    asyncio.run(main())
+    assert memory_cache._bytes <= 20_000
+    assert memory_cache.bytes_by_namespace()[STALE_NAMESPACE] == memory_cache._bytes
+    # As mais antigas saíram pelo LRU; a última continua disponível como stale
+    assert breaker.stale("cnsBens:0") is None
+    assert breaker.stale("cnsBens:49") == {"items": [{"Valor_Bem": 49, "Descricao": "x" * 200}], "stale": True}
+    assert breaker.stats["stale_served"] == 1
+    memory_cache.clear()
+
+def test_stale_disabled_with_zero_ttl():
+    memory_cache.clear()
+    breaker = CircuitBreaker("cnsBens", failure_threshold=1, open_seconds=30, stale_ttl=0)
+    asyncio.run(breaker.remember("cnsBens:1", {"items": []}))
+    assert breaker.stale("cnsBens:1") is None
+
+def test_stale_values_survive_l1_wide_invalidation(fake_redis):
+    from app.infrastructure.cache.hybrid_cache import hybrid_cache
+    from app.infrastructure.cache.invalidation import l1_invalidator
+
+    memory_cache.clear()
+    breaker = CircuitBreaker("cnsBens", failure_threshold=1, open_seconds=30, stale_ttl=60)
+
+    async def main():
+        await breaker.remember("cnsBens:1", {"items": [1]})
+        await memory_cache.set("cnsBens:1", {"items": [1]}, 60)
+        await hybrid_cache.invalidate_l1_all()
+        assert await memory_cache.get("cnsBens:1") is None
+        assert breaker.stale("cnsBens:1") is not None
+        # Mensagem "clear" de outro worker
+        await l1_invalidator._apply('{"op": "clear", "origin": "outro"}')
+
+    asyncio.run(main())
+    assert breaker.stale("cnsBens:1") is not None
+    memory_cache.clear()
@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.infrastructure import simulation
+from app.infrastructure.cache.memory_cache import memory_cache
+from app.infrastructure.newcon_client import get_newcon_client
+from app.infrastructure.simulation import SimulationEngine, SimulationError, simulation_engine
+from app.routers import simulate
+
+CARACTERISTICAS = {"items": [{"PERCENTUAL_TAXA_ADMINISTRACAO": "15,00", "PERCENTUAL_FUNDO_RESERVA": 2,
+                              "PERCENTUAL_SEGURO": 0}]}
+
+class FakeNewcon:
+    """cnsCaracteristicasGrupos/cnsRegraCobranca fixos; cnsSimulador devolve `parcela(params)`"""
+
+    def __init__(self, parcela=None, stale: bool = False):
+        self.parcela = parcela
+        self.stale = stale
+        self.calls = []
+
+    async def call(self, method: str, params: dict, idempotency_key=None):
+        self.calls.append(method)
+        if method == "cnsCaracteristicasGrupos":
+            return CARACTERISTICAS
+        if method == "cnsRegraCobranca":
+            return {"items": []}
+        data = {"items": [{"VALOR_PARCELA": self.parcela(params)}]}
+        return {**data, "stale": True} if self.stale else data
+
+@pytest.fixture(autouse=True)
+def _clean_l1():
+    memory_cache.clear()
+    yield
+    memory_cache.clear()
+
+def test_build_plano_uniform_and_faixas():
+    engine = SimulationEngine()
+    plano = engine.build_plano(10, CARACTERISTICAS["items"], [])
+    assert plano.fonte == "uniforme"
+    assert plano.faixas() == [(1, 10, pytest.approx(11.7))]
+
+    regra = [{"PARCELA_INICIAL": 1, "PARCELA_FINAL": 2, "PERCENTUAL_FUNDO_COMUM": 20}]
+    plano = engine.build_plano(4, CARACTERISTICAS["items"], regra)
+    assert plano.fonte == "regra_cobranca"
+    assert [(de, ate) for de, ate, _ in plano.faixas()] == [(1, 2), (3, 4)]
+    assert sum(plano.pct) == pytest.approx(117)
+
+def test_build_plano_without_taxa_fails():
+    with pytest.raises(SimulationError):
+        SimulationEngine().build_plano(10, [{"PERCENTUAL_FUNDO_RESERVA": 2}], [])
+
+def test_matrix_fallback_matches_numpy(monkeypatch):
+    valores, pcts = [1000.0, 12345.67, 99999.99], [1.17, 0.3333, 2.5]
+    expected = SimulationEngine._matrix(valores, pcts)
+    monkeypatch.setattr(simulation, "np", None)
+    assert SimulationEngine._matrix(valores, pcts) == expected
+
+def test_verify_reports_drift():
+    engine = SimulationEngine()
+    # Upstream 2% acima do cálculo local
+    nc = FakeNewcon(parcela=lambda p: round(p["Valor_Bem"] * 0.117 * 1.02, 2))
+
+    async def main():
+        grid = await engine.grid(nc, 1, [10], [100000.0])
+        return grid, await engine.verify(nc, 1, grid["simulacoes"], 5)
+
+    grid, result = asyncio.run(main())
+    assert grid["simulacoes"][0]["Primeira_Parcela"] == 11700.0
+    assert result["max_desvio_pct"] == pytest.approx(1.9608, abs=1e-3)
+    assert result["dentro_da_tolerancia"] is False
+    assert engine.stats["drift_over_tolerance"] == 1
+
+def test_verify_ignores_stale_breaker_responses():
+    engine = SimulationEngine()
+    nc = FakeNewcon(parcela=lambda p: 1.0, stale=True)
+
+    async def main():
+        grid = await engine.grid(nc, 1, [10], [100000.0])
+        return await engine.verify(nc, 1, grid["simulacoes"], 5)
+
+    result = asyncio.run(main())
+    assert "erro" in result["amostras"][0]
+    assert result["max_desvio_pct"] is None
+    assert engine.stats["verify_skipped_stale"] == 1
+    assert engine.stats["verified"] == 0
+
+@pytest.mark.parametrize("enabled", [False, True])
+def test_grade_route_respects_flag(monkeypatch, enabled):
+    monkeypatch.setenv("API_KEY", "k")
+    monkeypatch.setattr(simulation_engine, "enabled", enabled)
+    app = FastAPI()
+    app.include_router(simulate.router, prefix="/simulate")
+    app.dependency_overrides[get_newcon_client] = lambda: FakeNewcon(parcela=lambda p: p["Valor_Bem"] * 0.117)
+    client = TestClient(app)
+    body = {"Codigo_Grupo": 1, "Prazos": [10], "Valores_Bem": [100000]}
+
+    r = client.post("/simulate/grade", json=body, headers={"X-API-Key": "k"})
+    assert r.status_code == (200 if enabled else 503)
+    if enabled:
+        assert r.json()["data"]["autoritativo"] is True
+
+    r = client.post("/simulate/grade", json={**body, "verificar": 1}, headers={"X-API-Key": "k"})
+    assert r.status_code == 200
+    data = r.json()["data"]
+    assert data["autoritativo"] is enabled
+    assert data["verificacao"]["dentro_da_tolerancia"] is True
@@ -0,0 +1,75 @@
+import asyncio
+
+from app.infrastructure.concurrency_limiter import UpstreamOverloaded
+from app.infrastructure.singleflight import SingleFlight
+
+def _workers(n: int) -> list:
+    workers = []
+    for _ in range(n):
+        sf = SingleFlight()
+        sf.cross_instance = True
+        sf.poll_ms = 5
+        workers.append(sf)
+    return workers
+
+def test_coalesces_local_callers():
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return {"items": [1]}
+
+    async def main():
+        sf = SingleFlight()
+        return await asyncio.gather(*(sf.do("k", fetch) for _ in range(10)))
+
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    assert all(r == {"items": [1]} for r in results)
+
+def test_cross_instance_single_upstream_call(fake_redis):
+    calls = {}
+
+    def fetch(n: int):
+        async def run():
+            calls[n] = calls.get(n, 0) + 1
+            await asyncio.sleep(0.03)
+            return {"items": [n]}
+        return run
+
+    async def main():
+        for n in (2, 4, 8):
+            results = await asyncio.gather(*(sf.do(f"k{n}", fetch(n)) for sf in _workers(n)))
+            assert all(r == {"items": [n]} for r in results)
+
+    asyncio.run(main())
+    assert calls == {2: 1, 4: 1, 8: 1}
+
+def test_cross_instance_leader_error_is_shared(fake_redis):
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.03)
+        raise UpstreamOverloaded(503, "upstream_overloaded", "upstream")
+
+    async def main():
+        return await asyncio.gather(*(sf.do("k", fetch) for sf in _workers(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    assert all(isinstance(r, UpstreamOverloaded) and r.code == "upstream_overloaded" for r in results)
+
+def test_published_result_is_not_served_to_later_callers(fake_redis):
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        return len(calls)
+
+    async def main():
+        first, second = _workers(2)
+        return await first.do("k", fetch), await second.do("k", fetch)
+
+    assert asyncio.run(main()) == (1, 2)